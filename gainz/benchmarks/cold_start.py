@@ -0,0 +1,129 @@
+"""
+Cold start benchmark.
+
+Starts gainz (see benchmarks.server) again and again and measures how long
+a new worker takes to import the app, to answer /api/health (it serves)
+and to answer 200 on /api/ready (warmup done), next to the startup and
+warmup step timings the worker reports itself.
+
+Usage::
+
+    python -m benchmarks.cold_start --runs 5 --output cold_start.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.login_storm import percentiles
+from benchmarks.ws_load import git_commit, spawn, wait_until_up
+
+
+def import_seconds() -> float:
+    """
+    Times the import of the app in a fresh interpreter.
+
+    :returns: seconds.
+    """
+    code = (
+        "import time; started = time.perf_counter(); "
+        "import gainz.web.application; print(time.perf_counter() - started)"
+    )
+    command = [sys.executable, "-c", code]
+    output = subprocess.check_output(command, text=True)  # noqa: S603
+    return float(output)
+
+
+async def wait_until_ready(url: str, timeout: float = 60.0) -> Dict[str, Any]:
+    """
+    Waits until a worker answers 200 on its readiness endpoint.
+
+    :param url: readiness url.
+    :param timeout: seconds to wait at most.
+    :raises RuntimeError: if the worker did not get ready.
+    :returns: readiness report of the worker.
+    """
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                response = await client.get(url)
+            except httpx.TransportError:
+                response = None
+            if response is not None and response.status_code == 200:
+                return response.json()
+            await asyncio.sleep(0.01)
+    raise RuntimeError(f"{url} did not get ready")
+
+
+def start_once(args: argparse.Namespace, env: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Starts a server and times it until it is ready.
+
+    :param args: command line arguments.
+    :param env: environment of the server.
+    :returns: timings of the run.
+    """
+    url = f"http://127.0.0.1:{args.port}/api"
+    started = time.perf_counter()
+    server = spawn("benchmarks.server", "--port", str(args.port), env=env)
+    try:
+        asyncio.run(wait_until_up(f"{url}/health", timeout=60))
+        serving = time.perf_counter() - started
+        report = asyncio.run(wait_until_ready(f"{url}/ready"))
+        ready = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+    return {"serving": serving, "ready": ready, "worker": report}
+
+
+def main() -> None:
+    """Entrypoint of the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--openai-port", type=int, default=8100)
+    parser.add_argument("--output", default="cold_start.json")
+    args = parser.parse_args()
+
+    fake_openai = spawn("benchmarks.fake_openai", "--port", str(args.openai_port))
+    env = {
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.openai_port}/v1",
+        "OPENAI_API_KEY": "benchmark",
+        "JWT_SECRET": os.environ.get("JWT_SECRET", uuid.uuid4().hex * 2),
+    }
+    runs: List[Dict[str, Any]] = []
+    try:
+        asyncio.run(wait_until_up(f"http://127.0.0.1:{args.openai_port}/v1/models"))
+        imports = [import_seconds() for _ in range(args.runs)]
+        for _ in range(args.runs):
+            runs.append(start_once(args, env))
+    finally:
+        fake_openai.terminate()
+        fake_openai.wait()
+
+    report = {
+        "commit": git_commit(),
+        "config": vars(args),
+        "import_ms": percentiles(imports),
+        "serving_ms": percentiles([run["serving"] for run in runs]),
+        "ready_ms": percentiles([run["ready"] for run in runs]),
+        "worker": [run["worker"] for run in runs],
+    }
+    with Path(args.output).open("w") as output:
+        json.dump(report, output, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
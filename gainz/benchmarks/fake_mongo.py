@@ -0,0 +1,236 @@
+"""
+In-memory stand-in for the async MongoDB database.
+
+Implements the part of the pymongo async API that gainz uses: equality,
+$gt, $in and $or filters, projections, sorting, limits and unique indexes.
+Good enough to take MongoDB out of a benchmark, not a general emulator.
+"""
+import copy
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+SortSpec = Sequence[Tuple[str, int]]
+
+
+def matches(doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    """
+    Checks a document against a filter.
+
+    :param doc: the document.
+    :param query: filter with equality, $gt, $in and $or.
+    :returns: whether the document matches.
+    """
+    for key, expected in query.items():
+        if key == "$or":
+            if not any(matches(doc, branch) for branch in expected):
+                return False
+        elif isinstance(expected, dict) and "$gt" in expected:
+            if key not in doc or not doc[key] > expected["$gt"]:
+                return False
+        elif isinstance(expected, dict) and "$in" in expected:
+            if doc.get(key) not in expected["$in"]:
+                return False
+        elif doc.get(key) != expected:
+            return False
+    return True
+
+
+def project(
+    doc: Dict[str, Any],
+    projection: Optional[Dict[str, int]],
+) -> Dict[str, Any]:
+    """
+    Applies a projection to a document.
+
+    :param doc: the document.
+    :param projection: fields to include (1) or exclude (0).
+    :returns: a copy of the projected document.
+    """
+    if not projection:
+        return copy.deepcopy(doc)
+    included = [key for key, keep in projection.items() if keep]
+    if included:
+        fields = set(included)
+        if projection.get("_id", 1):
+            fields.add("_id")
+        return {key: copy.deepcopy(doc[key]) for key in doc if key in fields}
+    return {
+        key: copy.deepcopy(val) for key, val in doc.items() if key not in projection
+    }
+
+
+def sort_docs(docs: List[Dict[str, Any]], spec: SortSpec) -> List[Dict[str, Any]]:
+    """
+    Sorts documents by several keys.
+
+    :param docs: the documents.
+    :param spec: (key, direction) pairs, most significant first.
+    :returns: the sorted documents.
+    """
+    for key, direction in reversed(spec):
+        docs = sorted(docs, key=lambda doc: doc.get(key), reverse=direction < 0)
+    return docs
+
+
+class FakeCursor:
+    """Cursor over the documents matched by a find."""
+
+    def __init__(
+        self,
+        docs: List[Dict[str, Any]],
+        projection: Optional[Dict[str, int]],
+    ) -> None:
+        self._docs = docs
+        self._projection = projection
+        self._sort: SortSpec = ()
+        self._limit = 0
+
+    def sort(self, spec: SortSpec) -> "FakeCursor":
+        """Sorts the results by the (key, direction) pairs."""
+        self._sort = spec
+        return self
+
+    def limit(self, limit: int) -> "FakeCursor":
+        """Keeps the first results only."""
+        self._limit = limit
+        return self
+
+    def batch_size(self, size: int) -> "FakeCursor":
+        """Accepted and ignored, everything is in memory."""
+        return self
+
+    def _results(self) -> Iterator[Dict[str, Any]]:
+        docs = sort_docs(self._docs, self._sort)
+        if self._limit:
+            docs = docs[: self._limit]
+        return (project(doc, self._projection) for doc in docs)
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Returns up to length results."""
+        docs = list(self._results())
+        return docs[:length] if length else docs
+
+    def __aiter__(self) -> "FakeCursor":
+        self._iter = self._results()
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+
+class FakeResult:
+    """Result of a write."""
+
+    def __init__(self, inserted_ids: Any = None, deleted_count: int = 0) -> None:
+        self.inserted_ids = inserted_ids
+        self.inserted_id = inserted_ids
+        self.deleted_count = deleted_count
+
+
+class FakeCollection:
+    """A collection kept in a dict, keyed by _id."""
+
+    def __init__(self) -> None:
+        self._docs: Dict[Any, Dict[str, Any]] = {}
+        self._unique: List[str] = []
+
+    async def create_index(self, keys: Any, unique: bool = False, **kwargs: Any) -> str:
+        """Only unique indexes do something: they are enforced on inserts."""
+        if unique:
+            fields = [key for key, _ in keys]
+            seen = [
+                tuple(doc.get(key) for key in fields) for doc in self._docs.values()
+            ]
+            if len(set(seen)) < len(seen):
+                raise OperationFailure("E11000 duplicate key error", 11000)
+            self._unique.extend(fields)
+        return "_".join(f"{key}_{direction}" for key, direction in keys)
+
+    def _insert(self, doc: Dict[str, Any]) -> Any:
+        doc = copy.deepcopy(doc)
+        doc.setdefault("_id", id(doc))
+        if doc["_id"] in self._docs:
+            raise DuplicateKeyError("duplicate _id", 11000)
+        for key in self._unique:
+            if any(other.get(key) == doc.get(key) for other in self._docs.values()):
+                raise DuplicateKeyError(f"duplicate {key}", 11000)
+        self._docs[doc["_id"]] = doc
+        return doc["_id"]
+
+    async def insert_one(self, doc: Dict[str, Any]) -> FakeResult:
+        """Inserts a document."""
+        return FakeResult(self._insert(doc))
+
+    async def insert_many(
+        self,
+        docs: List[Dict[str, Any]],
+        ordered: bool = True,
+    ) -> FakeResult:
+        """Inserts documents, reporting the duplicates like pymongo."""
+        inserted, errors = [], []
+        for index, doc in enumerate(docs):
+            try:
+                inserted.append(self._insert(doc))
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError(
+                {"writeErrors": errors, "nInserted": len(inserted)},
+            )
+        return FakeResult(inserted)
+
+    def find(
+        self,
+        query: Optional[Dict[str, Any]] = None,
+        projection: Optional[Dict[str, int]] = None,
+    ) -> FakeCursor:
+        """Returns a cursor on the matching documents."""
+        docs = [doc for doc in self._docs.values() if matches(doc, query or {})]
+        return FakeCursor(docs, projection)
+
+    async def find_one(
+        self,
+        query: Optional[Dict[str, Any]] = None,
+        projection: Optional[Dict[str, int]] = None,
+        sort: Optional[SortSpec] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Returns the first matching document, or None."""
+        docs = await self.find(query, projection).sort(sort or ()).to_list(1)
+        return docs[0] if docs else None
+
+    async def count_documents(self, query: Dict[str, Any]) -> int:
+        """Counts the matching documents."""
+        return sum(1 for doc in self._docs.values() if matches(doc, query))
+
+    async def delete_many(self, query: Dict[str, Any]) -> FakeResult:
+        """Deletes the matching documents."""
+        doomed = [key for key, doc in self._docs.items() if matches(doc, query)]
+        for key in doomed:
+            del self._docs[key]
+        return FakeResult(deleted_count=len(doomed))
+
+
+class FakeDatabase:
+    """A database whose collections are created on first use."""
+
+    def __init__(self) -> None:
+        self._collections: Dict[str, FakeCollection] = defaultdict(FakeCollection)
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        return self._collections[name]
+
+    async def command(self, name: str) -> Dict[str, Any]:
+        """
+        Answers database commands, e.g. the ping of the warmup.
+
+        :param name: command name.
+        :returns: a successful reply.
+        """
+        return {"ok": 1.0}
@@ -0,0 +1,261 @@
+"""
+Fake OpenAI server.
+
+Serves the endpoints of the OpenAI API that gainz calls: threads (created and
+deleted), messages, runs (polled or streamed), chat completions and the model
+list read by the warmup. Every request but the model list waits a fixed
+latency, and streamed runs send their answer in chunks with a delay between
+them, so the benchmarks measure gainz and not the real API.
+
+Usage::
+
+    python -m benchmarks.fake_openai --port 8100 --latency 0.2 --chunks 20
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from typing import Any, AsyncIterator, Dict
+
+import ujson
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+ANSWER = "The quick brown fox jumps over the lazy dog. "
+
+
+def sse(name: str, data: Any) -> str:
+    """
+    Formats a server-sent event.
+
+    :param name: event name.
+    :param data: JSON data of the event.
+    :returns: the event.
+    """
+    return f"event: {name}\ndata: {ujson.dumps(data)}\n\n"
+
+
+class FakeOpenAI:
+    """Threads and messages of the fake API, kept in memory."""
+
+    def __init__(self, latency: float, chunks: int, chunk_delay: float) -> None:
+        self.latency = latency
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+        self.messages: Dict[str, list] = {}
+        self._ids = itertools.count()
+
+    def new_id(self, prefix: str) -> str:
+        """
+        Returns a new object id.
+
+        :param prefix: kind of object.
+        :returns: the id.
+        """
+        return f"{prefix}_{next(self._ids)}"
+
+    def message(self, tid: str, role: str, text: str) -> Dict[str, Any]:
+        """
+        Builds a completed message.
+
+        :param tid: thread id.
+        :param role: author of the message.
+        :param text: text of the message.
+        :returns: the message object.
+        """
+        return {
+            "id": self.new_id("msg"),
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": tid,
+            "role": role,
+            "status": "completed",
+            "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+        }
+
+    def run(self, tid: str, assistant_id: str, status: str) -> Dict[str, Any]:
+        """
+        Builds a run.
+
+        :param tid: thread id.
+        :param assistant_id: assistant id.
+        :param status: status of the run.
+        :returns: the run object.
+        """
+        return {
+            "id": self.new_id("run"),
+            "object": "thread.run",
+            "created_at": int(time.time()),
+            "thread_id": tid,
+            "assistant_id": assistant_id,
+            "status": status,
+        }
+
+    async def create_thread(self, request: Request) -> JSONResponse:
+        """POST /v1/threads."""
+        await asyncio.sleep(self.latency)
+        tid = self.new_id("thread")
+        self.messages[tid] = []
+        return JSONResponse(
+            {"id": tid, "object": "thread", "created_at": int(time.time())},
+        )
+
+    async def create_message(self, request: Request) -> JSONResponse:
+        """POST /v1/threads/{tid}/messages."""
+        await asyncio.sleep(self.latency)
+        tid = request.path_params["tid"]
+        body = await request.json()
+        role = body.get("role", "user")
+        created = self.message(tid, role, str(body.get("content")))
+        self.messages.setdefault(tid, []).append(created)
+        return JSONResponse(created)
+
+    async def list_messages(self, request: Request) -> JSONResponse:
+        """GET /v1/threads/{tid}/messages, in one page."""
+        await asyncio.sleep(self.latency)
+        page = self.messages.get(request.path_params["tid"], [])
+        after = request.query_params.get("after")
+        if after is not None:
+            position = next(
+                (index for index, msg in enumerate(page) if msg["id"] == after),
+                -1,
+            )
+            page = page[position + 1 :]
+        return JSONResponse(
+            {
+                "object": "list",
+                "data": page,
+                "first_id": page[0]["id"] if page else None,
+                "last_id": page[-1]["id"] if page else None,
+                "has_more": False,
+            },
+        )
+
+    async def stream_run(
+        self,
+        tid: str,
+        created: Dict[str, Any],
+    ) -> AsyncIterator[str]:
+        """
+        Sends the events of a streamed run, the answer in chunks.
+
+        :param tid: thread id.
+        :param created: the run.
+        :yield: server-sent events.
+        """
+        yield sse("thread.run.created", created)
+        answer = self.message(tid, "assistant", "")
+        words = ANSWER.split()
+        for index in range(self.chunks):
+            await asyncio.sleep(self.chunk_delay)
+            text = words[index % len(words)] + " "
+            answer["content"][0]["text"]["value"] += text
+            delta = {
+                "id": answer["id"],
+                "object": "thread.message.delta",
+                "delta": {
+                    "content": [{"index": 0, "type": "text", "text": {"value": text}}],
+                },
+            }
+            yield sse("thread.message.delta", delta)
+        self.messages.setdefault(tid, []).append(answer)
+        yield sse("thread.run.completed", {**created, "status": "completed"})
+        yield "event: done\ndata: [DONE]\n\n"
+
+    async def create_run(self, request: Request) -> Any:
+        """POST /v1/threads/{tid}/runs, streamed or completed at once."""
+        await asyncio.sleep(self.latency)
+        tid = request.path_params["tid"]
+        body = await request.json()
+        if body.get("stream"):
+            created = self.run(tid, body["assistant_id"], "queued")
+            return StreamingResponse(
+                self.stream_run(tid, created),
+                media_type="text/event-stream",
+            )
+        self.messages.setdefault(tid, []).append(self.message(tid, "assistant", ANSWER))
+        return JSONResponse(self.run(tid, body["assistant_id"], "completed"))
+
+    async def retrieve_run(self, request: Request) -> JSONResponse:
+        """GET /v1/threads/{tid}/runs/{rid}, always completed."""
+        await asyncio.sleep(self.latency)
+        completed = self.run(request.path_params["tid"], "asst", "completed")
+        return JSONResponse({**completed, "id": request.path_params["rid"]})
+
+    async def chat_completion(self, request: Request) -> JSONResponse:
+        """POST /v1/chat/completions."""
+        await asyncio.sleep(self.latency)
+        body = await request.json()
+        return JSONResponse(
+            {
+                "id": self.new_id("chatcmpl"),
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-4o-mini"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": ANSWER},
+                    },
+                ],
+            },
+        )
+
+    async def delete_thread(self, request: Request) -> JSONResponse:
+        """DELETE /v1/threads/{tid}."""
+        await asyncio.sleep(self.latency)
+        tid = request.path_params["tid"]
+        return JSONResponse({"id": tid, "object": "thread.deleted", "deleted": True})
+
+    async def list_models(self, request: Request) -> JSONResponse:
+        """GET /v1/models, answered at once."""
+        return JSONResponse({"object": "list", "data": []})
+
+
+def create_app(
+    latency: float = 0.1,
+    chunks: int = 10,
+    chunk_delay: float = 0.01,
+) -> Starlette:
+    """
+    Builds the fake OpenAI app.
+
+    :param latency: seconds every request waits before answering.
+    :param chunks: text deltas of a streamed run.
+    :param chunk_delay: seconds between two deltas.
+    :returns: ASGI application.
+    """
+    api = FakeOpenAI(latency, chunks, chunk_delay)
+    return Starlette(
+        routes=[
+            Route("/v1/models", api.list_models, methods=["GET"]),
+            Route("/v1/threads", api.create_thread, methods=["POST"]),
+            Route("/v1/threads/{tid}", api.delete_thread, methods=["DELETE"]),
+            Route("/v1/threads/{tid}/messages", api.create_message, methods=["POST"]),
+            Route("/v1/threads/{tid}/messages", api.list_messages, methods=["GET"]),
+            Route("/v1/threads/{tid}/runs", api.create_run, methods=["POST"]),
+            Route("/v1/threads/{tid}/runs/{rid}", api.retrieve_run, methods=["GET"]),
+            Route("/v1/chat/completions", api.chat_completion, methods=["POST"]),
+        ],
+    )
+
+
+def main() -> None:
+    """Entrypoint of the fake server."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--chunks", type=int, default=10)
+    parser.add_argument("--chunk-delay", type=float, default=0.01)
+    args = parser.parse_args()
+    app = create_app(args.latency, args.chunks, args.chunk_delay)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Logging overhead benchmark.
+
+Measures the cost of a log call as seen by the event loop, with the
+pipeline of gainz.log (level filter, sampling, queue to a writer thread)
+next to a synchronous handler formatting and writing in the caller, as the
+app did before. Then measures the same on requests of a small ASGI app
+logging once per request, through httpx without a network.
+
+Usage::
+
+    python -m benchmarks.logging_overhead --calls 200000 --output logging.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from logging.handlers import QueueListener
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from benchmarks.login_storm import percentiles
+from benchmarks.ws_load import git_commit
+from gainz.log import (
+    ContextFilter,
+    CorrelationMiddleware,
+    JSONFormatter,
+    LogQueueHandler,
+    SamplingFilter,
+    skip_unused_fields,
+)
+
+logger = logging.getLogger("benchmark")
+sampled = logging.getLogger("benchmark.sampled")
+
+
+def devnull_handler() -> logging.Handler:
+    """
+    Builds a handler writing JSON lines to /dev/null.
+
+    :returns: the handler.
+    """
+    # Left open for the whole benchmark, like stdout.
+    handler = logging.StreamHandler(Path(os.devnull).open("w"))  # noqa: SIM115
+    handler.setFormatter(JSONFormatter())
+    return handler
+
+
+def use_sync() -> Callable[[], None]:
+    """
+    Formats and writes every record in the caller.
+
+    :returns: function undoing the setup.
+    """
+    handler = devnull_handler()
+    handler.addFilter(ContextFilter())
+    logging.getLogger().handlers = [handler]
+    return handler.close
+
+
+def use_queue() -> Callable[[], None]:
+    """
+    Sets up the pipeline of gainz.log, writing to /dev/null.
+
+    :returns: function undoing the setup.
+    """
+    skip_unused_fields()
+    handler = LogQueueHandler(queue.SimpleQueue())  # type: ignore
+    handler.addFilter(SamplingFilter({sampled.name: 0.0}))
+    handler.addFilter(ContextFilter())
+    listener = QueueListener(handler.queue, devnull_handler())  # type: ignore
+    listener.start()
+    logging.getLogger().handlers = [handler]
+    return listener.stop
+
+
+def per_call(calls: int, log: Callable[[], None]) -> float:
+    """
+    Times log calls.
+
+    :param calls: calls to make.
+    :param log: makes one call.
+    :returns: nanoseconds per call.
+    """
+    started = time.perf_counter_ns()
+    for _ in range(calls):
+        log()
+    return round((time.perf_counter_ns() - started) / calls, 1)
+
+
+async def per_request(requests: int) -> Dict[str, Any]:
+    """
+    Times requests of an app logging once per request.
+
+    :param requests: requests to make.
+    :returns: latency percentiles.
+    """
+
+    async def endpoint(request: Request) -> PlainTextResponse:
+        logger.info("Handled %s", request.url.path)
+        return PlainTextResponse("ok")
+
+    app = CorrelationMiddleware(Starlette(routes=[Route("/", endpoint)]))
+    transport = httpx.ASGITransport(app=app)  # type: ignore
+    samples = []
+    client = httpx.AsyncClient(transport=transport, base_url="http://bench")
+    async with client:
+        for _ in range(requests):
+            started = time.perf_counter()
+            await client.get("/")
+            samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Runs the benchmark.
+
+    :param args: command line arguments.
+    :returns: benchmark report.
+    """
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    report: Dict[str, Any] = {"commit": git_commit(), "config": vars(args)}
+    calls = args.calls
+    for name, setup in (("sync", use_sync), ("queue", use_queue)):
+        teardown = setup()
+        try:
+            report[name] = {
+                "filtered_ns": per_call(calls, lambda: logger.debug("x %s", 1)),
+                "sampled_out_ns": per_call(calls, lambda: sampled.info("x %s", 1)),
+                "logged_ns": per_call(calls, lambda: logger.info("x %s", 1)),
+                "request_ms": asyncio.run(per_request(args.requests)),
+            }
+        finally:
+            teardown()
+    return report
+
+
+def main() -> None:
+    """Entrypoint of the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--output", default="logging.json")
+    args = parser.parse_args()
+
+    report = run(args)
+    with Path(args.output).open("w") as output:
+        json.dump(report, output, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
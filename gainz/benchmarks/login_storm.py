@@ -0,0 +1,166 @@
+"""
+Login storm benchmark.
+
+Fires a burst of concurrent logins at a running server while a websocket
+client keeps measuring round trips on /api/ws. With bcrypt off the event
+loop, the websocket latency should stay flat during the storm.
+
+Usage::
+
+    python -m benchmarks.login_storm --url http://127.0.0.1:8000 --logins 500
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List
+
+import httpx
+import websockets
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """
+    Summarizes latency samples in milliseconds.
+
+    :param samples: latencies in seconds.
+    :returns: p50, p95, p99 and max.
+    """
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(share: float) -> float:
+        index = min(len(ordered) - 1, int(share * len(ordered)))
+        return round(ordered[index] * 1000, 2)
+
+    return {
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": round(ordered[-1] * 1000, 2),
+        "mean": round(statistics.fmean(ordered) * 1000, 2),
+    }
+
+
+async def probe_websocket(
+    url: str,
+    stop: asyncio.Event,
+    interval: float,
+) -> List[float]:
+    """
+    Measures websocket round trips until stopped.
+
+    :param url: websocket url.
+    :param stop: event that ends the probe.
+    :param interval: pause between probes in seconds.
+    :returns: round trip latencies in seconds.
+    """
+    samples = []
+    async with websockets.connect(url) as conn:
+        while not stop.is_set():
+            started = time.perf_counter()
+            await conn.send(json.dumps({"id": "list", "tid": "benchmark"}))
+            await conn.recv()
+            samples.append(time.perf_counter() - started)
+            await asyncio.sleep(interval)
+    return samples
+
+
+async def login_storm(
+    client: httpx.AsyncClient,
+    credentials: Dict[str, str],
+    logins: int,
+    concurrency: int,
+) -> Dict[str, Any]:
+    """
+    Sends concurrent logins.
+
+    :param client: http client.
+    :param credentials: email and password of an existing user.
+    :param logins: total number of logins.
+    :param concurrency: logins in flight at once.
+    :returns: throughput, status codes and latencies.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses: Counter[int] = Counter()
+    latencies = []
+
+    async def login() -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/api/login", json=credentials)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    return {
+        "logins": logins,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "logins_per_second": round(logins / elapsed, 2),
+        "statuses": dict(statuses),
+        "latency_ms": percentiles(latencies),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Runs the benchmark.
+
+    :param args: command line arguments.
+    :returns: benchmark report.
+    """
+    ws_url = args.url.replace("http", "ws", 1) + "/api/ws"
+    user_id = uuid.uuid4().hex
+    credentials = {"email": f"{user_id}@benchmark.local", "password": user_id}
+    limits = httpx.Limits(max_connections=args.concurrency)
+    client = httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60)
+    async with client:
+        response = await client.post(
+            "/api/register",
+            json={"id": user_id, "name": "benchmark", **credentials},
+        )
+        response.raise_for_status()
+
+        stop = asyncio.Event()
+        idle_probe = asyncio.create_task(probe_websocket(ws_url, stop, args.interval))
+        await asyncio.sleep(args.idle)
+        stop.set()
+        idle = await idle_probe
+
+        stop = asyncio.Event()
+        storm_probe = asyncio.create_task(probe_websocket(ws_url, stop, args.interval))
+        storm = await login_storm(client, credentials, args.logins, args.concurrency)
+        stop.set()
+        loaded = await storm_probe
+
+    return {
+        "login": storm,
+        "websocket_idle_ms": percentiles(idle),
+        "websocket_under_storm_ms": percentiles(loaded),
+    }
+
+
+def main() -> None:
+    """Entrypoint of the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.05)
+    parser.add_argument("--idle", type=float, default=2.0)
+    args = parser.parse_args()
+    report = asyncio.run(run(args))
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark server.
+
+Runs gainz, built by get_app(), with MongoDB and Redis replaced by
+in-memory stand-ins, so a benchmark only needs Python. Point it at the
+fake OpenAI server with OPENAI_BASE_URL.
+
+Usage::
+
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=fake \
+        python -m benchmarks.server --port 8000
+"""
+import argparse
+
+import uvicorn
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeConnection
+from fastapi import FastAPI
+from redis.asyncio import ConnectionPool
+
+from benchmarks.fake_mongo import FakeDatabase
+from gainz.web import lifespan
+from gainz.web.application import get_app
+
+
+class FakeClient:
+    """Client of the in-memory database."""
+
+    async def close(self) -> None:
+        """Nothing to close."""
+
+
+def init_memory_mongo(app: FastAPI) -> None:
+    """
+    Puts an in-memory database where init_mongo puts the real one.
+
+    :param app: current fastapi application.
+    """
+    app.state.db_client = FakeClient()
+    app.state.db = FakeDatabase()
+
+
+def init_memory_redis(app: FastAPI) -> None:
+    """
+    Puts an in-memory Redis where init_redis puts the real one.
+
+    :param app: current fastapi application.
+    """
+    server = FakeServer()
+    server.connected = True
+    app.state.redis_pool = ConnectionPool(
+        connection_class=FakeConnection,
+        server=server,
+    )
+
+
+def main() -> None:
+    """Entrypoint of the benchmark server."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--real-mongo",
+        action="store_true",
+        help="use the MongoDB of the settings",
+    )
+    parser.add_argument(
+        "--real-redis",
+        action="store_true",
+        help="use the Redis of the settings",
+    )
+    args = parser.parse_args()
+    if not args.real_mongo:
+        lifespan.init_mongo = init_memory_mongo  # type: ignore
+    if not args.real_redis:
+        lifespan.init_redis = init_memory_redis  # type: ignore
+    uvicorn.run(get_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
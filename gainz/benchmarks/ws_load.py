@@ -0,0 +1,344 @@
+"""
+Websocket and REST load benchmark.
+
+Starts the fake OpenAI server and gainz (see benchmarks.server) as child
+processes, then drives concurrent /ws clients, each asking questions and
+streaming the answers, next to REST callers listing threads and messages.
+Reports latency percentiles, throughput and the server memory per open
+websocket, and writes the report to a JSON file to compare commits.
+
+Usage::
+
+    python -m benchmarks.ws_load --clients 200 --requests 5 --output ws_load.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+import websockets
+
+from benchmarks.login_storm import percentiles
+
+
+def rss_kb(pid: int) -> Optional[int]:
+    """
+    Reads the resident memory of a process, on Linux.
+
+    :param pid: process id.
+    :returns: resident set size in kB, None where /proc is not available.
+    """
+    try:
+        with Path(f"/proc/{pid}/status").open() as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def git_commit() -> Optional[str]:
+    """
+    Finds the commit being benchmarked.
+
+    :returns: commit hash, None outside of a git checkout.
+    """
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],  # noqa: S607
+            cwd=Path(__file__).resolve().parent,
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def spawn(module: str, *args: str, env: Optional[Dict[str, str]] = None) -> Any:
+    """
+    Starts a benchmark module in a child process.
+
+    :param module: module to run.
+    :param args: command line arguments.
+    :param env: extra environment variables.
+    :returns: the process.
+    """
+    return subprocess.Popen(  # noqa: S603
+        [sys.executable, "-m", module, *args],
+        env={**os.environ, **(env or {})},
+    )
+
+
+async def wait_until_up(url: str, timeout: float = 30.0) -> None:
+    """
+    Waits until a server answers.
+
+    :param url: url to poll.
+    :param timeout: seconds to wait at most.
+    :raises RuntimeError: if the server did not come up.
+    """
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+async def create_user(client: httpx.AsyncClient) -> Dict[str, str]:
+    """
+    Registers and logs in a user with one thread.
+
+    :param client: http client of the server.
+    :returns: token and thread id of the user.
+    """
+    user_id = uuid.uuid4().hex
+    credentials = {"email": f"{user_id}@benchmark.local", "password": user_id}
+    response = await client.post(
+        "/api/register",
+        json={"id": user_id, "name": "benchmark", **credentials},
+    )
+    response.raise_for_status()
+    token = (await client.post("/api/login", json=credentials)).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    await client.post("/api/create-thread", headers=headers)
+    threads = (await client.post("/api/list-thread", headers=headers)).json()
+    return {"token": token, "tid": threads[-1]["id"]}
+
+
+class WsClient:
+    """A /ws client asking questions and streaming the answers."""
+
+    def __init__(self, url: str, user: Dict[str, str]) -> None:
+        self.url = f"{url}?token={user['token']}"
+        self.tid = user["tid"]
+        self.rids = itertools.count()
+        self.answers: List[float] = []
+        self.first_deltas: List[float] = []
+        self.frames = 0
+        self.errors: Counter[str] = Counter()
+        self.conn: Any = None
+
+    async def connect(self) -> None:
+        """Opens the socket."""
+        self.conn = await websockets.connect(self.url, max_queue=None)
+
+    async def close(self) -> None:
+        """Closes the socket."""
+        await self.conn.close()
+
+    async def request(self, op: str, **fields: Any) -> Dict[str, Any]:
+        """
+        Sends a request and reads frames until its reply.
+
+        :param op: operation.
+        :param fields: other fields of the request.
+        :returns: the reply.
+        """
+        rid = str(next(self.rids))
+        frame = {"v": 1, "rid": rid, "op": op, "tid": self.tid, **fields}
+        started = time.perf_counter()
+        first_delta = None
+        await self.conn.send(json.dumps(frame))
+        while True:
+            reply = json.loads(await self.conn.recv())
+            self.frames += 1
+            if reply.get("rid") != rid:
+                continue
+            if reply.get("event") == "delta" and first_delta is None:
+                first_delta = time.perf_counter() - started
+                self.first_deltas.append(first_delta)
+            if "ok" in reply:
+                if not reply["ok"]:
+                    self.errors[reply["error"]["code"]] += 1
+                return reply
+
+    async def run(self, requests: int) -> None:
+        """
+        Asks questions and streams the answers, one after the other.
+
+        :param requests: questions to ask.
+        """
+        for index in range(requests):
+            await self.request("question", message=f"Question {index}?")
+            started = time.perf_counter()
+            reply = await self.request("answer", stream=True)
+            if reply["ok"]:
+                self.answers.append(time.perf_counter() - started)
+
+
+async def rest_caller(
+    client: httpx.AsyncClient,
+    user: Dict[str, str],
+    requests: int,
+    latencies: Dict[str, List[float]],
+    statuses: Counter[int],
+) -> None:
+    """
+    Lists threads and messages of a user.
+
+    :param client: http client of the server.
+    :param user: token and thread id of the user.
+    :param requests: rounds of calls.
+    :param latencies: latencies by route, filled in.
+    :param statuses: status codes, filled in.
+    """
+    headers = {"Authorization": f"Bearer {user['token']}"}
+    calls = (
+        ("/api/list-thread", None),
+        ("/api/list-messages", {"tid": user["tid"]}),
+    )
+    for _ in range(requests):
+        for route, body in calls:
+            started = time.perf_counter()
+            response = await client.post(route, headers=headers, json=body)
+            latencies.setdefault(route, []).append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+
+
+async def run(args: argparse.Namespace, server_pid: int) -> Dict[str, Any]:
+    """
+    Runs the benchmark against a started server.
+
+    :param args: command line arguments.
+    :param server_pid: process id of the server, to read its memory.
+    :returns: benchmark report.
+    """
+    url = f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.rest + args.users)
+    client = httpx.AsyncClient(base_url=url, limits=limits, timeout=120)
+    async with client:
+        users = await asyncio.gather(*(create_user(client) for _ in range(args.users)))
+
+        baseline = rss_kb(server_pid)
+        ws_url = f"ws://127.0.0.1:{args.port}/api/ws"
+        clients = [
+            WsClient(ws_url, users[index % len(users)])
+            for index in range(args.clients)
+        ]
+        await asyncio.gather(*(ws.connect() for ws in clients))
+        await asyncio.sleep(args.settle)
+        connected = rss_kb(server_pid)
+
+        latencies: Dict[str, List[float]] = {}
+        statuses: Counter[int] = Counter()
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(ws.run(args.requests) for ws in clients),
+            *(
+                rest_caller(
+                    client,
+                    users[index % len(users)],
+                    args.rest_requests,
+                    latencies,
+                    statuses,
+                )
+                for index in range(args.rest)
+            ),
+        )
+        elapsed = time.perf_counter() - started
+        await asyncio.gather(*(ws.close() for ws in clients))
+
+    answers = [sample for ws in clients for sample in ws.answers]
+    errors: Counter[str] = Counter()
+    for ws in clients:
+        errors.update(ws.errors)
+    per_connection = None
+    if baseline is not None and connected is not None:
+        per_connection = round((connected - baseline) / max(args.clients, 1), 2)
+    return {
+        "commit": git_commit(),
+        "config": vars(args),
+        "seconds": round(elapsed, 3),
+        "websocket": {
+            "answers": len(answers),
+            "answers_per_second": round(len(answers) / elapsed, 2),
+            "frames_per_second": round(sum(ws.frames for ws in clients) / elapsed, 2),
+            "answer_ms": percentiles(answers),
+            "first_delta_ms": percentiles(
+                [sample for ws in clients for sample in ws.first_deltas],
+            ),
+            "errors": dict(errors),
+        },
+        "rest": {
+            "requests_per_second": round(sum(statuses.values()) / elapsed, 2),
+            "statuses": dict(statuses),
+            "latency_ms": {
+                route: percentiles(samples) for route, samples in latencies.items()
+            },
+        },
+        "memory": {
+            "baseline_rss_kb": baseline,
+            "connected_rss_kb": connected,
+            "per_connection_kb": per_connection,
+        },
+    }
+
+
+def main() -> None:
+    """Entrypoint of the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--rest", type=int, default=20)
+    parser.add_argument("--rest-requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--chunk-delay", type=float, default=0.01)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--openai-port", type=int, default=8100)
+    parser.add_argument("--settle", type=float, default=1.0)
+    parser.add_argument("--output", default="ws_load.json")
+    args = parser.parse_args()
+
+    fake_openai = spawn(
+        "benchmarks.fake_openai",
+        "--port", str(args.openai_port),
+        "--latency", str(args.latency),
+        "--chunks", str(args.chunks),
+        "--chunk-delay", str(args.chunk_delay),
+    )  # fmt: skip
+    server = spawn(
+        "benchmarks.server",
+        "--port", str(args.port),
+        env={
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{args.openai_port}/v1",
+            "OPENAI_API_KEY": "benchmark",
+            "JWT_SECRET": os.environ.get("JWT_SECRET", uuid.uuid4().hex * 2),
+            # A few users send every request, the per user limits would
+            # measure the limiter instead of the server.
+            "RATELIMIT_ENABLED": "false",
+        },
+    )  # fmt: skip
+    try:
+        asyncio.run(wait_until_up(f"http://127.0.0.1:{args.openai_port}/v1/threads"))
+        asyncio.run(wait_until_up(f"http://127.0.0.1:{args.port}/api/health"))
+        report = asyncio.run(run(args, server.pid))
+    finally:
+        server.terminate()
+        fake_openai.terminate()
+        server.wait()
+        fake_openai.wait()
+
+    with Path(args.output).open("w") as output:
+        json.dump(report, output, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
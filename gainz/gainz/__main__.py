@@ -1,9 +1,28 @@
+import os
+import shutil
+
 import uvicorn
 
 from gainz.settings import settings
 
+
+def set_multiproc_dir() -> None:
+    """
+    Sets the directory where prometheus_client keeps the metrics of each worker.
+
+    It has to be set before any worker imports prometheus_client, and it is
+    cleaned on every start so no stale values of old workers are reported.
+    """
+    shutil.rmtree(settings.prometheus_dir, ignore_errors=True)
+    settings.prometheus_dir.mkdir(parents=True, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = str(
+        settings.prometheus_dir.expanduser().absolute(),
+    )
+
+
 def main() -> None:
     """Entrypoint of the application."""
+    set_multiproc_dir()
     uvicorn.run(
         "gainz.web.application:get_app",
         workers=settings.workers_count,
@@ -11,6 +30,10 @@ def main() -> None:
         port=settings.port,
         reload=settings.reload,
         log_level=settings.log_level.value.lower(),
+        ws_ping_interval=settings.ws_ping_interval,
+        ws_ping_timeout=settings.ws_ping_timeout,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.forwarded_allow_ips,
         factory=True,
     )
 
@@ -1,63 +1,226 @@
+import atexit
+import contextvars
 import logging
+import queue
+import random
 import sys
-from typing import Union
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
 
-from loguru import logger
+import ujson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from gainz.settings import settings
 
+# Correlation ids of the request or websocket being handled. Tasks copy
+# the context they are created in, so the ids follow the work they start.
+request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "request_id",
+    default=None,
+)
+socket_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "socket_id",
+    default=None,
+)
 
-class InterceptHandler(logging.Handler):
+# Libraries that log a record per operation at DEBUG and INFO.
+NOISY_LOGGERS = ("pymongo", "httpcore", "httpx", "openai", "asyncio", "multipart")
+
+# Header carrying the request id, taken from the client when it sends one.
+REQUEST_ID_HEADER = b"x-request-id"
+
+_listener: Optional[QueueListener] = None
+_traceback_formatter = logging.Formatter()
+
+
+class ContextFilter(logging.Filter):
+    """Stamps records with the correlation ids of the current context."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """
+        Adds request_id and socket_id to the record.
+
+        :param record: record to stamp.
+        :returns: always True.
+        """
+        record.request_id = request_id.get()
+        record.socket_id = socket_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a share of the records of high-volume loggers.
+
+    Only records below WARNING are sampled, warnings and errors always go
+    through. A record is dropped before it is queued or formatted.
     """
-    Default handler from examples in loguru documentation.
 
-    This handler intercepts all log requests and
-    passes them to loguru.
+    def __init__(self, rates: Dict[str, float]) -> None:
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """
+        Decides whether the record is kept.
+
+        :param record: record to check.
+        :returns: whether the record is kept.
+        """
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.name)
+        return rate is None or random.random() < rate  # noqa: S311
+
 
-    For more info see:
-    https://loguru.readthedocs.io/en/stable/overview.html#entirely-compatible-with-standard-logging
+class LogQueueHandler(QueueHandler):
     """
+    Puts records on the queue of the listener thread.
 
-    def emit(self, record: logging.LogRecord) -> None:  # pragma: no cover
+    Unlike QueueHandler, the record is not formatted nor copied by the
+    caller: only its message is merged with its arguments (and the traceback
+    rendered), the rest of the formatting happens in the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
         """
-        Propagates logs to loguru.
+        Makes a record safe to hand to another thread.
 
-        :param record: record to log.
+        :param record: record to prepare.
+        :returns: the same record.
         """
-        try:
-            level: Union[str, int] = logger.level(record.levelname).name
-        except ValueError:
-            level = record.levelno
-
-        # Find caller from where originated the logged message
-        frame, depth = logging.currentframe(), 2
-        while frame.f_code.co_filename == logging.__file__:
-            frame = frame.f_back  # type: ignore
-            depth += 1
-
-        logger.opt(depth=depth, exception=record.exc_info).log(
-            level,
-            record.getMessage(),
-        )
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Formats a record.
+
+        :param record: record to format.
+        :returns: JSON line.
+        """
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in ("request_id", "socket_id"):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return ujson.dumps(entry, ensure_ascii=False)
+
+
+def skip_unused_fields() -> None:
+    """
+    Stops filling the record fields the JSON lines do not carry.
+
+    Finding the caller walks the stack on every record, and thread and
+    process names are looked up for each one. These are the switches of the
+    "Optimization" section of the logging HOWTO.
+    """
+    logging._srcfile = None  # type: ignore # noqa: SLF001
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
 
 
 def configure_logging() -> None:  # pragma: no cover
-    """Configures logging."""
-    intercept_handler = InterceptHandler()
+    """
+    Configures logging.
 
-    logging.basicConfig(handlers=[intercept_handler], level=logging.NOTSET)
+    Records are filtered by level on the logger, before a record is even
+    created, then sampled, stamped with the correlation ids and put on a
+    queue. A listener thread formats them as JSON and writes them to stdout,
+    so a slow stdout never blocks the event loop.
 
-    for logger_name in logging.root.manager.loggerDict:
-        if logger_name.startswith("uvicorn."):
-            logging.getLogger(logger_name).handlers = []
+    Safe to call more than once.
+    """
+    global _listener  # noqa: PLW0603
+    if _listener is not None:
+        return
+
+    skip_unused_fields()
+    handler = LogQueueHandler(queue.SimpleQueue())  # type: ignore
+    handler.addFilter(SamplingFilter(settings.log_sample_rates))
+    handler.addFilter(ContextFilter())
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JSONFormatter())
+    _listener = QueueListener(handler.queue, output)  # type: ignore
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(settings.log_level.value)
+    for name in NOISY_LOGGERS:
+        logging.getLogger(name).setLevel(
+            max(logging.WARNING, logging.getLevelName(settings.log_level.value)),
+        )
 
-    # change handler for default uvicorn logger
-    logging.getLogger("uvicorn").handlers = [intercept_handler]
-    logging.getLogger("uvicorn.access").handlers = [intercept_handler]
+    # uvicorn loggers go through the root handler.
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
 
-    # set logs output, level and format
-    logger.remove()
-    logger.add(
-        sys.stdout,
-        level=settings.log_level.value,
-    )
+
+class CorrelationMiddleware:
+    """
+    Gives every HTTP request an id, set on its log records.
+
+    The id comes from the X-Request-ID header when the client (or a proxy)
+    sends one and is echoed back in the response.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Runs the request with its id set.
+
+        :param scope: ASGI scope.
+        :param receive: ASGI receive callable.
+        :param send: ASGI send callable.
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rid = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER and 0 < len(value) <= 128:
+                rid = value.decode("latin-1")
+                break
+        if rid is None:
+            rid = uuid.uuid4().hex
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((REQUEST_ID_HEADER, rid.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        token = request_id.set(rid)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
@@ -0,0 +1 @@
+"""In-process and Redis caches."""
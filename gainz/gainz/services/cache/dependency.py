@@ -0,0 +1,16 @@
+from starlette.requests import HTTPConnection
+
+from gainz.services.cache.users import UserCache
+
+
+def get_user_cache(
+    request: HTTPConnection,
+) -> UserCache:  # pragma: no cover
+    """
+    Returns the user cache.
+
+    :param request: current request or websocket.
+    :returns: user cache.
+    """
+    return request.app.state.user_cache
+
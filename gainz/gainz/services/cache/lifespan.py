@@ -0,0 +1,21 @@
+from fastapi import FastAPI
+
+from gainz.services.cache.users import UserCache
+from gainz.settings import settings
+
+
+def init_user_cache(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Creates the user cache.
+
+    Must be called after the redis pool is initialized.
+
+    :param app: current fastapi application.
+    """
+    app.state.user_cache = UserCache(
+        app.state.redis_pool,
+        ttl=settings.user_cache_ttl,
+        local_size=settings.user_cache_local_size,
+        local_ttl=settings.user_cache_local_ttl,
+    )
+
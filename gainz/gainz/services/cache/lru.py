@@ -0,0 +1,81 @@
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """
+    Bounded in-process LRU cache with per-entry expiry.
+
+    Entries expire after ``ttl`` seconds unless :meth:`set` is given
+    an explicit ``ttl``. When the cache is full the least recently
+    used entry is evicted. Expiry uses the monotonic clock.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[K, Tuple[Optional[float], V]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K) -> Optional[V]:
+        """
+        Returns a cached value and marks it as recently used.
+
+        :param key: cache key.
+        :returns: the value, or None if it is missing or expired.
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V, ttl: Optional[float] = None) -> None:
+        """
+        Stores a value.
+
+        :param key: cache key.
+        :param value: value to store.
+        :param ttl: lifetime of this entry in seconds,
+            defaults to the ttl of the cache.
+        """
+        if ttl is None:
+            ttl = self.ttl
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        """
+        Removes a value if it is cached.
+
+        :param key: cache key.
+        """
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Removes every value."""
+        self._data.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of lookups that were served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,121 @@
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+from gainz.services.metrics.metrics import SINGLEFLIGHT
+from gainz.settings import settings
+
+ResultT = TypeVar("ResultT")
+FuncT = TypeVar("FuncT", bound=Callable[..., Awaitable[Any]])
+
+
+class SingleFlight(Generic[ResultT]):
+    """
+    Coalesces concurrent calls with the same key into one.
+
+    The first caller of a key starts the call in its own task, the callers
+    that arrive while it is running wait for the same result (or exception)
+    instead of making the call again. A caller that is cancelled stops
+    waiting without cancelling the call for the others.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, "asyncio.Task[ResultT]"] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(
+        self,
+        key: Hashable,
+        call: Callable[[], Awaitable[ResultT]],
+    ) -> ResultT:
+        """
+        Runs a call, or joins the one already running for the key.
+
+        :param key: calls with equal keys are coalesced.
+        :param call: coroutine function making the call.
+        :returns: result of the call.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: "asyncio.Task[ResultT]") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Marks the exception as retrieved when every caller gave up.
+            task.exception()
+
+
+class WriteGeneration:
+    """
+    Counts the writes this process made to some data.
+
+    A read is only coalesced with reads of the same generation, so a read
+    issued after a write never gets the result of a call that started
+    before it. Writes bump the generation once they are done.
+    """
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def bump(self) -> None:
+        """Records that a write is done."""
+        self.value += 1
+
+
+def coalesce(
+    site: str,
+    key: Optional[Callable[..., Hashable]] = None,
+    generation: Optional[WriteGeneration] = None,
+) -> Callable[[FuncT], FuncT]:
+    """
+    Decorates a read function so concurrent identical calls share one call.
+
+    The callers get the same result object, so it must not be mutated.
+    Calls are counted on gainz_singleflight_calls_total, as "leader" when
+    they make the call and "joined" when they wait for one. A site listed
+    in the singleflight_disabled setting calls through every time.
+
+    :param site: name of the call site.
+    :param key: computes the key from the arguments, defaults to all of them.
+    :param generation: writes of the data read, calls after one of them do
+        not join the calls before it.
+    :returns: the decorator.
+    """
+
+    def decorator(func: FuncT) -> FuncT:
+        flight: SingleFlight[Any] = SingleFlight()
+        leader = SINGLEFLIGHT.labels(site, "leader")
+        joined = SINGLEFLIGHT.labels(site, "joined")
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if site in settings.singleflight_disabled:
+                return await func(*args, **kwargs)
+            if key is not None:
+                flight_key = key(*args, **kwargs)
+            else:
+                flight_key = (args, tuple(sorted(kwargs.items())))
+            if generation is not None:
+                flight_key = (generation.value, flight_key)
+            try:
+                running = flight_key in flight
+            except TypeError:
+                # Unhashable arguments, nothing to share.
+                return await func(*args, **kwargs)
+            (joined if running else leader).inc()
+            return await flight.do(flight_key, lambda: func(*args, **kwargs))
+
+        wrapper.flight = flight  # type: ignore
+        return wrapper  # type: ignore
+
+    return decorator
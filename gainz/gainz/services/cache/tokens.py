@@ -0,0 +1,63 @@
+import hashlib
+import time
+from typing import Any, Dict, Optional
+
+from gainz.services.cache.lru import LRUCache
+
+
+class TokenCache:
+    """
+    Cache of verified JWT claims.
+
+    Tokens are keyed by their SHA-256 digest, so the cache never holds
+    a usable token. Every entry expires at the ``exp`` claim of its
+    token, after which the token has to go through a full verification
+    again and is rejected as expired.
+
+    There is no revocation (no logout or password change ends a token),
+    so a cached token is valid until it expires. Revocation would need a
+    store shared by the workers, checked before this cache.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.verified: LRUCache[bytes, Dict[str, Any]] = LRUCache(maxsize)
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        """
+        Returns the cache key of a token.
+
+        :param token: encoded JWT.
+        :returns: SHA-256 digest of the token.
+        """
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the claims of an already verified token.
+
+        :param token: encoded JWT.
+        :returns: claims, or None if the token has to be verified.
+        """
+        return self.verified.get(self.digest(token))
+
+    def set(self, token: str, claims: Dict[str, Any]) -> None:
+        """
+        Stores the claims of a verified token until it expires.
+
+        Tokens without ``exp`` are not cached.
+
+        :param token: encoded JWT.
+        :param claims: decoded claims.
+        """
+        ttl = self._ttl(claims)
+        if ttl is None or ttl <= 0:
+            return
+        self.verified.set(self.digest(token), claims, ttl=ttl)
+
+    @staticmethod
+    def _ttl(claims: Dict[str, Any]) -> Optional[float]:
+        exp = claims.get("exp")
+        if exp is None:
+            return None
+        return float(exp) - time.time()
@@ -0,0 +1,99 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import ujson
+from redis.asyncio import ConnectionPool, Redis
+from redis.exceptions import RedisError
+
+from gainz.services.cache.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Only these fields of a User document are cached.
+# The password hash never leaves the database.
+PRINCIPAL_FIELDS = ("id", "name", "email")
+
+UserLoader = Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class UserCache:
+    """
+    Read-through cache of authenticated users.
+
+    Lookups go to a small in-process LRU first, then to Redis and only
+    then to the loader, which reads the database. Values are stored as
+    JSON principals, so a hit costs no BSON decoding.
+
+    The in-process entries live for a few seconds only. Invalidation
+    removes the Redis entry, so other workers see an update once their
+    local entry expires.
+    """
+
+    def __init__(
+        self,
+        redis_pool: ConnectionPool,
+        ttl: int = 300,
+        local_size: int = 1024,
+        local_ttl: float = 5.0,
+    ) -> None:
+        self._redis_pool = redis_pool
+        self._ttl = ttl
+        self.local: LRUCache[str, Dict[str, Any]] = LRUCache(local_size, local_ttl)
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return f"user:{user_id}"
+
+    async def get(self, user_id: str, loader: UserLoader) -> Optional[Dict[str, Any]]:
+        """
+        Returns the principal of a user.
+
+        :param user_id: id of the user.
+        :param loader: coroutine function reading the user from the database.
+        :returns: the cached principal, or None if the user does not exist.
+        """
+        principal = self.local.get(user_id)
+        if principal is not None:
+            return principal
+        try:
+            async with Redis(connection_pool=self._redis_pool) as redis:
+                raw = await redis.get(self._key(user_id))
+        except RedisError as exc:
+            logger.warning("User cache read failed: %s", exc)
+            raw = None
+        if raw is not None:
+            principal = ujson.loads(raw)
+        else:
+            user = await loader()
+            if user is None:
+                return None
+            principal = {field: user.get(field) for field in PRINCIPAL_FIELDS}
+            await self._store(user_id, principal)
+        self.local.set(user_id, principal)
+        return principal
+
+    async def invalidate(self, user_id: str) -> None:
+        """
+        Drops a user from the cache.
+
+        Must be called by every code path that changes a User document.
+
+        :param user_id: id of the user.
+        """
+        self.local.pop(user_id)
+        try:
+            async with Redis(connection_pool=self._redis_pool) as redis:
+                await redis.delete(self._key(user_id))
+        except RedisError as exc:
+            logger.warning("User cache invalidation failed: %s", exc)
+
+    async def _store(self, user_id: str, principal: Dict[str, Any]) -> None:
+        try:
+            async with Redis(connection_pool=self._redis_pool) as redis:
+                await redis.set(
+                    self._key(user_id),
+                    ujson.dumps(principal),
+                    ex=self._ttl,
+                )
+        except RedisError as exc:
+            logger.warning("User cache write failed: %s", exc)
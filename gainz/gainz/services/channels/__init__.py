@@ -0,0 +1 @@
+"""Cross-worker event fan-out over redis pub/sub."""
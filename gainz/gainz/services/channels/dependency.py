@@ -0,0 +1,15 @@
+from starlette.requests import HTTPConnection
+
+from gainz.services.channels.layer import ChannelLayer
+
+
+def get_channel_layer(
+    request: HTTPConnection,
+) -> ChannelLayer:  # pragma: no cover
+    """
+    Returns the channel layer of this worker.
+
+    :param request: current request or websocket.
+    :returns: channel layer.
+    """
+    return request.app.state.channel_layer
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import ujson
+from redis.asyncio import ConnectionPool, Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+Event = Dict[str, Any]
+EventHandler = Callable[[Event], Awaitable[None]]
+
+# Seconds the listener waits for a message before checking for shutdown.
+POLL_TIMEOUT = 0.5
+
+
+def thread_channel(tid: str) -> str:
+    """
+    Returns the channel of a thread.
+
+    :param tid: thread id.
+    :returns: channel name.
+    """
+    return f"gainz:thread:{tid}"
+
+
+def user_channel(uid: str) -> str:
+    """
+    Returns the channel of a user.
+
+    :param uid: user id.
+    :returns: channel name.
+    """
+    return f"gainz:user:{uid}"
+
+
+class ChannelLayer:
+    """
+    Delivers events published by any worker to the local subscribers.
+
+    Each worker holds one redis pub/sub connection. A redis channel is
+    subscribed while at least one local handler follows it, and every
+    message received on it is passed to those handlers. Publishing goes
+    through redis even for local subscribers, so all workers and nodes
+    see the same stream of events without sticky routing.
+    """
+
+    def __init__(self, redis_pool: ConnectionPool) -> None:
+        self._redis = Redis(connection_pool=redis_pool)
+        self._pubsub = self._redis.pubsub()
+        self._handlers: Dict[str, Set[EventHandler]] = {}
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._running = False
+        self._connect_lock = asyncio.Lock()
+
+    def start(self) -> None:
+        """
+        Starts listening for events.
+
+        Nothing is sent to redis here: the listener opens the pub/sub
+        connection in the background, and retries until redis is up.
+        """
+        self._running = True
+        self._task = asyncio.create_task(self._listen())
+
+    async def connect(self) -> None:
+        """Opens the pub/sub connection, unless it is already open."""
+        # The listener, the warmup and the first subscribe may all get here
+        # before the connection is set, only one of them opens it.
+        async with self._connect_lock:
+            if self._pubsub.connection is None:
+                await self._pubsub.connect()
+
+    async def stop(self) -> None:
+        """Stops listening and closes the pub/sub connection."""
+        # The listener notices the flag within one poll timeout. Cancelling it
+        # is not reliable, the redis client may swallow the cancellation.
+        self._running = False
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self._pubsub.aclose()
+        await self._redis.aclose()
+
+    async def subscribe(self, channel: str, handler: EventHandler) -> None:
+        """
+        Delivers events of a channel to a handler.
+
+        :param channel: channel name.
+        :param handler: coroutine function called with every event.
+        """
+        handlers = self._handlers.setdefault(channel, set())
+        first = not handlers
+        handlers.add(handler)
+        if first:
+            await self.connect()
+            await self._pubsub.subscribe(channel)
+
+    async def unsubscribe(self, channel: str, handler: EventHandler) -> None:
+        """
+        Stops delivering events of a channel to a handler.
+
+        :param channel: channel name.
+        :param handler: handler passed to :meth:`subscribe`.
+        """
+        handlers = self._handlers.get(channel)
+        if handlers is None:
+            return
+        handlers.discard(handler)
+        if not handlers:
+            del self._handlers[channel]
+            await self._pubsub.unsubscribe(channel)
+
+    async def publish(self, channel: str, event: Event) -> None:
+        """
+        Publishes an event to every worker.
+
+        :param channel: channel name.
+        :param event: JSON serializable event.
+        """
+        await self._redis.publish(channel, ujson.dumps(event))
+
+    async def _listen(self) -> None:
+        while self._running:
+            try:
+                await self.connect()
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=POLL_TIMEOUT,
+                )
+            except RedisError as exc:
+                logger.warning("Channel layer connection failed: %s", exc)
+                await asyncio.sleep(1)
+                continue
+            if message is None or message["type"] != "message":
+                continue
+            channel = message["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode("utf-8")
+            await self._deliver(channel, ujson.loads(message["data"]))
+
+    async def _deliver(self, channel: str, event: Event) -> None:
+        for handler in list(self._handlers.get(channel, ())):
+            try:
+                await handler(event)
+            except Exception:
+                logger.exception("Failed to deliver event on %s", channel)
+
+
+class ChannelSubscriber:
+    """
+    Channels followed by one consumer, such as a websocket.
+
+    Events carrying this consumer's ``origin`` are skipped, so a socket
+    does not receive a second copy of what it was already sent directly.
+    """
+
+    def __init__(self, layer: ChannelLayer, origin: str, handler: EventHandler) -> None:
+        self.origin = origin
+        self.channels: Set[str] = set()
+        self._layer = layer
+        self._handler = handler
+
+    async def follow(self, channel: str) -> None:
+        """
+        Starts following a channel, once.
+
+        :param channel: channel name.
+        """
+        if channel not in self.channels:
+            self.channels.add(channel)
+            await self._layer.subscribe(channel, self._receive)
+
+    async def publish(self, channel: str, event: Event) -> None:
+        """
+        Publishes an event that this consumer already has.
+
+        :param channel: channel name.
+        :param event: JSON serializable event.
+        """
+        await self._layer.publish(channel, {**event, "origin": self.origin})
+
+    async def close(self) -> None:
+        """Stops following every channel."""
+        for channel in self.channels:
+            await self._layer.unsubscribe(channel, self._receive)
+        self.channels.clear()
+
+    async def _receive(self, event: Event) -> None:
+        if event.get("origin") == self.origin:
+            return
+        await self._handler({key: val for key, val in event.items() if key != "origin"})
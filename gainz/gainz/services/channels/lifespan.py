@@ -0,0 +1,26 @@
+from fastapi import FastAPI
+
+from gainz.services.channels.layer import ChannelLayer
+
+
+def init_channels(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Starts the channel layer of this worker.
+
+    Redis is not reached here, the pub/sub connection is opened in the
+    background (see start_warmup). Must be called after the redis pool is
+    initialized.
+
+    :param app: current fastapi application.
+    """
+    app.state.channel_layer = ChannelLayer(app.state.redis_pool)
+    app.state.channel_layer.start()
+
+
+async def shutdown_channels(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Stops the channel layer.
+
+    :param app: current FastAPI app.
+    """
+    await app.state.channel_layer.stop()
@@ -0,0 +1 @@
+"""Registry of the websocket connections of a worker."""
@@ -0,0 +1,15 @@
+from starlette.requests import HTTPConnection
+
+from gainz.services.connections.registry import ConnectionRegistry
+
+
+def get_connection_registry(
+    request: HTTPConnection,
+) -> ConnectionRegistry:  # pragma: no cover
+    """
+    Returns the connection registry of this worker.
+
+    :param request: current request or websocket.
+    :returns: connection registry.
+    """
+    return request.app.state.connections
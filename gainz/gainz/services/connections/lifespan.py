@@ -0,0 +1,27 @@
+from fastapi import FastAPI
+
+from gainz.services.connections.registry import ConnectionRegistry
+from gainz.settings import settings
+
+
+def init_connections(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Creates the connection registry and starts its heartbeat task.
+
+    :param app: current fastapi application.
+    """
+    app.state.connections = ConnectionRegistry(
+        max_connections=settings.ws_max_connections,
+        heartbeat_interval=settings.ws_heartbeat_interval,
+        idle_timeout=settings.ws_idle_timeout,
+    )
+    app.state.connections.start()
+
+
+async def shutdown_connections(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Stops the heartbeat task of the connection registry.
+
+    :param app: current FastAPI app.
+    """
+    await app.state.connections.stop()
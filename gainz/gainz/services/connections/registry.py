@@ -0,0 +1,185 @@
+import asyncio
+import contextlib
+import logging
+import time
+import uuid
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Close codes sent to evicted and rejected clients.
+IDLE_CLOSE_CODE = 1001
+BUSY_CLOSE_CODE = 1013
+
+
+class TooManyConnectionsError(Exception):
+    """Raised when the worker already holds the maximum of connections."""
+
+
+class Connection:
+    """State kept for one websocket, small enough to hold many of."""
+
+    __slots__ = (
+        "close",
+        "heartbeat",
+        "id",
+        "last_seen",
+        "opened_at",
+        "user_id",
+        "versioned",
+    )
+
+    def __init__(
+        self,
+        user_id: Optional[str],
+        heartbeat: Callable[[], Awaitable[None]],
+        close: Callable[[int, str], Awaitable[None]],
+    ) -> None:
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.opened_at = time.monotonic()
+        self.last_seen = self.opened_at
+        # Whether the client speaks the versioned protocol, which answers
+        # heartbeats. Set from the last frame received.
+        self.versioned = False
+        self.heartbeat = heartbeat
+        self.close = close
+
+    def touch(self, versioned: bool) -> None:
+        """
+        Records that the client sent a frame.
+
+        :param versioned: whether the frame is of the versioned protocol.
+        """
+        self.last_seen = time.monotonic()
+        self.versioned = versioned
+
+
+class ConnectionRegistry:
+    """
+    Tracks the websocket connections of a worker.
+
+    A single task walks the connections every heartbeat interval. Clients
+    of the versioned protocol that have been quiet for an interval get a
+    heartbeat, which they answer with a frame. The ones that answered
+    nothing for the idle timeout, or whose heartbeat failed, are closed, so
+    half-open connections do not pile up.
+
+    Legacy clients get no heartbeat and are never closed for being quiet:
+    they cannot answer one, and do not reconnect. Their dead connections
+    are closed by the websocket pings of the server instead.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 10000,
+        heartbeat_interval: float = 25.0,
+        idle_timeout: float = 300.0,
+    ) -> None:
+        self.max_connections = max_connections
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.rejected = 0
+        self.evicted = 0
+        self._connections: Dict[str, Connection] = {}
+        self._per_user: Counter[str] = Counter()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def start(self) -> None:
+        """Starts the heartbeat task."""
+        self._task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self) -> None:
+        """Stops the heartbeat task."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def register(self, connection: Connection) -> None:
+        """
+        Adds a connection.
+
+        :param connection: the new connection.
+        :raises TooManyConnectionsError: if the worker is full.
+        """
+        if len(self._connections) >= self.max_connections:
+            self.rejected += 1
+            raise TooManyConnectionsError
+        self._connections[connection.id] = connection
+        if connection.user_id is not None:
+            self._per_user[connection.user_id] += 1
+
+    def unregister(self, connection: Connection) -> None:
+        """
+        Removes a connection, once its socket is closed.
+
+        :param connection: the connection.
+        """
+        if self._connections.pop(connection.id, None) is None:
+            return
+        if connection.user_id is not None:
+            self._per_user[connection.user_id] -= 1
+            if self._per_user[connection.user_id] <= 0:
+                del self._per_user[connection.user_id]
+
+    def user_count(self, user_id: str) -> int:
+        """
+        Counts the connections of a user.
+
+        :param user_id: id of the user.
+        :returns: number of connections.
+        """
+        return self._per_user.get(user_id, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the connection counts.
+
+        :returns: total and per user counts, evictions and rejections.
+        """
+        return {
+            "total": len(self._connections),
+            "max": self.max_connections,
+            "users": len(self._per_user),
+            "per_user": dict(self._per_user),
+            "evicted": self.evicted,
+            "rejected": self.rejected,
+        }
+
+    async def sweep(self) -> None:
+        """Sends the heartbeats that are due and evicts idle or dead peers."""
+        now = time.monotonic()
+        for connection in list(self._connections.values()):
+            if not connection.versioned:
+                continue
+            quiet = now - connection.last_seen
+            if quiet >= self.idle_timeout:
+                await self._evict(connection, "idle")
+            elif quiet >= self.heartbeat_interval:
+                try:
+                    await connection.heartbeat()
+                except Exception:
+                    await self._evict(connection, "dead")
+
+    async def _evict(self, connection: Connection, reason: str) -> None:
+        logger.info("Evicting %s websocket %s", reason, connection.id)
+        self.unregister(connection)
+        self.evicted += 1
+        try:
+            await connection.close(IDLE_CLOSE_CODE, reason)
+        except Exception:
+            logger.debug("Websocket %s was already closed", connection.id)
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Failed to sweep websocket connections")
@@ -0,0 +1 @@
+"""Token budgeted history of the chat completions."""
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import math
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from gainz.services.cache.lru import LRUCache
+from gainz.services.cache.singleflight import SingleFlight
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+ChatMessage = Dict[str, Any]
+# Summarizes messages, given the summary of the messages before them (or None)
+# and the most tokens the summary may take.
+Summarizer = Callable[[Optional[str], List[ChatMessage], int], Awaitable[str]]
+
+# Tokens the chat format adds around every message.
+MESSAGE_OVERHEAD = 4
+# Characters per token assumed without tiktoken, about right for English.
+CHARS_PER_TOKEN = 4
+
+
+class TokenCounter:
+    """
+    Counts the tokens of chat messages, caching the count of each message.
+
+    Uses tiktoken when it is installed and the encoding can be loaded,
+    otherwise estimates from the length of the text. Only a new message is
+    counted, the ones already in the conversation are cache hits. Loading
+    the encoding and encoding a message are CPU bound (and the first load
+    may download the encoding), so both run in a worker thread.
+    """
+
+    def __init__(self, encoding: str = "o200k_base", cache_size: int = 10000) -> None:
+        self._encoding_name = encoding
+        self._encoding: Any = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._counts: LRUCache[int, int] = LRUCache(cache_size)
+
+    async def load(self) -> None:
+        """Loads the encoding in a worker thread, ahead of the first count."""
+        await asyncio.to_thread(self._load)
+
+    async def count(self, message: ChatMessage) -> int:
+        """
+        Counts the tokens of a message.
+
+        :param message: chat message.
+        :returns: tokens, with the overhead of the chat format.
+        """
+        key = hash((message.get("role"), message.get("content")))
+        tokens = self._counts.get(key)
+        if tokens is None:
+            text = str(message.get("content") or "")
+            tokens = await asyncio.to_thread(self.count_text, text)
+            tokens += MESSAGE_OVERHEAD
+            self._counts.set(key, tokens)
+        return tokens
+
+    def count_text(self, text: str) -> int:
+        """
+        Counts the tokens of a text, blocking: call it from a worker thread.
+
+        :param text: the text.
+        :returns: tokens.
+        """
+        encoding = self._load()
+        if encoding is None:
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def _load(self) -> Any:
+        # Loaded once, by the warmup or the first count, whichever thread
+        # gets here first.
+        with self._load_lock:
+            if not self._loaded:
+                if tiktoken is not None:
+                    try:
+                        self._encoding = tiktoken.get_encoding(self._encoding_name)
+                    except Exception as exc:
+                        logger.warning("Estimating token counts, no tiktoken: %r", exc)
+                self._loaded = True
+        return self._encoding
+
+
+class ContextWindow:
+    """
+    Fits the history of a conversation in a token budget.
+
+    The newest messages that fit in max_tokens are kept. Without a
+    summarizer the older ones are dropped; with one they are replaced by a
+    summary of at most summary_max_tokens, kept out of the budget of the
+    messages. Summaries are cached by the exact messages they cover and
+    extended from the longest summary cached for the start of the
+    conversation, so each message is summarized once. The cut is moved in
+    steps of summary_step messages, so a growing conversation needs a new
+    summary every summary_step messages instead of on every turn.
+    """
+
+    def __init__(
+        self,
+        counter: TokenCounter,
+        max_tokens: int = 3000,
+        summary_max_tokens: int = 300,
+        summary_step: int = 8,
+        summary_cache_size: int = 1000,
+    ) -> None:
+        self._counter = counter
+        self._max_tokens = max_tokens
+        self._summary_max_tokens = summary_max_tokens
+        self._summary_step = max(summary_step, 1)
+        # hash of the messages covered -> summary of them
+        self._summaries: LRUCache[int, str] = LRUCache(summary_cache_size)
+        # Concurrent calls needing the same summary share one upstream call.
+        self._flights: SingleFlight[str] = SingleFlight()
+
+    async def fit(
+        self,
+        messages: List[ChatMessage],
+        summarize: Optional[Summarizer] = None,
+    ) -> List[ChatMessage]:
+        """
+        Picks the messages to send upstream.
+
+        :param messages: the conversation, oldest first.
+        :param summarize: coroutine function summarizing messages, or None
+            to drop the messages that do not fit.
+        :returns: messages within the budget, led by a summary if any.
+        """
+        budget = self._max_tokens
+        if summarize is not None:
+            budget -= self._summary_max_tokens
+        cut = await self._cut(messages, budget)
+        if cut == 0:
+            return messages
+        if summarize is None:
+            return messages[cut:]
+        # Dropping a few more messages keeps the cut, and the summary,
+        # the same for the next turns.
+        cut = min(
+            math.ceil(cut / self._summary_step) * self._summary_step,
+            len(messages) - 1,
+        )
+        summary = await self._summary(messages, cut, summarize)
+        lead = {
+            "role": "system",
+            "content": f"Summary of the conversation so far: {summary}",
+        }
+        return [lead, *messages[cut:]]
+
+    async def _cut(self, messages: List[ChatMessage], budget: int) -> int:
+        # Index of the oldest message kept. The newest one is always kept.
+        used = 0
+        for index in range(len(messages) - 1, -1, -1):
+            used += await self._counter.count(messages[index])
+            if used > budget and index < len(messages) - 1:
+                return index + 1
+        return 0
+
+    async def _summary(
+        self,
+        messages: List[ChatMessage],
+        cut: int,
+        summarize: Summarizer,
+    ) -> str:
+        # prefixes[i] identifies messages[:i]
+        prefixes = [0]
+        for message in messages[:cut]:
+            key = (prefixes[-1], message.get("role"), message.get("content"))
+            prefixes.append(hash(key))
+        cached = self._summaries.get(prefixes[cut])
+        if cached is not None:
+            return cached
+        return await self._flights.do(
+            prefixes[cut],
+            lambda: self._extend(messages, prefixes, cut, summarize),
+        )
+
+    async def _extend(
+        self,
+        messages: List[ChatMessage],
+        prefixes: List[int],
+        cut: int,
+        summarize: Summarizer,
+    ) -> str:
+        # Starts from the longest summary cached for a start of messages[:cut].
+        start, previous = 0, None
+        for index in range(cut - 1, 0, -1):
+            previous = self._summaries.get(prefixes[index])
+            if previous is not None:
+                start = index
+                break
+        summary = await summarize(
+            previous,
+            messages[start:cut],
+            self._summary_max_tokens,
+        )
+        self._summaries.set(prefixes[cut], summary)
+        return summary
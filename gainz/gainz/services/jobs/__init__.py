@@ -0,0 +1 @@
+"""Jobs on a Redis stream, run by gainz.worker processes."""
@@ -0,0 +1,17 @@
+from typing import Optional
+
+from starlette.requests import HTTPConnection
+
+from gainz.services.jobs.queue import JobQueue
+
+
+def get_job_queue(
+    request: HTTPConnection,
+) -> Optional[JobQueue]:  # pragma: no cover
+    """
+    Returns the run job queue.
+
+    :param request: current request or websocket.
+    :returns: job queue, None when jobs are disabled.
+    """
+    return request.app.state.job_queue
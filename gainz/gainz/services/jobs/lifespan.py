@@ -0,0 +1,44 @@
+from fastapi import FastAPI
+
+from gainz.services.jobs.queue import JobQueue
+from gainz.settings import settings
+
+
+def create_job_queue(app: FastAPI) -> JobQueue:  # pragma: no cover
+    """
+    Creates the run job queue from the settings.
+
+    :param app: application holding the redis pool.
+    :returns: the queue.
+    """
+    return JobQueue(
+        app.state.redis_pool,
+        settings.jobs_stream,
+        settings.jobs_group,
+        max_attempts=settings.jobs_max_attempts,
+        retry_backoff=settings.jobs_retry_backoff,
+        max_len=settings.jobs_max_len,
+    )
+
+
+def init_job_queue(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Creates the run job queue, when jobs are enabled.
+
+    Must be called after the redis pool is initialized.
+
+    :param app: current fastapi application.
+    """
+    app.state.job_queue = None
+    if settings.jobs_enabled:
+        app.state.job_queue = create_job_queue(app)
+
+
+async def shutdown_job_queue(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Closes the run job queue.
+
+    :param app: current FastAPI app.
+    """
+    if app.state.job_queue is not None:
+        await app.state.job_queue.close()
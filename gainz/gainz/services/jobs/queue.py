@@ -0,0 +1,227 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import ujson
+from redis.asyncio import ConnectionPool, Redis
+from redis.exceptions import ResponseError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    """A job read from the stream."""
+
+    id: str
+    kind: str
+    payload: Dict[str, Any]
+    # Attempts made before this one.
+    attempts: int = 0
+    # Epoch seconds before which a retried job does not run.
+    not_before: float = 0.0
+
+
+def _decode(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def parse_entry(entry_id: Any, fields: Dict[Any, Any]) -> Job:
+    """
+    Builds a job from a stream entry.
+
+    :param entry_id: id of the entry.
+    :param fields: fields of the entry.
+    :returns: the job.
+    """
+    values = {_decode(key): _decode(value) for key, value in fields.items()}
+    return Job(
+        id=_decode(entry_id),
+        kind=values["kind"],
+        payload=ujson.loads(values["payload"]),
+        attempts=int(values.get("attempts", 0)),
+        not_before=float(values.get("not_before", 0)),
+    )
+
+
+class JobQueue:
+    """
+    Jobs on a Redis stream, shared by the consumers of a group.
+
+    Web workers enqueue, gainz.worker processes read with XREADGROUP, so
+    every job goes to one consumer. A job stays pending until it is acked,
+    jobs of a consumer that died are claimed by another one after
+    claim_idle seconds. A failed job is added again with one more attempt
+    and a backoff, after max_attempts it goes to the dead letter stream.
+    """
+
+    def __init__(
+        self,
+        redis_pool: ConnectionPool,
+        stream: str,
+        group: str,
+        *,
+        max_attempts: int = 3,
+        retry_backoff: float = 2.0,
+        max_len: int = 100000,
+    ) -> None:
+        self._redis = Redis(connection_pool=redis_pool)
+        self.stream = stream
+        self.dead_stream = f"{stream}:dead"
+        self.group = group
+        self._max_attempts = max_attempts
+        self._retry_backoff = retry_backoff
+        self._max_len = max_len
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        attempts: int = 0,
+        not_before: float = 0.0,
+    ) -> str:
+        """
+        Adds a job.
+
+        :param kind: which handler runs the job.
+        :param payload: JSON serializable arguments of the handler.
+        :param attempts: attempts already made.
+        :param not_before: epoch seconds before which the job does not run.
+        :returns: id of the job.
+        """
+        entry_id = await self._redis.xadd(
+            self.stream,
+            self._fields(kind, payload, attempts, not_before),
+            maxlen=self._max_len,
+            approximate=True,
+        )
+        return _decode(entry_id)
+
+    async def create_group(self) -> None:
+        """Creates the consumer group, with the stream, unless it exists."""
+        try:
+            await self._redis.xgroup_create(self.stream, self.group, "0", mkstream=True)
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    async def read(self, consumer: str, count: int, block_ms: int) -> List[Job]:
+        """
+        Reads new jobs for a consumer.
+
+        :param consumer: name of the consumer.
+        :param count: jobs to read at most.
+        :param block_ms: milliseconds to wait for a job.
+        :returns: the jobs, pending until acked.
+        """
+        response = await self._redis.xreadgroup(
+            self.group,
+            consumer,
+            {self.stream: ">"},
+            count=count,
+            block=block_ms,
+        )
+        return [
+            parse_entry(entry_id, fields)
+            for _, entries in response or []
+            for entry_id, fields in entries
+            if fields
+        ]
+
+    async def claim(self, consumer: str, min_idle: float, count: int) -> List[Job]:
+        """
+        Takes over jobs left pending by consumers that stopped.
+
+        :param consumer: name of the consumer taking them.
+        :param min_idle: seconds a job has been pending at least.
+        :param count: jobs to claim at most.
+        :returns: the claimed jobs.
+        """
+        response = await self._redis.xautoclaim(
+            self.stream,
+            self.group,
+            consumer,
+            int(min_idle * 1000),
+            start_id="0-0",
+            count=count,
+        )
+        entries: List[Tuple[Any, Any]] = response[1]
+        return [parse_entry(entry_id, fields) for entry_id, fields in entries if fields]
+
+    async def touch(self, consumer: str, job_ids: List[str]) -> None:
+        """
+        Resets the idle time of jobs a consumer is still running.
+
+        :param consumer: name of the consumer running them.
+        :param job_ids: ids of the jobs.
+        """
+        if job_ids:
+            await self._redis.xclaim(
+                self.stream,
+                self.group,
+                consumer,
+                0,
+                job_ids,
+                justid=True,
+            )
+
+    async def ack(self, job: Job) -> None:
+        """
+        Marks a job as done.
+
+        :param job: the job.
+        """
+        await self._redis.xack(self.stream, self.group, job.id)
+
+    async def fail(self, job: Job, error: str) -> Optional[str]:
+        """
+        Retries a failed job, or moves it to the dead letter stream.
+
+        The job is added again (or dead lettered) and acked in one
+        transaction, so it is never lost nor run twice by this path.
+
+        :param job: the job.
+        :param error: why it failed.
+        :returns: id of the retry, None when the job is dead.
+        """
+        attempts = job.attempts + 1
+        retry = attempts < self._max_attempts
+        async with self._redis.pipeline(transaction=True) as pipe:
+            if retry:
+                not_before = time.time() + self._retry_backoff * 2 ** (attempts - 1)
+                fields = self._fields(job.kind, job.payload, attempts, not_before)
+                pipe.xadd(self.stream, fields, maxlen=self._max_len, approximate=True)
+            else:
+                fields = self._fields(job.kind, job.payload, attempts)
+                fields.update({"job": job.id, "error": error})
+                pipe.xadd(
+                    self.dead_stream,
+                    fields,
+                    maxlen=self._max_len,
+                    approximate=True,
+                )
+            pipe.xack(self.stream, self.group, job.id)
+            entry_id, _ = await pipe.execute()
+        if not retry:
+            logger.error("Job %s (%s) is dead: %s", job.id, job.kind, error)
+            return None
+        return _decode(entry_id)
+
+    async def close(self) -> None:
+        """Closes the Redis client, the pool stays open."""
+        await self._redis.aclose()
+
+    def _fields(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        attempts: int,
+        not_before: float = 0.0,
+    ) -> Dict[str, Any]:
+        return {
+            "kind": kind,
+            "payload": ujson.dumps(payload),
+            "attempts": attempts,
+            "not_before": not_before,
+        }
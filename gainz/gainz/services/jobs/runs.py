@@ -0,0 +1,97 @@
+from typing import Any, Dict, Optional
+
+from openai import AsyncOpenAI
+
+from gainz.services.channels.layer import ChannelLayer, thread_channel
+from gainz.services.metrics.metrics import OPENAI_LATENCY, timed
+from gainz.services.runs.tracker import PENDING_STATUSES, RunCallback, RunTracker
+
+# Run jobs: assistant runs started for the web workers by gainz.worker
+# processes. Kept here rather than with the /ws handlers, so the workers do
+# not import the web application.
+
+RUN_JOB = "run"
+# Runs that end like this are started again, as a retry of their job.
+RUN_RETRY_STATUSES = ("failed", "expired")
+
+
+def notify_run(channels: ChannelLayer) -> RunCallback:
+    """
+    Tells every socket on the thread of a finished run, on any web worker.
+
+    :param channels: channel layer to publish on.
+    :returns: run callback publishing the status of the run.
+    """
+
+    async def notify(run: Any) -> None:
+        await channels.publish(
+            thread_channel(run.thread_id),
+            {"id": "run", "tid": run.thread_id, "run": run.id, "status": run.status},
+        )
+
+    return notify
+
+
+@timed(OPENAI_LATENCY, "active_run")
+async def active_run(client: AsyncOpenAI, thread_id: str) -> Optional[Any]:
+    """
+    Returns the run still going on a thread, if any.
+
+    A thread runs one run at a time, so only the latest can still be going.
+
+    :param client: OpenAI client.
+    :param thread_id: thread id.
+    :returns: the pending run, or None.
+    """
+    runs = await client.beta.threads.runs.list(
+        thread_id=thread_id,
+        limit=1,
+        order="desc",
+    )
+    if runs.data and runs.data[0].status in PENDING_STATUSES:
+        return runs.data[0]
+    return None
+
+
+@timed(OPENAI_LATENCY, "start_run")
+async def start_run(client: AsyncOpenAI, thread_id: str, assistant_id: str) -> Any:
+    """
+    Starts a run of an assistant on a thread.
+
+    :param client: OpenAI client.
+    :param thread_id: thread id.
+    :param assistant_id: assistant id.
+    :returns: the new run.
+    """
+    return await client.beta.threads.runs.create(
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+    )
+
+
+async def run_job(
+    client: AsyncOpenAI,
+    tracker: RunTracker,
+    channels: ChannelLayer,
+    payload: Dict[str, Any],
+) -> None:
+    """
+    Runs the assistant on a thread and tells the sockets on it once done.
+
+    Takes over the run an earlier attempt started, if it is still going.
+
+    :param client: OpenAI client.
+    :param tracker: run tracker of the worker.
+    :param channels: channel layer to publish the end of the run on.
+    :param payload: "tid" and "aid" of the run.
+    :raises RuntimeError: when the run ended in a status worth a retry.
+    """
+    tid = payload["tid"]
+    run = await active_run(client, tid)
+    if run is None:
+        run = await start_run(client, tid, payload["aid"])
+    if run.status in PENDING_STATUSES:
+        run = await tracker.track(run.thread_id, run.id)
+    await notify_run(channels)(run)
+    if run.status in RUN_RETRY_STATUSES:
+        raise RuntimeError(f"Run {run.id} ended with {run.status}")
@@ -0,0 +1,182 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+
+from redis.exceptions import RedisError
+
+from gainz.services.jobs.queue import Job, JobQueue
+from gainz.services.metrics.metrics import JOBS
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class JobWorker:
+    """
+    Runs the jobs of a queue, at most `concurrency` at once.
+
+    Jobs are read only when a slot is free, so a busy worker leaves the
+    stream to the others. A retried job read before its backoff is over
+    waits without a slot, up to `max_delayed` of them, and starts once it
+    is due and a slot is free. Jobs running or waiting here are claimed again every
+    claim_idle / 3 seconds, which keeps them from looking abandoned however
+    long they run; pending jobs idle for claim_idle seconds belong to a
+    consumer that stopped, and count as a failed attempt.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, JobHandler],
+        consumer: str,
+        *,
+        concurrency: int = 50,
+        claim_idle: float = 60.0,
+        block: float = 1.0,
+        max_delayed: int = 1000,
+    ) -> None:
+        self._queue = queue
+        self._handlers = handlers
+        self._consumer = consumer
+        self._concurrency = concurrency
+        self._claim_idle = claim_idle
+        self._block_ms = int(block * 1000)
+        self._max_delayed = max_delayed
+        self._running: Dict[str, "asyncio.Task[None]"] = {}
+        # (not_before, id, job) of the jobs waiting out their backoff
+        self._delayed: List[Tuple[float, str, Job]] = []
+        self._stopping = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._running)
+
+    async def run(self, drain_timeout: float = 30.0) -> None:
+        """
+        Runs jobs until stopped.
+
+        On stop, running jobs get drain_timeout seconds to finish. The ones
+        cancelled after that, and the ones still waiting out their backoff,
+        stay pending and are claimed by another worker.
+
+        :param drain_timeout: seconds to wait for running jobs on stop.
+        """
+        await self._queue.create_group()
+        claimer = asyncio.create_task(self._claim_loop())
+        try:
+            await self._read_loop()
+        finally:
+            claimer.cancel()
+            tasks: Set["asyncio.Task[None]"] = set(self._running.values())
+            if tasks:
+                _, pending = await asyncio.wait(tasks, timeout=drain_timeout)
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+            await asyncio.gather(claimer, return_exceptions=True)
+
+    def stop(self) -> None:
+        """Stops reading jobs, run returns once the running ones are done."""
+        self._stopping.set()
+
+    async def _read_loop(self) -> None:
+        while not self._stopping.is_set():
+            self._start_due()
+            free = self._concurrency - len(self._running)
+            if free <= 0 or len(self._delayed) >= self._max_delayed:
+                await self._wait()
+                continue
+            block_ms = self._block_ms
+            if self._delayed:
+                due_ms = (self._delayed[0][0] - time.time()) * 1000
+                block_ms = max(1, min(block_ms, int(due_ms)))
+            try:
+                jobs = await self._queue.read(self._consumer, free, block_ms)
+            except RedisError as exc:
+                logger.warning("Could not read jobs: %s", exc)
+                await asyncio.sleep(1)
+                continue
+            for job in jobs:
+                if job.not_before > time.time():
+                    heapq.heappush(self._delayed, (job.not_before, job.id, job))
+                else:
+                    self._start(job, self._execute(job))
+
+    def _start_due(self) -> None:
+        now = time.time()
+        while self._delayed and len(self._running) < self._concurrency:
+            if self._delayed[0][0] > now:
+                break
+            _, _, job = heapq.heappop(self._delayed)
+            self._start(job, self._execute(job))
+
+    async def _wait(self) -> None:
+        # Until a running job is done or a waiting one is due, at most
+        # the read block so a stop is seen.
+        timeout = self._block_ms / 1000
+        if self._delayed:
+            timeout = min(timeout, max(0.0, self._delayed[0][0] - time.time()))
+        if not self._running:
+            await asyncio.sleep(timeout)
+            return
+        await asyncio.wait(
+            set(self._running.values()),
+            timeout=timeout,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+
+    async def _claim_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._claim_idle / 3)
+            try:
+                held = list(self._running) + [job.id for _, _, job in self._delayed]
+                await self._queue.touch(self._consumer, held)
+                lost = await self._queue.claim(
+                    self._consumer,
+                    self._claim_idle,
+                    self._concurrency,
+                )
+                for job in lost:
+                    if job.id not in held:
+                        self._start(job, self._lost(job))
+            except RedisError as exc:
+                logger.warning("Could not claim jobs: %s", exc)
+
+    def _start(self, job: Job, work: Awaitable[None]) -> None:
+        task = asyncio.ensure_future(work)
+        self._running[job.id] = task
+        task.add_done_callback(lambda _: self._running.pop(job.id, None))
+
+    async def _execute(self, job: Job) -> None:
+        handler = self._handlers.get(job.kind)
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for {job.kind} jobs")
+            await handler(job.payload)
+        except Exception as exc:
+            logger.warning("Job %s (%s) failed: %r", job.id, job.kind, exc)
+            await self._fail(job, repr(exc))
+            return
+        try:
+            await self._queue.ack(job)
+        except RedisError as exc:
+            # Stays pending, another attempt is made once it is claimed.
+            logger.warning("Could not ack job %s: %s", job.id, exc)
+            return
+        JOBS.labels(job.kind, "ok").inc()
+
+    async def _lost(self, job: Job) -> None:
+        # Counted as an attempt, so a job that kills its workers ends up dead
+        # instead of being passed from one to the next forever.
+        JOBS.labels(job.kind, "lost").inc()
+        await self._fail(job, "consumer lost")
+
+    async def _fail(self, job: Job, error: str) -> None:
+        try:
+            retry = await self._queue.fail(job, error)
+        except RedisError as exc:
+            logger.warning("Could not retry job %s: %s", job.id, exc)
+            return
+        JOBS.labels(job.kind, "dead" if retry is None else "retried").inc()
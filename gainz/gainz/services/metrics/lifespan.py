@@ -0,0 +1,41 @@
+import asyncio
+import contextlib
+import os
+from time import perf_counter
+
+from fastapi import FastAPI
+from prometheus_client import multiprocess
+
+from gainz.services.metrics.metrics import LOOP_LAG
+
+# How often the event loop lag is sampled, in seconds.
+LOOP_LAG_INTERVAL = 0.5
+
+
+async def _sample_loop_lag() -> None:
+    while True:
+        start = perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        LOOP_LAG.observe(max(perf_counter() - start - LOOP_LAG_INTERVAL, 0))
+
+
+def init_metrics(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Starts sampling the event loop lag.
+
+    :param app: current fastapi application.
+    """
+    app.state.loop_lag_task = asyncio.create_task(_sample_loop_lag())
+
+
+async def shutdown_metrics(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Stops sampling and drops the live gauges of this worker.
+
+    :param app: current FastAPI app.
+    """
+    app.state.loop_lag_task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await app.state.loop_lag_task
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,156 @@
+import functools
+import inspect
+import os
+from time import perf_counter
+from typing import Any, Callable, Tuple, TypeVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.multiprocess import MultiProcessCollector
+
+# Latency buckets, in seconds.
+FAST_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)  # fmt: skip
+SLOW_BUCKETS = (
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0,
+)  # fmt: skip
+
+HTTP_LATENCY = Histogram(
+    "gainz_http_request_duration_seconds",
+    "Time spent handling HTTP requests.",
+    ["method", "route", "status"],
+)
+WS_FRAME_LATENCY = Histogram(
+    "gainz_ws_frame_duration_seconds",
+    "Time spent handling websocket frames.",
+    ["op", "outcome"],
+    buckets=SLOW_BUCKETS,
+)
+WS_CONNECTIONS = Gauge(
+    "gainz_ws_connections",
+    "Open websocket connections.",
+    multiprocess_mode="livesum",
+)
+OPENAI_LATENCY = Histogram(
+    "gainz_openai_request_duration_seconds",
+    "Time spent in OpenAI helpers.",
+    ["helper", "outcome"],
+    buckets=SLOW_BUCKETS,
+)
+DB_LATENCY = Histogram(
+    "gainz_db_operation_duration_seconds",
+    "Time spent in database functions.",
+    ["function", "outcome"],
+    buckets=FAST_BUCKETS,
+)
+REDIS_LATENCY = Histogram(
+    "gainz_redis_command_duration_seconds",
+    "Time spent on Redis commands, from sending to reading the reply.",
+    ["command"],
+    buckets=FAST_BUCKETS,
+)
+RATE_LIMITED = Counter(
+    "gainz_rate_limited",
+    "Calls turned away by the rate limiter, by action.",
+    ["action"],
+)
+SINGLEFLIGHT = Counter(
+    "gainz_singleflight_calls",
+    "Coalesced reads by call site, as leader (made the call) or joined.",
+    ["site", "result"],
+)
+JOBS = Counter(
+    "gainz_jobs",
+    "Jobs run by gainz.worker, by kind and result: ok, retried, dead or lost.",
+    ["kind", "result"],
+)
+STARTUP = Gauge(
+    "gainz_startup_seconds",
+    "Startup of the worker: until it serves, each warmup step, until ready.",
+    ["phase"],
+    multiprocess_mode="liveall",
+)
+LOOP_LAG = Histogram(
+    "gainz_event_loop_lag_seconds",
+    "How late the event loop runs a timer.",
+    buckets=FAST_BUCKETS,
+)
+
+FuncT = TypeVar("FuncT", bound=Callable[..., Any])
+
+
+def timed(histogram: Histogram, name: str) -> Callable[[FuncT], FuncT]:
+    """
+    Decorates a coroutine or async generator function to time its calls.
+
+    Calls are observed with the labels (name, outcome), where outcome is
+    "ok" or "error". Async generators are timed until they are exhausted.
+
+    :param histogram: histogram with the labels (name, outcome).
+    :param name: value of the name label.
+    :returns: the decorator.
+    """
+
+    def decorator(func: FuncT) -> FuncT:
+        ok = histogram.labels(name, "ok")
+        failed = histogram.labels(name, "error")
+
+        if inspect.isasyncgenfunction(func):
+
+            @functools.wraps(func)
+            async def generator_wrapper(*args: Any, **kwargs: Any) -> Any:
+                start = perf_counter()
+                generator = func(*args, **kwargs)
+                try:
+                    async for item in generator:
+                        yield item
+                except Exception:
+                    failed.observe(perf_counter() - start)
+                    raise
+                finally:
+                    # Closes the wrapped generator right away when the
+                    # consumer stops early, instead of when it is collected.
+                    await generator.aclose()
+                ok.observe(perf_counter() - start)
+
+            return generator_wrapper  # type: ignore
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception:
+                failed.observe(perf_counter() - start)
+                raise
+            ok.observe(perf_counter() - start)
+            return result
+
+        return wrapper  # type: ignore
+
+    return decorator
+
+
+def render() -> Tuple[bytes, str]:
+    """
+    Renders the metrics in the Prometheus text format.
+
+    With several uvicorn workers, PROMETHEUS_MULTIPROC_DIR is set
+    (see gainz.__main__) and the metrics of every worker are aggregated.
+
+    :returns: body and content type.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,49 @@
+from time import perf_counter
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from gainz.services.metrics.metrics import HTTP_LATENCY
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request, labelled by route template and status.
+
+    Plain ASGI middleware, so it adds no work beyond the timing itself.
+    Websockets are timed per frame by the /ws endpoint instead.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Runs the request and records its duration.
+
+        :param scope: ASGI scope.
+        :param receive: ASGI receive callable.
+        :param send: ASGI send callable.
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = perf_counter()
+        status = 500
+
+        async def send_timed(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            # FastAPI puts the matched route in the scope, using its template
+            # keeps the number of label values small.
+            route = scope.get("route")
+            HTTP_LATENCY.labels(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                str(status),
+            ).observe(perf_counter() - start)
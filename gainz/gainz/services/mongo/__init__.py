@@ -0,0 +1 @@
+"""MongoDB service."""
@@ -0,0 +1,28 @@
+from pymongo.asynchronous.database import AsyncDatabase
+from starlette.requests import HTTPConnection
+
+from gainz.services.mongo.writer import WriteBehindBuffer
+
+
+def get_db(
+    request: HTTPConnection,
+) -> AsyncDatabase:  # pragma: no cover
+    """
+    Returns the application database.
+
+    :param request: current request or websocket.
+    :returns: async database handle.
+    """
+    return request.app.state.db
+
+
+def get_db_writer(
+    request: HTTPConnection,
+) -> WriteBehindBuffer:  # pragma: no cover
+    """
+    Returns the write-behind buffer.
+
+    :param request: current request or websocket.
+    :returns: write-behind buffer.
+    """
+    return request.app.state.db_writer
@@ -0,0 +1,70 @@
+from fastapi import FastAPI
+from pymongo import AsyncMongoClient
+
+from gainz.services.mongo.writer import WriteBehindBuffer
+from gainz.settings import Settings, settings
+
+
+def create_db_client(config: Settings) -> AsyncMongoClient:
+    """
+    Creates the async MongoDB client.
+
+    The client keeps its own connection pool, sized from the settings.
+    No connection is made until the first operation.
+
+    :param config: settings of the database.
+    :returns: the client.
+    """
+    return AsyncMongoClient(
+        str(config.db_url),
+        maxPoolSize=config.db_pool_size,
+        minPoolSize=config.db_min_pool_size,
+        serverSelectionTimeoutMS=config.db_timeout_ms,
+    )
+
+
+def init_mongo(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Creates the async MongoDB client of the worker.
+
+    The client is shared by every handler of the worker.
+
+    :param app: current fastapi application.
+    """
+    app.state.db_client = create_db_client(settings)
+    app.state.db = app.state.db_client[settings.db_name]
+
+
+async def shutdown_mongo(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Closes the MongoDB client and its connection pool.
+
+    :param app: current FastAPI app.
+    """
+    await app.state.db_client.close()
+
+
+def init_db_writer(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Starts the write-behind buffer.
+
+    Must be called after the database is initialized.
+
+    :param app: current fastapi application.
+    """
+    app.state.db_writer = WriteBehindBuffer(
+        app.state.db,
+        batch_size=settings.db_write_batch_size,
+        flush_interval=settings.db_write_flush_interval,
+        max_pending=settings.db_write_max_pending,
+    )
+    app.state.db_writer.start()
+
+
+async def shutdown_db_writer(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Writes every buffered document and stops the buffer.
+
+    :param app: current FastAPI app.
+    """
+    await app.state.db_writer.stop()
@@ -0,0 +1,185 @@
+import asyncio
+import contextlib
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Duplicate key, the document is already stored.
+DUPLICATE_KEY = 11000
+
+# collection, document, future of the write, whether a caller waits for it
+PendingWrite = Tuple[str, Dict[str, Any], "asyncio.Future[None]", bool]
+
+
+class WriteBehindBuffer:
+    """
+    Batches inserts into ``insert_many`` calls.
+
+    Documents are queued with :meth:`put` and written by a background
+    task, grouped by collection, once ``batch_size`` documents are
+    queued or ``flush_interval`` seconds have passed since the first
+    one. When ``max_pending`` documents are waiting, :meth:`put` blocks
+    until there is room again.
+
+    Each document gets a future that resolves once it is stored or fails
+    with the write error. Callers that need the documents to be readable
+    right away use :meth:`write`, whose batch is flushed without waiting
+    for the interval: it holds whatever was queued meanwhile, e.g. while
+    the previous batch was written. The others leave the future, and
+    failures are logged and counted in ``failed``.
+    """
+
+    def __init__(
+        self,
+        db: AsyncDatabase,
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+        max_pending: int = 10000,
+    ) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self._db = db
+        self._queue: "asyncio.Queue[PendingWrite]" = asyncio.Queue(max_pending)
+        self._task: Optional["asyncio.Task[None]"] = None
+        # Set on every put and on stop, wakes the flushing task.
+        self._wake = asyncio.Event()
+        self._closing = False
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        """Starts the flushing task."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Writes every queued document and stops the flushing task."""
+        self._closing = True
+        self._wake.set()
+        await self._queue.join()
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def put(self, collection: str, doc: Dict[str, Any]) -> "asyncio.Future[None]":
+        """
+        Queues a document for insertion.
+
+        :param collection: collection name.
+        :param doc: document to insert.
+        :returns: future resolved once the document is stored.
+        """
+        return await self._put(collection, doc, False)
+
+    async def write(self, collection: str, docs: List[Dict[str, Any]]) -> None:
+        """
+        Inserts documents and waits until they are stored.
+
+        Documents that are already stored are skipped.
+
+        :param collection: collection name.
+        :param docs: documents to insert.
+        :raises Exception: the write error of a document that was not stored.
+        """
+        futures = [await self._put(collection, doc, True) for doc in docs]
+        await asyncio.gather(*futures)
+
+    async def _put(
+        self,
+        collection: str,
+        doc: Dict[str, Any],
+        waited: bool,
+    ) -> "asyncio.Future[None]":
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((collection, doc, future, waited))
+        self._wake.set()
+        return future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            waited = batch[0][3]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                self._wake.clear()
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    waited = waited or batch[-1][3]
+                    continue
+                # A caller waits for a document of the batch, or the buffer stops.
+                if waited or self._closing:
+                    break
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[PendingWrite]) -> None:
+        groups: Dict[str, List[PendingWrite]] = defaultdict(list)
+        for write in batch:
+            groups[write[0]].append(write)
+        for collection, writes in groups.items():
+            errors = await self._insert(collection, [write[1] for write in writes])
+            for index, (_, _, future, _) in enumerate(writes):
+                error = errors.get(index)
+                if error is None:
+                    self.written += 1
+                    if not future.done():
+                        future.set_result(None)
+                    continue
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(error)
+                    # Nobody may be waiting for it, the failure is logged below.
+                    future.exception()
+
+    async def _insert(
+        self,
+        collection: str,
+        docs: List[Dict[str, Any]],
+    ) -> Dict[int, Exception]:
+        """Inserts documents and returns the errors by document index."""
+        try:
+            await self._db[collection].insert_many(docs, ordered=False)
+        except BulkWriteError as exc:
+            errors: Dict[int, Exception] = {}
+            for error in exc.details.get("writeErrors", []):
+                if error.get("code") == DUPLICATE_KEY:
+                    continue
+                errors[error["index"]] = PyMongoError(error.get("errmsg"))
+            if errors:
+                logger.error(
+                    "Failed to write %d of %d documents to %s: %s",
+                    len(errors),
+                    len(docs),
+                    collection,
+                    next(iter(errors.values())),
+                )
+            return errors
+        except Exception as exc:
+            logger.error(
+                "Failed to write %d documents to %s: %s",
+                len(docs),
+                collection,
+                exc,
+            )
+            return dict.fromkeys(range(len(docs)), exc)
+        return {}
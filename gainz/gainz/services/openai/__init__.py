@@ -0,0 +1 @@
+"""OpenAI service."""
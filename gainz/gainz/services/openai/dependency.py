@@ -0,0 +1,20 @@
+from openai import AsyncOpenAI
+from starlette.requests import HTTPConnection
+
+
+def get_openai_client(
+    request: HTTPConnection,
+) -> AsyncOpenAI:  # pragma: no cover
+    """
+    Returns the shared async OpenAI client.
+
+    It works for both HTTP and websocket handlers:
+
+    >>> @ws.websocket("/ws")
+    >>> async def handler(client: AsyncOpenAI = Depends(get_openai_client)):
+    >>>     await client.beta.threads.create()
+
+    :param request: current request or websocket.
+    :returns: async OpenAI client.
+    """
+    return request.app.state.openai_client
@@ -0,0 +1,46 @@
+import os
+
+import httpx
+from fastapi import FastAPI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from gainz.settings import settings
+
+
+def init_openai(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Creates the shared async OpenAI client.
+
+    All chat helpers go through this client, so every request made by
+    a worker shares one pooled HTTP connection pool. The pool size caps
+    how many OpenAI requests are in flight at once; extra requests wait
+    for a free connection up to the pool timeout.
+
+    :param app: current fastapi application.
+    """
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=settings.openai_max_connections,
+            max_keepalive_connections=settings.openai_max_keepalive_connections,
+        ),
+        timeout=httpx.Timeout(
+            settings.openai_timeout,
+            connect=settings.openai_connect_timeout,
+            pool=settings.openai_pool_timeout,
+        ),
+    )
+    app.state.openai_client = AsyncOpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY"),
+        base_url=settings.openai_base_url,
+        max_retries=settings.openai_max_retries,
+        http_client=http_client,
+    )
+
+
+async def shutdown_openai(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Closes the OpenAI client and its connection pool.
+
+    :param app: current FastAPI app.
+    """
+    await app.state.openai_client.close()
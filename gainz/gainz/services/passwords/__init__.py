@@ -0,0 +1 @@
+"""Password hashing off the event loop."""
@@ -0,0 +1,15 @@
+from starlette.requests import HTTPConnection
+
+from gainz.services.passwords.hashing import PasswordHasher
+
+
+def get_password_hasher(
+    request: HTTPConnection,
+) -> PasswordHasher:  # pragma: no cover
+    """
+    Returns the password hasher.
+
+    :param request: current request.
+    :returns: password hasher.
+    """
+    return request.app.state.password_hasher
@@ -0,0 +1,97 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, TypeVar
+
+import bcrypt
+
+T = TypeVar("T")
+
+
+def hash_password(password: str) -> bytes:
+    """
+    Hashes a password with a fresh salt.
+
+    Runs in a worker process of :class:`PasswordHasher`.
+
+    :param password: plain password.
+    :returns: bcrypt hash.
+    """
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
+
+
+def check_password(password: str, hashed: bytes) -> bool:
+    """
+    Checks a password against a bcrypt hash.
+
+    Runs in a worker process of :class:`PasswordHasher`.
+
+    :param password: plain password.
+    :param hashed: stored bcrypt hash.
+    :returns: whether the password matches.
+    """
+    return bcrypt.checkpw(password.encode("utf-8"), hashed)
+
+
+class PasswordPoolBusyError(Exception):
+    """Raised when too many password operations are already queued."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Password hashing queue is full")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a process pool with admission control.
+
+    bcrypt costs tens to hundreds of milliseconds of CPU per call, which
+    would freeze every socket of the worker if it ran on the event loop.
+    At most ``max_pending`` operations may be running or queued at once;
+    beyond that new ones are rejected right away with
+    :class:`PasswordPoolBusyError` instead of piling up latency.
+    """
+
+    def __init__(self, workers: int, max_pending: int, retry_after: int = 1) -> None:
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self.pending = 0
+        self.rejected = 0
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    async def hash(self, password: str) -> bytes:
+        """
+        Hashes a password.
+
+        :param password: plain password.
+        :returns: bcrypt hash.
+        """
+        return await self._submit(hash_password, password)
+
+    async def check(self, password: str, hashed: bytes) -> bool:
+        """
+        Checks a password against a bcrypt hash.
+
+        :param password: plain password.
+        :param hashed: stored bcrypt hash.
+        :returns: whether the password matches.
+        """
+        return await self._submit(check_password, password, hashed)
+
+    def shutdown(self) -> None:
+        """Stops the worker processes, dropping queued operations."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _submit(self, func: Callable[..., T], *args: Any) -> T:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordPoolBusyError(self.retry_after)
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.pending -= 1
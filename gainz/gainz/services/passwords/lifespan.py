@@ -0,0 +1,29 @@
+from fastapi import FastAPI
+
+from gainz.services.passwords.hashing import PasswordHasher
+from gainz.settings import settings
+
+
+def init_password_hasher(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Creates the process pool for password hashing.
+
+    Every uvicorn worker gets its own pool of ``password_workers``
+    processes.
+
+    :param app: current fastapi application.
+    """
+    app.state.password_hasher = PasswordHasher(
+        workers=settings.password_workers,
+        max_pending=settings.password_max_pending,
+        retry_after=settings.password_retry_after,
+    )
+
+
+def shutdown_password_hasher(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Stops the password hashing processes.
+
+    :param app: current FastAPI app.
+    """
+    app.state.password_hasher.shutdown()
@@ -0,0 +1 @@
+"""Per-user rate limiting in Redis."""
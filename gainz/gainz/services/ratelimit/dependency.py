@@ -0,0 +1,17 @@
+from typing import Optional
+
+from starlette.requests import HTTPConnection
+
+from gainz.services.ratelimit.limiter import RateLimiter
+
+
+def get_rate_limiter(
+    request: HTTPConnection,
+) -> Optional[RateLimiter]:  # pragma: no cover
+    """
+    Returns the rate limiter.
+
+    :param request: current request or websocket.
+    :returns: rate limiter, None when rate limiting is disabled.
+    """
+    return request.app.state.rate_limiter
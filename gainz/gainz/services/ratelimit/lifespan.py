@@ -0,0 +1,33 @@
+from fastapi import FastAPI
+
+from gainz.services.ratelimit.limiter import RateLimiter, Rule
+from gainz.settings import settings
+
+
+def init_rate_limiter(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Creates the rate limiter, when rate limiting is enabled.
+
+    Must be called after the redis pool is initialized.
+
+    :param app: current fastapi application.
+    """
+    app.state.rate_limiter = None
+    if settings.ratelimit_enabled:
+        app.state.rate_limiter = RateLimiter(
+            app.state.redis_pool,
+            {
+                "ws:answer": Rule(
+                    settings.ratelimit_answer_rate,
+                    settings.ratelimit_answer_burst,
+                ),
+                "ws:question": Rule(
+                    settings.ratelimit_question_rate,
+                    settings.ratelimit_question_burst,
+                ),
+                "create-thread": Rule(
+                    settings.ratelimit_thread_rate,
+                    settings.ratelimit_thread_burst,
+                ),
+            },
+        )
@@ -0,0 +1,117 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, NamedTuple
+
+from redis.asyncio import ConnectionPool, Redis
+from redis.exceptions import RedisError
+
+from gainz.services.cache.lru import LRUCache
+from gainz.services.metrics.metrics import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+# Token bucket, refilled continuously at `rate` tokens per second up to
+# `burst` tokens. Runs atomically in Redis, so every worker shares the
+# bucket of a user. The clock is the one of Redis, so workers whose clocks
+# drift apart refill the bucket alike. Returns {allowed, seconds until
+# enough tokens}.
+BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class Rule(NamedTuple):
+    """Refill rate in tokens per second and bucket size of an action."""
+
+    rate: float
+    burst: int
+
+
+@dataclass
+class Decision:
+    """Outcome of a rate limited call."""
+
+    allowed: bool
+    retry_after: float = 0.0
+
+
+ALLOWED = Decision(True)
+
+
+class RateLimiter:
+    """
+    Per-user token buckets in Redis, one per action.
+
+    A user whose bucket is empty is remembered in a small in-process cache
+    until it has refilled, so a client hammering the server is turned away
+    without a round trip to Redis. When Redis fails, calls are let through.
+    """
+
+    def __init__(
+        self,
+        redis_pool: ConnectionPool,
+        rules: Dict[str, Rule],
+        local_size: int = 10000,
+    ) -> None:
+        self._redis_pool = redis_pool
+        self._rules = rules
+        self._script = Redis(connection_pool=redis_pool).register_script(
+            BUCKET_SCRIPT,
+        )
+        # (action, key) -> monotonic time when the bucket has a token again
+        self._denied: LRUCache[str, float] = LRUCache(local_size)
+
+    async def hit(self, key: str, action: str, cost: int = 1) -> Decision:
+        """
+        Spends tokens of a bucket.
+
+        :param key: whose bucket, e.g. the user id.
+        :param action: route or frame type, calls without a rule are allowed.
+        :param cost: tokens the call costs.
+        :returns: whether the call is allowed and if not, when to retry.
+        """
+        rule = self._rules.get(action)
+        if rule is None:
+            return ALLOWED
+        bucket = f"ratelimit:{action}:{key}"
+        until = self._denied.get(bucket)
+        if until is not None:
+            wait = until - time.monotonic()
+            if wait > 0:
+                RATE_LIMITED.labels(action).inc()
+                return Decision(False, wait)
+            self._denied.pop(bucket)
+        try:
+            allowed, retry_after = await self._script(
+                keys=[bucket],
+                args=[rule.rate, rule.burst, cost],
+            )
+        except RedisError as exc:
+            logger.warning("Rate limiter failed, letting the call through: %s", exc)
+            return ALLOWED
+        if allowed:
+            return ALLOWED
+        retry_after = float(retry_after)
+        self._denied.set(bucket, time.monotonic() + retry_after, ttl=retry_after)
+        RATE_LIMITED.labels(action).inc()
+        return Decision(False, retry_after)
@@ -0,0 +1 @@
+"""Warmup and readiness of a worker."""
@@ -0,0 +1,13 @@
+from starlette.requests import HTTPConnection
+
+from gainz.services.readiness.warmup import Readiness
+
+
+def get_readiness(request: HTTPConnection) -> Readiness:  # pragma: no cover
+    """
+    Returns the readiness of this worker.
+
+    :param request: current request.
+    :returns: readiness.
+    """
+    return request.app.state.readiness
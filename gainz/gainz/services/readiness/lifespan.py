@@ -0,0 +1,74 @@
+import asyncio
+
+from fastapi import FastAPI
+from redis.asyncio import Redis
+
+from gainz.services.readiness.warmup import Readiness
+from gainz.settings import settings
+from gainz.web.api.monitoring.db import create_indexes
+from gainz.web.api.monitoring.websocket import token_counter
+
+
+def init_readiness(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Starts timing the startup of this worker.
+
+    Must be called first, the startup lasts until start_warmup.
+
+    :param app: current fastapi application.
+    """
+    app.state.readiness = Readiness(settings.warmup_retry_interval)
+
+
+def start_warmup(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Opens the pools of the clients in the background.
+
+    The database and Redis are required: until their pools have
+    warmup_*_connections open connections (and the indexes exist), and
+    the channel layer is connected, /api/ready answers 503. The OpenAI
+    connection is only warmed up when warmup_openai is set, and its failure
+    does not block readiness. Nor does loading the tiktoken encoding, which
+    runs in a thread so it does not hold the event loop.
+
+    Must be called last, once every client is built.
+
+    :param app: current fastapi application.
+    """
+
+    async def warm_mongo() -> None:
+        # Concurrent pings each take a connection, opening up to that many.
+        await asyncio.gather(
+            *(
+                app.state.db.command("ping")
+                for _ in range(settings.warmup_db_connections)
+            ),
+        )
+        await create_indexes(app.state.db)
+
+    async def warm_redis() -> None:
+        redis = Redis(connection_pool=app.state.redis_pool)
+        await asyncio.gather(
+            *(redis.ping() for _ in range(settings.warmup_redis_connections)),
+        )
+
+    async def warm_openai() -> None:
+        await app.state.openai_client.models.list()
+
+    readiness: Readiness = app.state.readiness
+    readiness.add("mongo", warm_mongo)
+    readiness.add("redis", warm_redis)
+    readiness.add("channels", app.state.channel_layer.connect)
+    readiness.add("tokenizer", token_counter.load, required=False)
+    if settings.warmup_openai:
+        readiness.add("openai", warm_openai, required=False)
+    readiness.start()
+
+
+async def shutdown_readiness(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Stops the warmup if it is still running.
+
+    :param app: current FastAPI app.
+    """
+    await app.state.readiness.stop()
@@ -0,0 +1,114 @@
+import asyncio
+import contextlib
+import logging
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from gainz.services.metrics.metrics import STARTUP
+
+logger = logging.getLogger(__name__)
+
+WarmupStep = Callable[[], Awaitable[None]]
+
+
+class Readiness:
+    """
+    Warmup of a worker, and whether it is ready for traffic.
+
+    The worker starts serving as soon as its clients are built, without any
+    network round trip. The warmup steps (opening pools, creating indexes)
+    then run concurrently in the background. Required steps are retried
+    until they pass and the worker is ready once they all did; optional
+    steps run once after that and only warm up what they can.
+    """
+
+    def __init__(self, retry_interval: float = 1.0) -> None:
+        self._retry_interval = retry_interval
+        self._required: Dict[str, WarmupStep] = {}
+        self._optional: Dict[str, WarmupStep] = {}
+        self._started = perf_counter()
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.ready = False
+        self.startup_seconds: Optional[float] = None
+        self.ready_seconds: Optional[float] = None
+        # Seconds each step took, once it passed.
+        self.steps: Dict[str, float] = {}
+        # Last error of each step that has not passed.
+        self.errors: Dict[str, str] = {}
+
+    def add(self, name: str, step: WarmupStep, required: bool = True) -> None:
+        """
+        Adds a warmup step.
+
+        :param name: name of the step.
+        :param step: coroutine function running the step.
+        :param required: whether the worker is ready only once it passed.
+        """
+        (self._required if required else self._optional)[name] = step
+
+    def start(self) -> None:
+        """Marks the end of the startup and runs the warmup in the background."""
+        self.startup_seconds = perf_counter() - self._started
+        STARTUP.labels("startup").set(self.startup_seconds)
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Cancels the warmup if it is still running."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+
+    async def run(self) -> None:
+        """
+        Runs the required steps, marks the worker as ready, then runs the rest.
+
+        Optional steps wait for readiness, a slow one (e.g. the first OpenAI
+        call, which imports a good part of the client) would hold the event
+        loop while the required ones run.
+        """
+        await asyncio.gather(
+            *(
+                self._run_step(name, step, retry=True)
+                for name, step in self._required.items()
+            ),
+        )
+        self.ready = True
+        self.ready_seconds = perf_counter() - self._started
+        STARTUP.labels("ready").set(self.ready_seconds)
+        logger.info("Worker ready after %.3f s", self.ready_seconds)
+        await asyncio.gather(
+            *(self._run_step(name, step) for name, step in self._optional.items()),
+        )
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Summarizes the warmup.
+
+        :returns: readiness, startup and step timings, errors.
+        """
+        return {
+            "ready": self.ready,
+            "startup_seconds": self.startup_seconds,
+            "ready_seconds": self.ready_seconds,
+            "steps": self.steps,
+            "errors": self.errors,
+        }
+
+    async def _run_step(self, name: str, step: WarmupStep, retry: bool = False) -> None:
+        while True:
+            started = perf_counter()
+            try:
+                await step()
+            except Exception as exc:
+                self.errors[name] = repr(exc)
+                logger.warning("Warmup step %s failed: %r", name, exc)
+                if not retry:
+                    return
+                await asyncio.sleep(self._retry_interval)
+                continue
+            self.steps[name] = perf_counter() - started
+            self.errors.pop(name, None)
+            STARTUP.labels(name).set(self.steps[name])
+            return
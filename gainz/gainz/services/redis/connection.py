@@ -0,0 +1,50 @@
+from time import perf_counter
+from typing import Any, Optional
+
+from redis.asyncio.connection import Connection
+
+from gainz.services.metrics.metrics import REDIS_LATENCY
+
+
+class TimedConnection(Connection):
+    """
+    Redis connection that times every command until its reply is read.
+
+    Pipelines send their commands packed and are not timed.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._command: Optional[str] = None
+        self._sent_at = 0.0
+
+    async def send_command(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Sends a command and starts timing it.
+
+        :param args: command and its arguments.
+        :param kwargs: options of the connection.
+        """
+        command = args[0] if args else None
+        if isinstance(command, bytes):
+            command = command.decode()
+        self._command = str(command).upper() if command is not None else None
+        self._sent_at = perf_counter()
+        await super().send_command(*args, **kwargs)
+
+    async def read_response(self, *args: Any, **kwargs: Any) -> Any:
+        """
+        Reads a reply and records the time of its command.
+
+        :param args: options of the connection.
+        :param kwargs: options of the connection.
+        :returns: the reply.
+        """
+        try:
+            return await super().read_response(*args, **kwargs)
+        finally:
+            if self._command is not None:
+                REDIS_LATENCY.labels(self._command).observe(
+                    perf_counter() - self._sent_at,
+                )
+                self._command = None
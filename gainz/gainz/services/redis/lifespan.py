@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from redis.asyncio import ConnectionPool
 
+from gainz.services.redis.connection import TimedConnection
 from gainz.settings import settings
 
 
@@ -12,6 +13,7 @@ def init_redis(app: FastAPI) -> None:  # pragma: no cover
     """
     app.state.redis_pool = ConnectionPool.from_url(
         str(settings.redis_url),
+        connection_class=TimedConnection,
     )
 
 
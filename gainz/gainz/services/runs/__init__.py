@@ -0,0 +1 @@
+"""Background tracking of OpenAI assistant runs."""
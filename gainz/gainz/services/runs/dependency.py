@@ -0,0 +1,15 @@
+from starlette.requests import HTTPConnection
+
+from gainz.services.runs.tracker import RunTracker
+
+
+def get_run_tracker(
+    request: HTTPConnection,
+) -> RunTracker:  # pragma: no cover
+    """
+    Returns the run tracker of this worker.
+
+    :param request: current request or websocket.
+    :returns: run tracker.
+    """
+    return request.app.state.run_tracker
@@ -0,0 +1,32 @@
+from fastapi import FastAPI
+
+from gainz.services.runs.tracker import RunTracker
+from gainz.settings import settings
+
+
+def init_run_tracker(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Starts the run tracker of this worker.
+
+    Must be called after the OpenAI client is initialized.
+
+    :param app: current fastapi application.
+    """
+    app.state.run_tracker = RunTracker(
+        app.state.openai_client,
+        min_interval=settings.run_poll_min_interval,
+        max_interval=settings.run_poll_max_interval,
+        backoff=settings.run_poll_backoff,
+        max_failures=settings.run_poll_max_failures,
+        max_concurrency=settings.run_poll_concurrency,
+    )
+    app.state.run_tracker.start()
+
+
+async def shutdown_run_tracker(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Stops the run tracker.
+
+    :param app: current FastAPI app.
+    """
+    await app.state.run_tracker.stop()
@@ -0,0 +1,190 @@
+import asyncio
+import contextlib
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+# Statuses of a run that is still being worked on by OpenAI.
+PENDING_STATUSES = frozenset(("queued", "in_progress", "cancelling"))
+
+RunCallback = Callable[[Any], Awaitable[None]]
+
+
+@dataclass
+class LostRun:
+    """Stand-in passed to the callbacks of a run that could not be polled."""
+
+    id: str
+    thread_id: str
+    status: str = "failed"
+
+
+@dataclass
+class PendingRun:
+    """A run that is polled until it leaves the pending statuses."""
+
+    thread_id: str
+    run_id: str
+    future: "asyncio.Future[Any]"
+    interval: float
+    due: float
+    failures: int = 0
+    polling: bool = False
+    callbacks: List[RunCallback] = field(default_factory=list)
+
+
+class RunTracker:
+    """
+    Tracks every in-flight run of a worker from one background task.
+
+    Instead of a polling loop per run, runs are registered with
+    :meth:`track` and a single task polls the ones that are due.
+    A fresh run is polled quickly and the interval grows with every
+    poll that finds it still pending, so short runs finish with little
+    latency and long runs do not flood the API. Every poll runs in its
+    own task, at most max_concurrency at once, so a slow poll only
+    delays its own run.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        *,
+        min_interval: float = 0.1,
+        max_interval: float = 2.0,
+        backoff: float = 1.5,
+        max_failures: int = 5,
+        max_concurrency: int = 32,
+    ) -> None:
+        self._client = client
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+        self._max_failures = max_failures
+        self._pending: Dict[str, PendingRun] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._polls: Set["asyncio.Task[None]"] = set()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def start(self) -> None:
+        """Starts the polling task."""
+        self._task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self) -> None:
+        """Stops the polling task and cancels every pending run future."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        for poll in list(self._polls):
+            poll.cancel()
+        await asyncio.gather(*self._polls, return_exceptions=True)
+        for pending in self._pending.values():
+            pending.future.cancel()
+        self._pending.clear()
+
+    def track(
+        self,
+        thread_id: str,
+        run_id: str,
+        callback: Optional[RunCallback] = None,
+    ) -> "asyncio.Future[Any]":
+        """
+        Starts tracking a run.
+
+        :param thread_id: thread the run belongs to.
+        :param run_id: id of the run.
+        :param callback: coroutine called with the finished run,
+            e.g. to notify the socket that started it.
+        :returns: future resolved with the run once it is finished.
+        """
+        pending = self._pending.get(run_id)
+        if pending is None:
+            loop = asyncio.get_running_loop()
+            pending = PendingRun(
+                thread_id=thread_id,
+                run_id=run_id,
+                future=loop.create_future(),
+                interval=self._min_interval,
+                due=loop.time() + self._min_interval,
+            )
+            self._pending[run_id] = pending
+            self._wakeup.set()
+        if callback is not None:
+            pending.callbacks.append(callback)
+        return pending.future
+
+    async def _poll_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            now = loop.time()
+            for run in self._pending.values():
+                if not run.polling and run.due <= now:
+                    run.polling = True
+                    poll = asyncio.create_task(self._poll(run))
+                    self._polls.add(poll)
+                    poll.add_done_callback(self._polls.discard)
+            due = [run.due for run in self._pending.values() if not run.polling]
+            timeout = min(due) - now if due else None
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+
+    async def _poll(self, pending: PendingRun) -> None:
+        try:
+            async with self._slots:
+                run = await self._retrieve(pending)
+        finally:
+            pending.polling = False
+            # The loop waits for the next due run, which may be this one.
+            self._wakeup.set()
+        if run is None:
+            return
+        self._pending.pop(pending.run_id, None)
+        if not pending.future.done():
+            pending.future.set_result(run)
+        await self._notify(pending, run)
+
+    async def _retrieve(self, pending: PendingRun) -> Any:
+        # The finished run, or None while it is still pending.
+        loop = asyncio.get_running_loop()
+        try:
+            run = await self._client.beta.threads.runs.retrieve(
+                thread_id=pending.thread_id,
+                run_id=pending.run_id,
+            )
+        except Exception as exc:
+            pending.failures += 1
+            if pending.failures < self._max_failures:
+                self._reschedule(pending, loop.time())
+                return None
+            logger.warning("Giving up on run %s: %s", pending.run_id, exc)
+            if not pending.future.done():
+                pending.future.set_exception(exc)
+                # Nobody may await it, e.g. a run only tracked for its callbacks.
+                pending.future.exception()
+            return LostRun(pending.run_id, pending.thread_id)
+        if run.status in PENDING_STATUSES:
+            self._reschedule(pending, loop.time())
+            return None
+        return run
+
+    async def _notify(self, pending: PendingRun, run: Any) -> None:
+        for callback in pending.callbacks:
+            try:
+                await callback(run)
+            except Exception:
+                logger.exception("Run callback failed for %s", pending.run_id)
+
+    def _reschedule(self, pending: PendingRun, now: float) -> None:
+        pending.interval = min(pending.interval * self._backoff, self._max_interval)
+        pending.due = now + pending.interval
@@ -1,7 +1,7 @@
 import enum
 from pathlib import Path
 from tempfile import gettempdir
-from typing import Optional
+from typing import Dict, List, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from yarl import URL
@@ -20,6 +20,14 @@ class LogLevel(str, enum.Enum):
     FATAL = "FATAL"
 
 
+class OverflowPolicy(str, enum.Enum):
+    """What a websocket does when its outbound queue is full."""
+
+    DROP_OLDEST = "drop-oldest"
+    COALESCE = "coalesce"
+    DISCONNECT = "disconnect"
+
+
 class Settings(BaseSettings):
     """
     Application settings.
@@ -39,15 +47,37 @@ class Settings(BaseSettings):
     environment: str = "dev"
 
     log_level: LogLevel = LogLevel.INFO
+    # Share of the records below WARNING kept per logger, as a JSON object.
+    # The access log of every request is the bulk of the volume.
+    log_sample_rates: Dict[str, float] = {"uvicorn.access": 0.1}
+
+    # Metrics of the uvicorn workers are aggregated through this directory
+    prometheus_dir: Path = TEMP_DIR / "prom"
+
     # Variables for the database. 
     # ****These db info not applied to my demo****
     
     db_host: str = "localhost"
     db_port: int = 27017
-    db_user: str = "gainz"
-    db_pass: str = "gainz"
+    # Unset for a local MongoDB without authentication
+    db_user: Optional[str] = None
+    db_pass: Optional[str] = None
     db_base: str = "admin"
     db_echo: bool = False
+    # Database the collections live in, db_base is only used to authenticate
+    db_name: str = "gainz"
+    # Connection pool of the async client
+    db_pool_size: int = 100
+    db_min_pool_size: int = 0
+    db_timeout_ms: int = 5000
+    # Write-behind buffer: inserts are batched into insert_many calls
+    # of up to db_write_batch_size documents, flushed at least every
+    # db_write_flush_interval seconds, or at once when a caller waits
+    # for the write. Writers wait once db_write_max_pending documents
+    # are buffered.
+    db_write_batch_size: int = 500
+    db_write_flush_interval: float = 0.05
+    db_write_max_pending: int = 10000
 
     # Variables for Redis
     redis_host: str = "gainz-redis"
@@ -56,6 +86,133 @@ class Settings(BaseSettings):
     redis_pass: Optional[str] = None
     redis_base: Optional[int] = None
 
+    # Cache of authenticated users.
+    # Entries live user_cache_ttl seconds in Redis and
+    # user_cache_local_ttl seconds in the in-process LRU of each worker.
+    user_cache_ttl: int = 300
+    user_cache_local_ttl: float = 5.0
+    user_cache_local_size: int = 1024
+    # Verified JWTs kept in memory by each worker
+    token_cache_size: int = 10000
+
+    # Process pool for bcrypt, per uvicorn worker.
+    # Password operations beyond password_max_pending (running or queued)
+    # are rejected with 503 and Retry-After: password_retry_after seconds.
+    password_workers: int = 2
+    password_max_pending: int = 64
+    password_retry_after: int = 1
+
+    # Variables for the OpenAI client.
+    # openai_base_url points the client to another server (e.g. the fake
+    # server of the benchmarks), the OpenAI API is used when it is not set.
+    openai_base_url: Optional[str] = None
+    # The connection pool size is also the cap on concurrent OpenAI requests.
+    openai_max_connections: int = 200
+    openai_max_keepalive_connections: int = 50
+    # Timeouts are in seconds
+    openai_timeout: float = 60.0
+    openai_connect_timeout: float = 5.0
+    openai_pool_timeout: float = 10.0
+    openai_max_retries: int = 2
+
+    # History sent with openChat. The newest messages that fit in
+    # context_max_tokens are kept. With context_summary_enabled the older ones
+    # are replaced by a summary of up to context_summary_max_tokens (taken
+    # from the same budget), renewed every context_summary_step messages.
+    # Tokens are counted with tiktoken (context_encoding) when installed,
+    # estimated otherwise.
+    context_max_tokens: int = 3000
+    context_summary_enabled: bool = False
+    context_summary_max_tokens: int = 300
+    context_summary_step: int = 8
+    context_encoding: str = "o200k_base"
+    context_count_cache_size: int = 10000
+    context_summary_cache_size: int = 1000
+
+    # Token buckets per user, in Redis. A bucket holds up to `burst` calls
+    # and refills at `rate` calls per second.
+    ratelimit_enabled: bool = True
+    ratelimit_answer_rate: float = 0.5
+    ratelimit_answer_burst: int = 5
+    ratelimit_question_rate: float = 1.0
+    ratelimit_question_burst: int = 10
+    ratelimit_thread_rate: float = 0.2
+    ratelimit_thread_burst: int = 5
+
+    # Call sites (e.g. "list_messages") where concurrent identical reads
+    # are not coalesced, as a JSON list.
+    singleflight_disabled: List[str] = []
+
+    # Polling of in-flight assistant runs, in seconds.
+    # The interval starts at the minimum and grows by the backoff factor
+    # on every poll that finds the run still pending. Up to
+    # run_poll_concurrency polls are in flight at once.
+    run_poll_min_interval: float = 0.1
+    run_poll_max_interval: float = 2.0
+    run_poll_backoff: float = 1.5
+    run_poll_max_failures: int = 5
+    run_poll_concurrency: int = 32
+
+    # Run jobs on a Redis stream. When jobs_enabled, answers that are not
+    # streamed are queued and run by `python -m gainz.worker` processes
+    # instead of the web workers. A worker runs up to jobs_concurrency jobs,
+    # a failed job is retried jobs_max_attempts times in all, backing off
+    # jobs_retry_backoff seconds doubled per attempt, then dead lettered.
+    # Jobs of a worker that stopped are taken over after jobs_claim_idle
+    # seconds.
+    jobs_enabled: bool = False
+    jobs_stream: str = "gainz:jobs:runs"
+    jobs_group: str = "runs"
+    jobs_concurrency: int = 50
+    jobs_max_attempts: int = 3
+    jobs_retry_backoff: float = 2.0
+    jobs_claim_idle: float = 60.0
+    jobs_max_len: int = 100000
+    # Port where a gainz.worker serves its Prometheus metrics, if any
+    worker_metrics_port: Optional[int] = None
+
+    # Bulk deletion of the threads of a user: threads are deleted a page of
+    # delete_batch_size at a time, at most delete_concurrency OpenAI threads
+    # at once, each tried delete_max_attempts times with a backoff starting
+    # at delete_retry_backoff seconds.
+    delete_batch_size: int = 100
+    delete_concurrency: int = 8
+    delete_max_attempts: int = 3
+    delete_retry_backoff: float = 0.5
+
+    # Warmup, in the background once the worker serves. /api/ready answers
+    # 503 until the pools of the database and Redis have this many open
+    # connections. Failed steps are retried every warmup_retry_interval
+    # seconds. warmup_openai opens a connection to the OpenAI API too.
+    warmup_db_connections: int = 4
+    warmup_redis_connections: int = 4
+    warmup_openai: bool = True
+    warmup_retry_interval: float = 1.0
+
+    # Frames of one websocket running or waiting at once.
+    # Beyond that the socket is not read until a frame finishes.
+    ws_max_inflight: int = 8
+    # Frames waiting to be sent to one websocket, and what happens
+    # when a client reads slower than they are produced.
+    ws_send_queue_size: int = 256
+    ws_overflow_policy: OverflowPolicy = OverflowPolicy.COALESCE
+    # Websockets accepted by one worker. Quiet sockets of the versioned
+    # protocol get a heartbeat event every ws_heartbeat_interval seconds,
+    # and are closed after ws_idle_timeout seconds without a frame from the
+    # client. Legacy sockets are not closed for being quiet.
+    ws_max_connections: int = 10000
+    ws_heartbeat_interval: float = 25.0
+    ws_idle_timeout: float = 300.0
+    # Websocket pings sent by uvicorn, answered by every client including
+    # the legacy ones that get no heartbeat events. A socket whose pong does
+    # not come within ws_ping_timeout seconds is closed.
+    ws_ping_interval: float = 20.0
+    ws_ping_timeout: float = 20.0
+    # Proxies trusted to tell the client address in X-Forwarded-For, as a
+    # comma separated list of addresses ("*" trusts any). Anonymous sockets
+    # are rate limited by that address, not by the one of the proxy.
+    forwarded_allow_ips: str = "127.0.0.1"
+
     @property
     def db_url(self) -> URL:
         """
@@ -1,20 +1,36 @@
 import jwt
 import time
 import os
-import bcrypt
+import logging
 import json
+import math
+from typing import Optional
 from fastapi import APIRouter
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from gainz.settings import Settings
-from .db import get_db, get_collection
+from gainz.settings import Settings, settings
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import DuplicateKeyError
+from gainz.services.mongo.dependency import get_db
+from gainz.services.cache.dependency import get_user_cache
+from gainz.services.cache.tokens import TokenCache
+from gainz.services.cache.users import UserCache
+from gainz.services.passwords.dependency import get_password_hasher
+from gainz.services.passwords.hashing import PasswordHasher, PasswordPoolBusyError
+from gainz.services.ratelimit.dependency import get_rate_limiter
+from gainz.services.ratelimit.limiter import RateLimiter
 from .model import User, Login, Token, Thread
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 JWT_SECRET = os.environ.get("JWT_SECRET")
 ALGORITHM = "HS256"
+# Verified claims, so a token presented again is a dictionary lookup
+# instead of a full jwt.decode. Entries expire with their token.
+token_cache = TokenCache(settings.token_cache_size)
 
 # JWT function
 # Currently, it's only a very very very prelimit JWT development. Use 3rd party provider and cloud solution is recommended. 
@@ -25,16 +41,24 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 def verify_token(token):
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
     try:
         secret_key = JWT_SECRET
         decoded_token = jwt.decode(token, secret_key, algorithms=[ALGORITHM])
+        token_cache.set(token, decoded_token)
         return decoded_token
     except jwt.ExpiredSignatureError: 
         return "Token expired"
     except jwt.InvalidTokenError:
         return "Invalid token"
     
-def get_current_user(token: str = Depends(OAuth2PasswordBearer(tokenUrl="token"))):
+async def get_current_user(
+    token: str = Depends(OAuth2PasswordBearer(tokenUrl="token")),
+    db: AsyncDatabase = Depends(get_db),
+    cache: UserCache = Depends(get_user_cache),
+):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -42,28 +66,67 @@ def get_current_user(token: str = Depends(OAuth2PasswordBearer(tokenUrl="token")
     )
     try:
         payload = verify_token(token)
+        if not isinstance(payload, dict):
+            raise credentials_exception
         user_id = payload.get("user_id")
         if user_id is None:
             raise credentials_exception
-        user = get_user_by_id(user_id) 
+        # Served from the user cache, the database is only read on a miss.
+        user = await cache.get(user_id, lambda: get_user_by_id(db, user_id))
         if user is None:
             raise credentials_exception
         return user
     except jwt.ExpiredSignatureError:
-        raise credentials_exception
+        raise credentials_exception from None
     except jwt.InvalidTokenError:
-        raise credentials_exception
+        raise credentials_exception from None
     
-def get_password_hash(password: str):
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+# bcrypt runs in the worker's process pool, never on the event loop.
+# When too many hashes are already queued the caller gets a 503 with Retry-After.
+async def get_password_hash(hasher: PasswordHasher, password: str):
+    try:
+        return await hasher.hash(password)
+    except PasswordPoolBusyError as e:
+        raise password_pool_busy(e) from e
+
+async def check_password(hasher: PasswordHasher, password: str, hashed: bytes):
+    try:
+        return await hasher.check(password, hashed)
+    except PasswordPoolBusyError as e:
+        raise password_pool_busy(e) from e
+
+def password_pool_busy(e: PasswordPoolBusyError):
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, try again later",
+        headers={"Retry-After": str(e.retry_after)},
+    )
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Dependency of routes that cost an OpenAI call or a new thread. It spends a token
+# of the user's bucket for the action and answers 429 once the bucket is empty
+# (see gainz.services.ratelimit). Returns the current user.
+def rate_limit(action: str):
+    async def check(
+        current_user: User = Depends(get_current_user),
+        limiter: Optional[RateLimiter] = Depends(get_rate_limiter),
+    ) -> User:
+        if limiter is not None:
+            decision = await limiter.hit(current_user['id'], action)
+            if not decision.allowed:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many requests, try again later",
+                    headers={"Retry-After": str(math.ceil(decision.retry_after))},
+                )
+        return current_user
+    return check
+
 # User Management function
-def get_user_by_id(user_id: int):
-    db = get_db()
+async def get_user_by_id(db: AsyncDatabase, user_id: int):
     collection = db['User']
-    user = collection.find_one({"id": user_id})
+    user = await collection.find_one({"id": user_id})
 
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
@@ -73,31 +136,47 @@ def get_user_by_id(user_id: int):
 auth = APIRouter()
 
 @auth.post("/register", status_code=status.HTTP_201_CREATED)
-async def register_user(user: User):
+async def register_user(
+    user: User,
+    db: AsyncDatabase = Depends(get_db),
+    cache: UserCache = Depends(get_user_cache),
+    hasher: PasswordHasher = Depends(get_password_hasher),
+):
     # Hash the password before storing
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(hasher, user.password)
     user.password = hashed_password
-    db = get_db()
     collection = db['User']
     user_data = vars(user)
     user_data['_id']= user.id
-    collection.insert_one(user_data)
+    # Only needed while the unique email index is missing (see create_indexes),
+    # otherwise the insert fails on its own.
+    if await collection.find_one({"email": user.email}, {"_id": 1}):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="User already exists")
+    try:
+        await collection.insert_one(user_data)
+    except DuplicateKeyError:
+        # Email (and id) are unique in the User collection.
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="User already exists") from None
+    await cache.invalidate(user.id)
     return {"message": "User created successfully"}
 
 # To Do. Should send fail message 
 
 
 @auth.post("/login")
-async def login_user(login: Login):
+async def login_user(
+    login: Login,
+    db: AsyncDatabase = Depends(get_db),
+    hasher: PasswordHasher = Depends(get_password_hasher),
+):
     email = login.email     
-    db = get_db()
     collection = db['User']
-    user = collection.find_one({"email": email})
+    user = await collection.find_one({"email": email})
 
     if not user:
         return {"message": "Login unsuccessful"}
 
-    if not bcrypt.checkpw(login.password.encode('utf-8'), user["password"]):
+    if not await check_password(hasher, login.password, user["password"]):
         return {"message": "Login unsuccessful"}
 
     else:
@@ -106,13 +185,12 @@ async def login_user(login: Login):
         verify_token(access_token)
         return {"access_token": access_token,"user_id":user['id'], "token_type": "bearer"}
 
-# This is internal check the users stored in DB. You will see in console log of backend.
+# This is internal check the users stored in DB. You will see in the log of the backend.
 @auth.get("/list")
-def seed_initial_data():
-    db = get_db()
+async def seed_initial_data(db: AsyncDatabase = Depends(get_db)):
     collection = db['Thread']
-    for x in collection.find():
-        print(x)
+    async for x in collection.find():
+        logger.info("Thread %s", x)
     return {"message": "All User List"}
 
 # This is to check the API is authenticated for using. 
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from itertools import compress
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from pymongo.asynchronous.database import AsyncDatabase
+
+from .db import count_threads, delete_threads, find_threads
+
+logger = logging.getLogger(__name__)
+
+# Bulk deletion of the threads of a user.
+#
+# Threads are taken a page at a time, in (timestamp, id) order. The OpenAI
+# threads of a page are deleted concurrently, at most `concurrency` at once,
+# each retried with a backoff. Then the messages and threads whose OpenAI
+# thread is gone are deleted locally, in one delete_many per collection.
+# Local documents go last, so whatever an interrupted deletion leaves behind
+# is found by the next one, which resumes where it stopped: the remote
+# delete treats a thread that no longer exists as deleted.
+
+RemoteDelete = Callable[[str], Awaitable[None]]
+
+
+@dataclass
+class DeleteProgress:
+    """Progress of a bulk deletion, sent to the caller after every page."""
+
+    total: int
+    deleted: int = 0
+    failed: int = 0
+    done: bool = False
+
+
+async def delete_remote(
+    remote: RemoteDelete,
+    tid: str,
+    max_attempts: int,
+    retry_backoff: float,
+) -> bool:
+    """
+    Deletes one remote thread, retrying with an exponential backoff.
+
+    :param remote: coroutine function deleting a remote thread.
+    :param tid: thread id.
+    :param max_attempts: attempts in all.
+    :param retry_backoff: seconds before the first retry, doubled after each.
+    :returns: whether the thread is gone.
+    """
+    for attempt in range(max_attempts):
+        try:
+            await remote(tid)
+            return True
+        except Exception as exc:
+            if attempt + 1 == max_attempts:
+                logger.warning("Could not delete thread %s: %r", tid, exc)
+                return False
+            await asyncio.sleep(retry_backoff * 2 ** attempt)
+    return False
+
+
+async def delete_user_threads(
+    db: AsyncDatabase,
+    uid: str,
+    remote: RemoteDelete,
+    *,
+    concurrency: int = 8,
+    batch_size: int = 100,
+    max_attempts: int = 3,
+    retry_backoff: float = 0.5,
+) -> AsyncIterator[DeleteProgress]:
+    """
+    Deletes every thread of a user, remotely and locally with its messages.
+
+    Threads that could not be deleted remotely are kept, with their
+    messages, for a later run.
+
+    :param db: the database.
+    :param uid: user id.
+    :param remote: coroutine function deleting a remote thread.
+    :param concurrency: remote deletions running at once.
+    :param batch_size: threads per page.
+    :param max_attempts: attempts per remote thread.
+    :param retry_backoff: seconds before the first retry.
+    :yields: the progress after every page, the last one is done.
+    """
+    progress = DeleteProgress(total=await count_threads(db, uid))
+    slots = asyncio.Semaphore(concurrency)
+
+    async def delete_one(tid: str) -> bool:
+        async with slots:
+            return await delete_remote(remote, tid, max_attempts, retry_backoff)
+
+    after: Optional[Tuple[int, str]] = None
+    while True:
+        page = await find_threads(db, uid, after).limit(batch_size).to_list(
+            length=batch_size,
+        )
+        if not page:
+            break
+        tids = [thread["id"] for thread in page]
+        gone = await asyncio.gather(*(delete_one(tid) for tid in tids))
+        deleted: List[str] = list(compress(tids, gone))
+        await delete_threads(db, uid, deleted)
+        progress.deleted += len(deleted)
+        progress.failed += len(tids) - len(deleted)
+        # Failed threads stay behind the cursor until the next run.
+        after = (page[-1]["timestamp"], page[-1]["id"])
+        yield progress
+    progress.done = True
+    yield progress
@@ -1,76 +1,169 @@
-from fastapi import Depends, HTTPException, status
-from gainz.settings import Settings
-import pymongo
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from gainz.services.mongo.writer import WriteBehindBuffer
+from gainz.services.cache.singleflight import WriteGeneration, coalesce
+from gainz.services.metrics.metrics import DB_LATENCY, timed
+from pymongo.asynchronous.database import AsyncDatabase
 import logging
+from typing import AsyncIterator, List, Optional, Tuple
 from .model import Thread, Message
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Developers should be installed mongoDB for their own to check this backend. 
+# Developers should be installed mongoDB for their own to check this backend.
 # (For mongoDB installation guide. https://www.mongodb.com/zh-cn/docs/manual/tutorial/install-mongodb-on-os-x/)
-# And as time constrict and convenience for test, I don't set any admin password for the database. 
-# To Do. 
+# The async client is created in the lifespan from Settings.db_url (see gainz.services.mongo)
+# and handlers get the database through the get_db dependency.
+# To Do.
 # 1. Setup remote testing, staging and production DB
-# 2. Add admin name and password
 
-myclient = pymongo.MongoClient('mongodb://localhost:27017/')
-
-# DB name and Collection (i.e. Table) are hardcode. Will be updated later. 
-db = myclient["gainz"]
-
-
-def get_db():
-    return db
+# Indexes for every lookup done by the handlers, created at startup.
+# create_index is a no-op when the index already exists.
+# Databases written before register checked emails can hold duplicates, which
+# the unique index cannot be built over. That is logged and the other indexes
+# are still created, so the worker becomes ready; register then checks the
+# email itself until the duplicates are merged by hand.
+@timed(DB_LATENCY, "create_indexes")
+async def create_indexes(db: AsyncDatabase):
+    try:
+        await db['User'].create_index([("email", ASCENDING)], unique=True)
+    except OperationFailure as e:
+        if e.code != 11000:
+            raise
+        logger.error("User emails are not unique, no email index: %s", e)
+    await db['User'].create_index([("id", ASCENDING)])
+    await db['Thread'].create_index([("uid", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)])
+    # Messages of a thread are read as a range in timestamp order,
+    # ties are broken by id so the cursor is stable.
+    await db['Message'].create_index([("tid", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)])
 
-def get_collection(name:str):
-    return db[name]
+# Local writes of messages and threads. Reads coalesced after one of them
+# do not join a read that started before it (see coalesce).
+MESSAGE_WRITES = WriteGeneration()
+THREAD_WRITES = WriteGeneration()
 
 # OpenAI database function
-def create_thread_record(thread: Thread):
-    # Hash the password before storing
-    try:
-        print(thread.json())
-        db = get_db()
-        collection = db['Thread']
-        data = vars(thread)
-        data['_id']= thread.id
-        collection.insert_one(data)
-        return True
-    except:
-        return False
-    
-async def create_message_record(message: Message):
-    # Hash the password before storing
-    try:
-        db = get_db()
-        collection = db['Message']
-        data = vars(message)
-        data['_id']= message.id
-        collection.insert_one(data)
-        return True
-    except:
-        return False
-    
-def list_all_threads(uid: str):
-    try:
-        arr=[]
-        db = get_db()
-        collection = db['Thread']
-        query = {"uid": uid}
-        results = collection.find(query)
-        for record in results:
-            arr.append(record)
-            print(record)
-        return arr
-    except:
-        return False
+# Inserts go through the write-behind buffer (see gainz.services.mongo.writer),
+# which batches concurrent ones into insert_many calls. Failures are logged there.
 
-def delete_all_threads(uid: str):
+# The thread has to be listed right after it is created, so this waits for
+# the batch holding it to be written. The batch is flushed right away, with
+# whatever other creations and syncs were queued meanwhile.
+@timed(DB_LATENCY, "create_thread_record")
+async def create_thread_record(writer: WriteBehindBuffer, thread: Thread):
     try:
-        db = get_db()
-        collection = db['Thread']
-        query = {"uid": uid}
-        results = collection.delete_many(query)
+        await writer.write('Thread', [{**thread.model_dump(), '_id': thread.id}])
+        THREAD_WRITES.bump()
         return True
-    except:
+    except Exception:
         return False
+
+# Stores messages synced from OpenAI, and waits for them to be readable.
+# Messages that are already stored (e.g. by a concurrent sync of the same
+# thread) are skipped by the buffer.
+@timed(DB_LATENCY, "create_message_records")
+async def create_message_records(writer: WriteBehindBuffer, messages: List[Message]):
+    await writer.write('Message', [{**message.model_dump(), '_id': message.id} for message in messages])
+    if messages:
+        MESSAGE_WRITES.bump()
+    return len(messages)
+
+@coalesce("latest_message", generation=MESSAGE_WRITES)
+@timed(DB_LATENCY, "latest_message")
+async def latest_message(db: AsyncDatabase, tid: str):
+    return await db['Message'].find_one(
+        {"tid": tid},
+        sort=[("timestamp", DESCENDING), ("_id", DESCENDING)],
+    )
+
+# Reads are coalesced: concurrent identical calls (e.g. several tabs reconnecting)
+# share one query and its result, see gainz.services.cache.singleflight.
+
+# One page of a thread in chronological order, starting after the message
+# with id `after`. Served by the (tid, timestamp, _id) index.
+# Returns limit + 1 messages at most, so the caller can tell if there are more
+# (all of them without a limit), or None when the after message is not stored
+# in the thread.
+@coalesce("list_messages", generation=MESSAGE_WRITES)
+@timed(DB_LATENCY, "list_messages")
+async def list_messages(
+    db: AsyncDatabase,
+    tid: str,
+    after: Optional[str] = None,
+    limit: Optional[int] = 50,
+):
+    query: dict = {"tid": tid}
+    if after is not None:
+        cursor_message = await db['Message'].find_one({"_id": after, "tid": tid}, {"timestamp": 1})
+        if cursor_message is None:
+            return None
+        ts = cursor_message['timestamp']
+        query["$or"] = [
+            {"timestamp": {"$gt": ts}},
+            {"timestamp": ts, "_id": {"$gt": after}},
+        ]
+    results = db['Message'].find(query, {"_id": 0}).sort([("timestamp", ASCENDING), ("_id", ASCENDING)])
+    if limit is None:
+        return await results.to_list()
+    return await results.limit(limit + 1).to_list(length=limit + 1)
+
+# Whether the thread belongs to the user, by its id and owner.
+@timed(DB_LATENCY, "thread_owned")
+async def thread_owned(db: AsyncDatabase, tid: str, uid: str) -> bool:
+    return await db['Thread'].find_one({"_id": tid, "uid": uid}, {"_id": 1}) is not None
+
+# Fields of a thread returned to the client
+THREAD_FIELDS = {"_id": 0, "id": 1, "aid": 1, "name": 1, "timestamp": 1}
+
+# Threads of a user in (timestamp, id) order, starting after the
+# (timestamp, id) keyset cursor. Served by the (uid, timestamp, _id) index.
+def find_threads(db: AsyncDatabase, uid: str, after: Optional[Tuple[int, str]] = None):
+    query: dict = {"uid": uid}
+    if after is not None:
+        ts, tid = after
+        query["$or"] = [
+            {"timestamp": {"$gt": ts}},
+            {"timestamp": ts, "_id": {"$gt": tid}},
+        ]
+    return db['Thread'].find(query, THREAD_FIELDS).sort([("timestamp", ASCENDING), ("_id", ASCENDING)])
+
+# One page of threads. Returns limit + 1 threads at most,
+# so the caller can tell if there are more (all of them without a limit).
+@coalesce("list_threads_page", generation=THREAD_WRITES)
+@timed(DB_LATENCY, "list_threads_page")
+async def list_threads_page(
+    db: AsyncDatabase,
+    uid: str,
+    after: Optional[Tuple[int, str]] = None,
+    limit: Optional[int] = 100,
+):
+    if limit is None:
+        return await find_threads(db, uid, after).to_list()
+    return await find_threads(db, uid, after).limit(limit + 1).to_list(length=limit + 1)
+
+# Yields threads straight from the cursor, one batch in memory at a time.
+@timed(DB_LATENCY, "iter_threads")
+async def iter_threads(
+    db: AsyncDatabase,
+    uid: str,
+    after: Optional[Tuple[int, str]] = None,
+    batch_size: int = 500,
+) -> AsyncIterator[dict]:
+    async for thread in find_threads(db, uid, after).batch_size(batch_size):
+        yield thread
+
+@timed(DB_LATENCY, "count_threads")
+async def count_threads(db: AsyncDatabase, uid: str):
+    return await db['Thread'].count_documents({"uid": uid})
+
+# Deletes threads of a user and their messages, in one delete_many each.
+# Messages go first: if this is interrupted, the threads are still there
+# and the next bulk delete finds them again (see cleanup.py).
+@timed(DB_LATENCY, "delete_threads")
+async def delete_threads(db: AsyncDatabase, uid: str, tids: List[str]):
+    if not tids:
+        return 0
+    await db['Message'].delete_many({"tid": {"$in": tids}})
+    MESSAGE_WRITES.bump()
+    result = await db['Thread'].delete_many({"uid": uid, "_id": {"$in": tids}})
+    THREAD_WRITES.bump()
+    return result.deleted_count
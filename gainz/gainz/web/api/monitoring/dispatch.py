@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from starlette.websockets import WebSocketDisconnect
+
+logger = logging.getLogger(__name__)
+
+# Per socket dispatch of /ws frames.
+#
+# Every frame runs in its own task, so a slow OpenAI call for one thread does
+# not hold up the other threads of the same client. Frames with the same key
+# (the thread id) still run one after the other, in the order they arrived.
+# At most max_inflight frames are running or waiting per socket; beyond that
+# the receive loop stops reading, which pushes back on the client.
+
+
+class FrameDispatcher:
+    """Runs the frames of one websocket concurrently, in order per key."""
+
+    def __init__(self, max_inflight: int) -> None:
+        self.max_inflight = max_inflight
+        self._slots = asyncio.Semaphore(max_inflight)
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        # key -> (lock, number of frames holding or waiting for it)
+        self._keys: Dict[Hashable, Tuple[asyncio.Lock, int]] = {}
+
+    async def submit(
+        self,
+        key: Optional[Hashable],
+        handler: Callable[[], Awaitable[Any]],
+    ) -> None:
+        """
+        Schedules a frame, waiting for a free slot first.
+
+        :param key: frames with the same key run in order, None for no ordering.
+        :param handler: coroutine function that handles the frame.
+        """
+        await self._slots.acquire()
+        lock = None
+        if key is not None:
+            # Picked here and acquired first thing in the task. Tasks start in
+            # the order they are created, so the waiters queue in arrival order.
+            lock, count = self._keys.get(key, (asyncio.Lock(), 0))
+            self._keys[key] = (lock, count + 1)
+        task = asyncio.create_task(self._run(key, lock, handler))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(
+        self,
+        key: Optional[Hashable],
+        lock: Optional[asyncio.Lock],
+        handler: Callable[[], Awaitable[Any]],
+    ) -> None:
+        try:
+            if lock is None:
+                await handler()
+                return
+            async with lock:
+                await handler()
+        except asyncio.CancelledError:
+            raise
+        except WebSocketDisconnect:
+            # The receive loop sees the disconnect too and cleans up.
+            pass
+        except Exception:
+            logger.exception("Frame handler failed")
+        finally:
+            self._slots.release()
+            if key is not None:
+                lock, count = self._keys[key]
+                if count > 1:
+                    self._keys[key] = (lock, count - 1)
+                else:
+                    del self._keys[key]
+
+    async def join(self) -> None:
+        """Waits for every scheduled frame to finish."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def close(self) -> None:
+        """Cancels the frames still running or waiting and waits for them."""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def __len__(self) -> int:
+        return len(self._tasks)
@@ -1,5 +1,6 @@
 from fastapi import FastAPI, Depends, HTTPException, status
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Optional
 
 
 # Model only for User. Should have more in future. 
@@ -11,6 +12,11 @@ class User(BaseModel):
 
 class Msg(BaseModel):
     tid: str
+    # Cursor: id of the last message the client already has
+    after: Optional[str] = None
+    # Page size. Without it every message is returned, as the frontend
+    # does not page.
+    limit: Optional[int] = Field(default=None, ge=1, le=100)
 
 class Login(BaseModel):
     email: str
@@ -24,6 +30,7 @@ class Message(BaseModel):
     tid: str
     msg: str
     timestamp: int
+    role: str = "user"
 
 class Thread(BaseModel):
     id:str
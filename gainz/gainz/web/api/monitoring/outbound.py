@@ -0,0 +1,162 @@
+import asyncio
+import contextlib
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Hashable, Optional
+
+import msgpack
+import ujson
+from fastapi import WebSocket
+from starlette.websockets import WebSocketDisconnect
+
+from gainz.settings import OverflowPolicy
+
+logger = logging.getLogger(__name__)
+
+# Close code sent to a client that was evicted for reading too slowly.
+SLOW_CONSUMER_CLOSE_CODE = 1008
+
+
+@dataclass
+class OutboundStats:
+    """Counters shared by the outbound queues of a worker."""
+
+    # Frames queued on every socket, right now.
+    depth: int = 0
+    sent: int = 0
+    dropped: int = 0
+    coalesced: int = 0
+    evicted: int = 0
+
+
+outbound_stats = OutboundStats()
+
+
+@dataclass
+class OutboundFrame:
+    """A frame waiting to be sent, encoded when it is written."""
+
+    payload: Any
+    binary: bool = False
+    # Streamed deltas with the same key can be merged, their text
+    # is the "text" item of the delta dict.
+    delta_key: Optional[Hashable] = None
+    delta: Optional[Dict[str, Any]] = None
+
+
+class SlowConsumerError(WebSocketDisconnect):
+    """Raised when a frame is queued for a socket that was evicted."""
+
+    def __init__(self) -> None:
+        super().__init__(SLOW_CONSUMER_CLOSE_CODE, "slow consumer")
+
+
+class OutboundQueue:
+    """
+    Bounded queue of frames for one websocket, drained by a writer task.
+
+    Handlers queue frames without waiting for the client. When the queue is
+    full, the overflow policy decides what gives:
+
+    * drop-oldest drops the oldest queued frame.
+    * coalesce merges a new delta into the delta queued before it, and falls
+      back to drop-oldest for anything else.
+    * disconnect closes the socket and fails every later :meth:`put`.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        maxsize: int,
+        policy: OverflowPolicy = OverflowPolicy.COALESCE,
+        stats: OutboundStats = outbound_stats,
+    ) -> None:
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.policy = policy
+        self.stats = stats
+        self.evicted = False
+        self._frames: Deque[OutboundFrame] = deque()
+        self._ready = asyncio.Event()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def start(self) -> None:
+        """Starts the writer task."""
+        self._task = asyncio.create_task(self._write_loop())
+
+    async def stop(self) -> None:
+        """Stops the writer task and drops the frames still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        self.stats.depth -= len(self._frames)
+        self._frames.clear()
+
+    def put(self, frame: OutboundFrame) -> None:
+        """
+        Queues a frame.
+
+        :param frame: frame to send.
+        :raises SlowConsumerError: if the socket was evicted.
+        """
+        if self.evicted:
+            raise SlowConsumerError
+        if len(self._frames) >= self.maxsize and not self._make_room(frame):
+            return
+        self._frames.append(frame)
+        self.stats.depth += 1
+        self._ready.set()
+
+    def _make_room(self, frame: OutboundFrame) -> bool:
+        """Applies the overflow policy, returns False if the frame is done with."""
+        if self.policy == OverflowPolicy.DISCONNECT:
+            logger.warning("Evicting a slow websocket consumer")
+            self.evicted = True
+            self.stats.evicted += 1
+            self._ready.set()
+            raise SlowConsumerError
+        if self.policy == OverflowPolicy.COALESCE and frame.delta is not None:
+            last = self._frames[-1]
+            if last.delta is not None and last.delta_key == frame.delta_key:
+                last.delta["text"] += frame.delta["text"]
+                self.stats.coalesced += 1
+                return False
+        self._frames.popleft()
+        self.stats.depth -= 1
+        self.stats.dropped += 1
+        return True
+
+    async def _write_loop(self) -> None:
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self._frames and not self.evicted:
+                frame = self._frames.popleft()
+                self.stats.depth -= 1
+                try:
+                    await self._send(frame)
+                except (WebSocketDisconnect, RuntimeError):
+                    # The client went away, the receive loop cleans up.
+                    return
+                self.stats.sent += 1
+            if self.evicted:
+                await self._close()
+                return
+
+    async def _send(self, frame: OutboundFrame) -> None:
+        if isinstance(frame.payload, str):
+            await self.websocket.send_text(frame.payload)
+        elif frame.binary:
+            await self.websocket.send_bytes(msgpack.packb(frame.payload))
+        else:
+            await self.websocket.send_text(ujson.dumps(frame.payload))
+
+    async def _close(self) -> None:
+        with contextlib.suppress(RuntimeError):
+            await self.websocket.close(SLOW_CONSUMER_CLOSE_CODE, "slow consumer")
@@ -0,0 +1,290 @@
+"""
+Wire protocol of /ws.
+
+Version 1 frames are envelopes with a client supplied request id, so a client
+can pipeline many requests over one socket and match the replies out of order::
+
+  request: {"v": 1, "rid": "7", "op": "answer", "tid": "...", "stream": true}
+  reply:   {"v": 1, "rid": "7", "op": "answer", "ok": true, "data": {...}}
+  error:   {"v": 1, "rid": "7", "op": "answer", "ok": false,
+            "error": {"code": "upstream_error", "message": "..."}}
+  event:   {"v": 1, "rid": "7", "event": "delta", "data": {...}}
+
+Events carry the rid of the request that caused them, or none when they come
+from elsewhere (e.g. a run finished on another worker).
+A quiet socket gets heartbeat events, which the client answers with any frame
+({"v": 1, "op": "ping"} will do). Sockets answering none for ws_idle_timeout
+seconds are closed.
+Frames are JSON in text frames or MessagePack in binary frames. Replies and the
+events of a request use the version and encoding of that request, which are
+kept on it when it is decoded: frames are handled concurrently, so the last
+frame received may be another one. Pushed events use the version and encoding
+of the last frame received.
+
+Frames without "v" are the original protocol ({"id": "question", ...}), they
+are still accepted and answered with the original free text replies. Their tid
+and message are turned into strings, as the original handlers did.
+"""
+from typing import Any, Dict, Literal, Optional, Union
+
+import msgpack
+import ujson
+from fastapi import WebSocket
+from pydantic import BaseModel, ValidationError
+from starlette.websockets import WebSocketDisconnect
+
+from gainz.web.api.monitoring.outbound import OutboundFrame, OutboundQueue
+
+PROTOCOL_VERSION = 1
+LEGACY_VERSION = 0
+
+# Legacy text replies per op, on success and on failure.
+# None means nothing is sent.
+LEGACY_REPLIES = {
+    "question": (
+        "Your messages successfully updates our assistant.",
+        "Your messages cannot updates to our assistant. Try again",
+    ),
+    "answer": (
+        "Your questions will be come out soon.",
+        "Your messages cannot be answer. Try again",
+    ),
+    "answer-stream": (None, None),
+    "list": (
+        "Your questions will be list out soon.",
+        "Your messages cannot be answer. Try again",
+    ),
+    "ping": ("pong", None),
+}
+LEGACY_BAD_FRAME = "Your messages cannot updates to our assistant. Try again"
+
+
+class Request(BaseModel):
+    """A request frame, of either protocol version."""
+
+    v: Literal[0, 1] = PROTOCOL_VERSION
+    rid: Optional[str] = None
+    op: str
+    tid: Optional[str] = None
+    message: Optional[str] = None
+    stream: bool = False
+    # Whether the request came as MessagePack, set by decode
+    binary: bool = False
+
+    @property
+    def legacy(self) -> bool:
+        """Whether the request is of the original protocol."""
+        return self.v == LEGACY_VERSION
+
+
+class ProtocolError(Exception):
+    """Error sent back to the client as a typed error reply."""
+
+    def __init__(
+        self,
+        code: str,
+        message: str,
+        details: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.details = details
+
+
+def decode(data: Union[str, bytes]) -> Request:
+    """
+    Parses a request frame.
+
+    :param data: text or binary frame.
+    :returns: the request.
+    :raises ProtocolError: if the frame is not a valid request.
+    """
+    try:
+        obj = msgpack.unpackb(data) if isinstance(data, bytes) else ujson.loads(data)
+    except ValueError as e:
+        raise ProtocolError(
+            "bad_frame",
+            "Frame is not valid JSON or MessagePack",
+        ) from e
+    if not isinstance(obj, dict):
+        raise ProtocolError("bad_frame", "Frame must be an object")
+    if "v" not in obj and "id" in obj:
+        obj = {**obj, "v": LEGACY_VERSION, "op": obj["id"], "rid": None}
+        for key in ("tid", "message"):
+            if obj.get(key) is not None:
+                obj[key] = str(obj[key])
+    try:
+        return Request.model_validate({**obj, "binary": isinstance(data, bytes)})
+    except ValidationError as e:
+        raise ProtocolError("bad_frame", "Frame is not a valid request") from e
+
+
+class Peer:
+    """
+    Sending side of a websocket that speaks both protocol versions.
+
+    Frames are queued on the outbound queue of the socket, not written
+    inline. Frames for a request use its version and encoding. The version
+    and encoding of the last frame received are remembered for the others,
+    i.e. events pushed to the client and errors of unparsable frames.
+    """
+
+    def __init__(self, websocket: WebSocket, outbound: OutboundQueue) -> None:
+        self.websocket = websocket
+        self.outbound = outbound
+        self.version = LEGACY_VERSION
+        self.binary = False
+
+    async def receive(self) -> Union[str, bytes]:
+        """
+        Waits for the next frame.
+
+        :returns: the text or binary payload.
+        :raises WebSocketDisconnect: when the client went away.
+        """
+        message = await self.websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(
+                message.get("code", 1000),
+                message.get("reason"),
+            )
+        if message.get("bytes") is not None:
+            self.binary = True
+            return message["bytes"]
+        self.binary = False
+        return message.get("text") or ""
+
+    async def send(
+        self,
+        payload: Union[str, Dict[str, Any]],
+        binary: Optional[bool] = None,
+        delta: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Sends a frame.
+
+        :param payload: object to encode, or a legacy text reply.
+        :param binary: use MessagePack, defaults to the encoding of the last
+            frame received.
+        :param delta: the dict holding the text, if the frame is a streamed delta.
+        :raises SlowConsumerError: if the socket was evicted.
+        """
+        frame = OutboundFrame(payload, self.binary if binary is None else binary)
+        if delta is not None:
+            frame.delta = delta
+            frame.delta_key = (payload.get("rid"), delta.get("tid"))
+        self.outbound.put(frame)
+
+    async def reply(self, request: Request, data: Any = None) -> None:
+        """
+        Sends the success reply of a request.
+
+        :param request: the request.
+        :param data: result of the request.
+        """
+        if request.legacy:
+            text = LEGACY_REPLIES.get(self._legacy_op(request), (None, None))[0]
+            if text is not None:
+                await self.send(text, request.binary)
+            return
+        await self.send(
+            {
+                "v": PROTOCOL_VERSION,
+                "rid": request.rid,
+                "op": request.op,
+                "ok": True,
+                "data": data,
+            },
+            request.binary,
+        )
+
+    async def error(
+        self,
+        request: Optional[Request],
+        code: str,
+        message: str,
+        details: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Sends the error reply of a request.
+
+        :param request: the request, None if the frame could not be parsed.
+        :param code: machine readable error code.
+        :param message: human readable error message.
+        :param details: more fields of the error, e.g. retry_after.
+        """
+        if self._legacy(request):
+            await self._legacy_error(request)
+            return
+        await self.send(
+            {
+                "v": PROTOCOL_VERSION,
+                "rid": request.rid if request is not None else None,
+                "op": request.op if request is not None else None,
+                "ok": False,
+                "error": {"code": code, "message": message, **(details or {})},
+            },
+            self._binary(request),
+        )
+
+    async def event(
+        self,
+        name: str,
+        data: Dict[str, Any],
+        request: Optional[Request] = None,
+    ) -> None:
+        """
+        Sends an event, e.g. a streamed delta or a fanned out notification.
+
+        :param name: event name.
+        :param data: event data.
+        :param request: the request that caused the event, if any.
+        """
+        binary = self._binary(request)
+        if self._legacy(request):
+            payload = {"id": name, **data}
+            await self.send(payload, binary, payload if name == "delta" else None)
+            return
+        rid = request.rid if request is not None else None
+        data = dict(data)
+        await self.send(
+            {"v": PROTOCOL_VERSION, "rid": rid, "event": name, "data": data},
+            binary,
+            data if name == "delta" else None,
+        )
+
+    def _legacy(self, request: Optional[Request]) -> bool:
+        if request is not None:
+            return request.legacy
+        return self.version == LEGACY_VERSION
+
+    def _binary(self, request: Optional[Request]) -> bool:
+        if request is not None:
+            return request.binary
+        return self.binary
+
+    async def _legacy_error(self, request: Optional[Request]) -> None:
+        if request is None:
+            await self.send(LEGACY_BAD_FRAME)
+            return
+        op = self._legacy_op(request)
+        if op == "answer-stream":
+            await self.send(
+                {
+                    "id": "error",
+                    "tid": request.tid,
+                    "message": LEGACY_REPLIES["answer"][1],
+                },
+                request.binary,
+            )
+            return
+        text = LEGACY_REPLIES.get(op, (None, LEGACY_BAD_FRAME))[1]
+        if text is not None:
+            await self.send(text, request.binary)
+
+    @staticmethod
+    def _legacy_op(request: Request) -> str:
+        if request.op == "answer" and request.stream:
+            return "answer-stream"
+        return request.op
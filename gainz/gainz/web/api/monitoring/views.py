@@ -1,4 +1,8 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Response, status
+
+from gainz.services.metrics.metrics import render
+from gainz.services.readiness.dependency import get_readiness
+from gainz.services.readiness.warmup import Readiness
 
 # Basically, these API only for testing. Not using in production. But reserved for developers reference. 
 
@@ -12,6 +16,32 @@ def health_check() -> None:
     It returns 200 if the project is healthy.
     """
 
+@views.get("/ready")
+def readiness_check(
+    response: Response,
+    readiness: Readiness = Depends(get_readiness),
+) -> dict:
+    """
+    Checks that the worker is ready for traffic.
+
+    Unlike /health, which only tells that the worker is alive, it returns
+    503 until the warmup reached the database and Redis.
+    """
+    if not readiness.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return readiness.report()
+
+@views.get("/metrics")
+def metrics() -> Response:
+    """
+    Serves the metrics of every worker in the Prometheus text format.
+
+    Latencies of HTTP routes, websocket frames, OpenAI helpers,
+    database functions, Redis commands and the event loop itself.
+    """
+    body, content_type = render()
+    return Response(body, media_type=content_type)
+
 @views.get("/test")
 def test():
     return {"Hello": "World"}
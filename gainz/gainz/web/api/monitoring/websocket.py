@@ -1,12 +1,68 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 import os
-from openai import OpenAI
-import json
-from .auth import get_current_user
-from .model import User, Login, Token, Message, Thread, Msg
-from .db import create_message_record, create_thread_record, list_all_threads, delete_all_threads
+from openai import AsyncOpenAI, NotFoundError
+import asyncio
+import contextlib
+import uuid
+from dataclasses import asdict, dataclass, field
+from functools import partial
+from typing import Any, AsyncIterator, Dict, Optional
+from .auth import get_current_user, rate_limit, verify_token
+from .model import User, Message, Thread, Msg
+from .dispatch import FrameDispatcher
+from .outbound import OutboundQueue, SlowConsumerError, outbound_stats
+from .protocol import PROTOCOL_VERSION, Peer, ProtocolError, Request, decode
+from .db import (
+    create_message_records,
+    create_thread_record,
+    latest_message,
+    list_messages,
+    list_threads_page,
+    iter_threads,
+    thread_owned,
+)
+from gainz.services.mongo.dependency import get_db, get_db_writer
+from .cleanup import delete_user_threads
+from gainz.log import request_id, socket_id
+from gainz.services.mongo.writer import WriteBehindBuffer
+from gainz.services.cache.singleflight import WriteGeneration, coalesce
+from gainz.services.context.window import ContextWindow, TokenCounter
+import ujson
+import logging
+from pymongo.asynchronous.database import AsyncDatabase
+from gainz.services.channels.dependency import get_channel_layer
+from gainz.services.jobs.dependency import get_job_queue
+from gainz.services.jobs.queue import JobQueue
+from gainz.services.jobs.runs import RUN_JOB, notify_run
+from gainz.services.connections.dependency import get_connection_registry
+from gainz.services.connections.registry import (
+    BUSY_CLOSE_CODE,
+    Connection,
+    ConnectionRegistry,
+    TooManyConnectionsError,
+)
+from gainz.services.channels.layer import (
+    ChannelLayer,
+    ChannelSubscriber,
+    thread_channel,
+    user_channel,
+)
+from gainz.services.metrics.metrics import (
+    OPENAI_LATENCY,
+    WS_CONNECTIONS,
+    WS_FRAME_LATENCY,
+    timed,
+)
+from gainz.services.openai.dependency import get_openai_client
+from gainz.services.ratelimit.dependency import get_rate_limiter
+from gainz.services.ratelimit.limiter import RateLimiter
+from gainz.services.runs.dependency import get_run_tracker
+from gainz.services.runs.tracker import RunTracker
+from gainz.settings import settings
 import time
+from time import perf_counter
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,116 +73,406 @@ load_dotenv()
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 # openai.api_key = OPENAI_API_KEY
 ASSISTANT_ID = 'asst_3N9bkD5CyXgT5O9T9J3n8AIW'
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+CHAT_MODEL = "gpt-4o-mini"
+logger = logging.getLogger(__name__)
 threadId = ''
-# The arr is the array of messages. All messages of a thread will be fed up for replies generation. 
-def openChat(arr):
+# All helpers below take the shared AsyncOpenAI client that the lifespan creates
+# (see gainz.services.openai), so no OpenAI call ever blocks the event loop.
+
+# Prompts of openChat are kept within settings.context_max_tokens, however long
+# the conversation (see gainz.services.context). Token counts of the messages
+# and summaries of the older ones are cached by this worker. The encoding is
+# loaded by the warmup, counting runs in a worker thread.
+token_counter = TokenCounter(settings.context_encoding, settings.context_count_cache_size)
+context_window = ContextWindow(
+    token_counter,
+    max_tokens=settings.context_max_tokens,
+    summary_max_tokens=settings.context_summary_max_tokens,
+    summary_step=settings.context_summary_step,
+    summary_cache_size=settings.context_summary_cache_size,
+)
+
+@timed(OPENAI_LATENCY, "chatSummarize")
+async def chatSummarize(
+    client: AsyncOpenAI,
+    previous: Optional[str],
+    msgs,
+    max_tokens: int,
+):
+    # Rolling summary: the summary of the earlier messages is extended with the next ones.
+    prompt = [{
+        "role": "system",
+        "content": "Summarize the conversation below in a few sentences. Keep names, numbers and decisions.",
+    }]
+    if previous:
+        prompt.append({"role": "system", "content": f"Summary of the conversation before: {previous}"})
+    completion = await client.chat.completions.create(
+        model=CHAT_MODEL,
+        messages=prompt + msgs,
+        max_tokens=max_tokens,
+    )
+    return completion.choices[0].message.content
+
+# The arr is the array of messages. The newest ones that fit in the token budget
+# are fed up for replies generation, the older ones are summarized or dropped.
+@timed(OPENAI_LATENCY, "openChat")
+async def openChat(
+    client: AsyncOpenAI,
+    arr,
+    window: Optional[ContextWindow] = context_window,
+):
     msgs=[]
     for msg in arr:
         item = {"role": "assistant", "content": msg}
         msgs.append(item)
-    completion = client.chat.completions.create(
-    model="gpt-4o-mini",
+    if window is not None:
+        summarize = partial(chatSummarize, client) if settings.context_summary_enabled else None
+        msgs = await window.fit(msgs, summarize)
+    completion = await client.chat.completions.create(
+    model=CHAT_MODEL,
     messages= msgs
     )
     return completion.choices[0].message.content
 
-def chatAssistantCreate():
-    assistant = client.beta.assistants.create(
+@timed(OPENAI_LATENCY, "chatAssistantCreate")
+async def chatAssistantCreate(client: AsyncOpenAI):
+    assistant = await client.beta.assistants.create(
         name="Math Tutor",
         instructions="You are a personal math tutor. Answer questions briefly, in a sentence or less.",
         model="gpt-4o-mini",
     )
     return assistant
 
-def chatCreateMessage(tid: str,msg: str):
-    message = client.beta.threads.messages.create(
+# Messages this worker added to OpenAI threads, by posting a question or
+# running the assistant. A sync issued after one of them does not join a sync
+# that started before it, which could miss the new message.
+OPENAI_MESSAGE_WRITES = WriteGeneration()
+
+@timed(OPENAI_LATENCY, "chatCreateMessage")
+async def chatCreateMessage(client: AsyncOpenAI, tid: str,msg: str):
+    message = await client.beta.threads.messages.create(
         thread_id=str(tid),
         role="user",
         content=str(msg)
     )
+    OPENAI_MESSAGE_WRITES.bump()
     return message
 
-def chatListMessages(thread_id:str):
-    messages = client.beta.threads.messages.list(thread_id=thread_id, order="asc")
-    return messages
+# Copies the messages of a thread that are newer than the last stored one
+# from OpenAI into the local Message collection. Concurrent syncs of a thread
+# share one call, so the same page is not fetched and inserted twice.
+# The sync stops at the first message still being written by a run: the next
+# sync starts after the last stored one, so it is stored once it is final.
+@coalesce("chatSyncMessages", generation=OPENAI_MESSAGE_WRITES)
+@timed(OPENAI_LATENCY, "chatSyncMessages")
+async def chatSyncMessages(
+    client: AsyncOpenAI,
+    db: AsyncDatabase,
+    writer: WriteBehindBuffer,
+    tid: str,
+):
+    last = await latest_message(db, tid)
+    cursor = {"after": last["_id"]} if last else {}
+    messages = []
+    async for message in client.beta.threads.messages.list(thread_id=tid, order="asc", limit=100, **cursor):
+        if message.status == "in_progress":
+            break
+        text = "".join(part.text.value for part in message.content if part.type == "text")
+        messages.append(Message(
+            id=message.id,
+            tid=tid,
+            msg=text,
+            timestamp=message.created_at,
+            role=message.role,
+        ))
+    return await create_message_records(writer, messages)
 
-def chatThreadRun(thread_id:str,assistant_id:str):
-    run = client.beta.threads.runs.create(
+@timed(OPENAI_LATENCY, "chatThreadRun")
+async def chatThreadRun(client: AsyncOpenAI, thread_id:str,assistant_id:str):
+    run = await client.beta.threads.runs.create(
         thread_id=thread_id,
         assistant_id=assistant_id,
     )
     return run
 
-def chatThreadList(thread_id:str,assistant_id:str):
+# Run events that end a streamed run without an answer.
+RUN_FAILED_EVENTS = (
+    "thread.run.failed",
+    "thread.run.cancelled",
+    "thread.run.expired",
+    "thread.run.incomplete",
+)
+
+@timed(OPENAI_LATENCY, "chatThreadRunStream")
+async def chatThreadRunStream(client: AsyncOpenAI, thread_id:str,assistant_id:str):
+    # Same as chatThreadRun, but the run is started with streaming on and
+    # the text of every message delta is yielded as soon as it arrives.
+    stream = await client.beta.threads.runs.create(
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        stream=True,
+    )
+    async with stream:
+        async for event in stream:
+            if event.event == "thread.message.delta":
+                for part in event.data.delta.content or []:
+                    if part.type == "text" and part.text and part.text.value:
+                        yield part.text.value
+            elif event.event in RUN_FAILED_EVENTS:
+                raise RuntimeError(f"Run {event.data.id} ended with {event.data.status}")
+
+@timed(OPENAI_LATENCY, "chatDeleteRemoteThread")
+async def chatDeleteRemoteThread(client: AsyncOpenAI, thread_id: str) -> None:
+    # Already gone, e.g. deleted by an earlier run that was interrupted.
+    with contextlib.suppress(NotFoundError):
+        await client.beta.threads.delete(thread_id)
+
+@timed(OPENAI_LATENCY, "chatThreadList")
+async def chatThreadList(client: AsyncOpenAI, thread_id:str,assistant_id:str):
     # run= client.beta.threads.runs.list(thread_id=thread_id,assistant_id=assistant_id)
     # return run
     return False
 
-def wait_on_run(run, thread):
-    while run.status == "queued" or run.status == "in_progress":
-        run = client.beta.threads.runs.retrieve(
-            thread_id=thread.id,
-            run_id=run.id,
-        )
-        time.sleep(0.5)
-    return run
+# Runs are polled by the worker's RunTracker, which owns every pending run and
+# backs off its polling interval, instead of a sleep loop per run.
+async def wait_on_run(tracker: RunTracker, run, thread):
+    if run.status not in ("queued", "in_progress"):
+        return run
+    return await tracker.track(thread.id, run.id)
 
-def create_thread_and_run(user_input):
-    thread = client.beta.threads.create()
+@timed(OPENAI_LATENCY, "create_thread_and_run")
+async def create_thread_and_run(client: AsyncOpenAI, user_input):
+    thread = await client.beta.threads.create()
     # run = submit_message(MATH_ASSISTANT_ID, thread, user_input)
     # return thread, run
 
+async def streamAnswer(session: "WsSession", request: Request):
+    # Every text delta goes out as its own frame, so the user sees the first
+    # token without waiting for the whole run or polling /list-messages.
+    # Only the final answer is fanned out to the other sockets on the thread.
+    chunks = []
+    async for text in chatThreadRunStream(session.client,request.tid,ASSISTANT_ID):
+        chunks.append(text)
+        await session.peer.event("delta", {"tid": request.tid, "text": text}, request)
+    OPENAI_MESSAGE_WRITES.bump()
+    done = {"tid": request.tid, "message": "".join(chunks)}
+    if request.legacy:
+        await session.peer.event("done", done, request)
+    await session.subscriber.publish(thread_channel(request.tid), {"id": "done", **done})
+    return done
+
 ws = APIRouter()
 
+@dataclass
+class WsSession:
+    """State of one /ws connection, passed to every frame handler."""
+
+    peer: Peer
+    client: AsyncOpenAI
+    tracker: RunTracker
+    channels: ChannelLayer
+    subscriber: ChannelSubscriber
+    limiter: Optional[RateLimiter] = None
+    # Whose rate limit buckets the frames use: the user, or the client address
+    limiter_key: str = ""
+    # Run jobs go there when set, to be run by gainz.worker
+    jobs: Optional[JobQueue] = None
+    db: Optional[AsyncDatabase] = None
+    # User of the token the socket was opened with, if any
+    user_id: Optional[str] = None
+    # Threads of the user this socket already checked (see followThread)
+    owned_threads: set = field(default_factory=set)
+
+# Frame handlers, by op (see protocol.py for the envelope).
+# Each returns the data of the reply or raises ProtocolError.
+# Spends a token of the socket's bucket for the op (see gainz.services.ratelimit).
+async def checkRate(session: WsSession, request: Request):
+    if session.limiter is None:
+        return
+    decision = await session.limiter.hit(session.limiter_key, f"ws:{request.op}")
+    if not decision.allowed:
+        raise ProtocolError(
+            "rate_limited",
+            "Too many requests. Try again later",
+            {"retry_after": round(decision.retry_after, 3)},
+        )
+
+# Events of a thread are only sent to sockets of its owner, so the thread is
+# looked up by (tid, uid) once per socket before following its channel.
+# Anonymous sockets follow no thread: the legacy client only reads the
+# replies to its own frames.
+async def followThread(session: WsSession, tid: str):
+    if session.user_id is None or session.db is None:
+        return
+    if tid not in session.owned_threads:
+        if not await thread_owned(session.db, tid, session.user_id):
+            return
+        session.owned_threads.add(tid)
+    await session.subscriber.follow(thread_channel(tid))
+
+def requireTid(request: Request):
+    if not request.tid:
+        raise ProtocolError("bad_request", "tid is required")
+    return request.tid
+
+async def onQuestion(session: WsSession, request: Request):
+    tid = requireTid(request)
+    if request.message is None:
+        raise ProtocolError("bad_request", "message is required")
+    message = await chatCreateMessage(session.client,tid,request.message)
+    return {"tid": tid, "id": message.id}
+
+async def onAnswer(session: WsSession, request: Request):
+    tid = requireTid(request)
+    if request.stream:
+        return await streamAnswer(session, request)
+    if session.jobs is not None:
+        # The run is left to a gainz.worker (see gainz.services.jobs.runs),
+        # its end comes as a "run" event.
+        job = await session.jobs.enqueue(RUN_JOB, {"tid": tid, "aid": ASSISTANT_ID})
+        return {"tid": tid, "job": job, "status": "queued"}
+    run = await chatThreadRun(session.client,tid,ASSISTANT_ID)
+    notify = notify_run(session.channels)
+
+    async def done(run: Any) -> None:
+        # The answer of the run is on the thread now.
+        OPENAI_MESSAGE_WRITES.bump()
+        await notify(run)
+
+    session.tracker.track(run.thread_id, run.id, done)
+    return {"tid": tid, "run": run.id, "status": run.status}
+
+async def onList(session: WsSession, request: Request):
+    await chatThreadList(session.client,requireTid(request),ASSISTANT_ID)
+
+async def onPing(session: WsSession, request: Request):
+    return {"time": time.time()}
+
+FRAME_HANDLERS = {
+    "question": onQuestion,
+    "answer": onAnswer,
+    "list": onList,
+    "ping": onPing,
+}
+
+async def handleRequest(session: WsSession, request: Request):
+    peer = session.peer
+    handler = FRAME_HANDLERS.get(request.op)
+    if handler is None:
+        WS_FRAME_LATENCY.labels("unknown", "error").observe(0)
+        await peer.error(request, "unknown_op", f"Unknown op {request.op}")
+        return
+    # Every frame runs in its own task, the id only tags its own log records.
+    request_id.set(request.rid)
+    start = perf_counter()
+    try:
+        if request.tid:
+            await followThread(session, request.tid)
+        await checkRate(session, request)
+        result = await handler(session, request)
+    except ProtocolError as e:
+        WS_FRAME_LATENCY.labels(request.op, "error").observe(perf_counter() - start)
+        await peer.error(request, e.code, e.message, e.details)
+        return
+    except (WebSocketDisconnect, asyncio.CancelledError):
+        raise
+    except Exception:
+        WS_FRAME_LATENCY.labels(request.op, "error").observe(perf_counter() - start)
+        logger.exception("Frame %s failed", request.op)
+        await peer.error(request, "upstream_error", "Request failed. Try again")
+        return
+    WS_FRAME_LATENCY.labels(request.op, "ok").observe(perf_counter() - start)
+    await peer.reply(request, result)
+
+# Heartbeat of a quiet socket, which the client answers with any frame (a ping
+# op will do). Only clients of the versioned protocol get it (see
+# gainz.services.connections): legacy clients show every frame in the chat.
+# Those are kept alive, and dropped once dead, by the websocket pings of
+# uvicorn (ws_ping_interval).
+def heartbeat(peer: Peer):
+    async def send() -> None:
+        await peer.event("heartbeat", {"time": time.time()})
+    return send
+
 # This is the main websocket API for AI messages. 
 # To DO: Other training, model build up, crteria checks etc. 
 
 @ws.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    *,
+    client: AsyncOpenAI = Depends(get_openai_client),
+    tracker: RunTracker = Depends(get_run_tracker),
+    channels: ChannelLayer = Depends(get_channel_layer),
+    connections: ConnectionRegistry = Depends(get_connection_registry),
+    limiter: Optional[RateLimiter] = Depends(get_rate_limiter),
+    jobs: Optional[JobQueue] = Depends(get_job_queue),
+    db: AsyncDatabase = Depends(get_db),
+    token: Optional[str] = None,
+):
     await websocket.accept()
-    while True:
-        data = await websocket.receive_text()
+    # Tags the log records of this socket, and of the frame tasks it starts.
+    sid = uuid.uuid4().hex
+    socket_id.set(sid)
+    claims = verify_token(token) if token else None
+    user_id = claims.get("user_id") if isinstance(claims, dict) else None
+    # Frames to the client go through a bounded queue drained by a writer task,
+    # so a client that reads slowly cannot make the worker buffer without limit.
+    outbound = OutboundQueue(websocket, settings.ws_send_queue_size, settings.ws_overflow_policy)
+    outbound.start()
+    peer = Peer(websocket, outbound)
 
-        try:
-            obj = json.loads(str(data))
-            if (obj['id']=="question"):
-                try:
-                    response = chatCreateMessage(str(obj['tid']),str(obj['message']))
-                    await websocket.send_text("Your messages successfully updates our assistant.")
-                except:
-                    await websocket.send_text("Your messages cannot updates to our assistant. Try again")
-            elif (obj['id']=="answer"):
-                try:
-                    run = chatThreadRun(str(obj['tid']),ASSISTANT_ID)
-                    await websocket.send_text("Your questions will be come out soon.")
-                except:
-                    await websocket.send_text("Your messages cannot be answer. Try again")
-            elif (obj['id']=="list"):
-                try:
-                    response = chatThreadList(str(obj['tid']),ASSISTANT_ID)
-                    await websocket.send_text("Your questions will be list out soon.")
-                except:
-                    await websocket.send_text("Your messages cannot be answer. Try again")
-
-        except json.JSONDecodeError:
-                await websocket.send_text("Your messages cannot updates to our assistant. Try again")
-
-        
-        ### This is old method 
-        # messages_array = json.loads(data)        
-        # reply = openChat(messages_array)
-        
-        # New method
-        # print(vars(data).tid)
-        # oj = json.loads(data)
-        # print(oj)
-        # messages_array = vars(data)
-        # print(data.tid)
-        # print(messages_array)
-        # response = chatCreateMessage(messages_array['tid'],messages_array['message'])
-        # print(response)
-        # await websocket.send_text(response)
+    async def forward(event: Dict[str, Any]) -> None:
+        with contextlib.suppress(SlowConsumerError):
+            await peer.event(event["id"], {key: val for key, val in event.items() if key != "id"})
+
+    # The socket follows the channel of its user (when a token is given) and of
+    # every thread of the user it sends frames for, so events from other
+    # workers reach it.
+    subscriber = ChannelSubscriber(channels, sid, forward)
+    # Anonymous sockets share a bucket per client address. Behind a proxy, uvicorn
+    # takes it from X-Forwarded-For when the proxy is trusted (forwarded_allow_ips).
+    limiter_key = user_id or f"ip:{websocket.client.host if websocket.client else 'unknown'}"
+    session = WsSession(peer, client, tracker, channels, subscriber, limiter, limiter_key, jobs, db, user_id)
+    # Frames run concurrently, in order per thread (see dispatch.py).
+    dispatcher = FrameDispatcher(settings.ws_max_inflight)
+    # Quiet versioned sockets get heartbeats and are closed once idle (see gainz.services.connections).
+    connection = Connection(user_id, heartbeat(peer), websocket.close)
+    try:
+        connections.register(connection)
+    except TooManyConnectionsError:
+        await outbound.stop()
+        await websocket.close(BUSY_CLOSE_CODE, "too many connections")
+        return
+    WS_CONNECTIONS.inc()
+    try:
+        if user_id:
+            await subscriber.follow(user_channel(user_id))
+        while True:
+            data = await peer.receive()
+            try:
+                request = decode(data)
+            except ProtocolError as e:
+                await peer.error(None, e.code, e.message)
+                continue
+            connection.touch(request.v == PROTOCOL_VERSION)
+            peer.version = request.v
+            await dispatcher.submit(request.tid, partial(handleRequest, session, request))
+    except WebSocketDisconnect:
+        # Client went away, or was evicted as a slow consumer.
+        return
+    finally:
+        # The client is gone, nothing is left to answer.
+        connections.unregister(connection)
+        WS_CONNECTIONS.dec()
+        await dispatcher.close()
+        await subscriber.close()
+        await outbound.stop()
+
+# Websocket counters of this worker, for capacity planning
+@ws.get("/ws-stats")
+async def ws_stats(connections: ConnectionRegistry = Depends(get_connection_registry)):
+    return {"connections": connections.stats(), "outbound": asdict(outbound_stats)}
 
 @ws.post("/create-assistant")
 async def create_assistant():
@@ -143,8 +489,13 @@ async def create_assistant():
 
 
 @ws.post("/create-thread")
-def chatCreateThread(current_user: User = Depends(get_current_user)):
-    response = client.beta.threads.create()
+async def chatCreateThread(
+    current_user: User = Depends(rate_limit("create-thread")),
+    client: AsyncOpenAI = Depends(get_openai_client),
+    writer: WriteBehindBuffer = Depends(get_db_writer),
+    channels: ChannelLayer = Depends(get_channel_layer),
+):
+    response = await client.beta.threads.create()
     try:
         thread_data = {
             "id": response.id,
@@ -154,39 +505,115 @@ def chatCreateThread(current_user: User = Depends(get_current_user)):
             "name": "New Thread"
         }
         thread = Thread(**thread_data)
-        create_thread_record(thread)
+        if not await create_thread_record(writer, thread):
+            return {"message": "Create fail", "code": -100}
+        # Lets the user's other sockets pick up the new thread.
+        event = {"id": "thread", "tid": thread.id, "name": thread.name, "timestamp": thread.timestamp}
+        await channels.publish(user_channel(thread.uid), event)
         return {"message":"Create Success","code": 100}
-    except Exception as e:
-        print(f"An error occurred: {e}")
+    except Exception:
+        logger.exception("Could not create a thread")
         return {"message": "Create fail", "code": -100}
 
 @ws.post("/list-thread")
-def chatListThread(current_user: User = Depends(get_current_user)):
-    try:        
-        uid = current_user['id']
-        result=list_all_threads(uid)
-        print(result)
-        return result
-    except:
-        return False
+async def chatListThread(
+    response: Response,
+    *,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1, le=500),
+    stream: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: AsyncDatabase = Depends(get_db),
+):
+    # Keyset pagination on (timestamp, id). With a limit, the JSON response is one
+    # page, with the cursor of the next page in the X-Next-Cursor header. Without
+    # one every thread is returned, as the frontend does not page. With stream=true every
+    # remaining thread is sent as NDJSON straight from the database cursor,
+    # so memory stays flat however many threads the user has.
+    uid = current_user['id']
+    after = parseThreadCursor(cursor)
+    if stream:
+        lines = (ujson.dumps(thread) + "\n" async for thread in iter_threads(db, uid, after))
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+    page = await list_threads_page(db, uid, after, limit)
+    if limit is not None and len(page) > limit:
+        page = page[:limit]
+        response.headers["X-Next-Cursor"] = f"{page[-1]['timestamp']}:{page[-1]['id']}"
+    return page
+
+def parseThreadCursor(cursor: Optional[str]):
+    if not cursor:
+        return None
+    ts, _, tid = cursor.partition(":")
+    try:
+        return int(ts), tid
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from None
 
 
 @ws.post("/list-messages")
-def chatListMessages(msg: Msg):
+async def chatListMessages(
+    msg: Msg,
+    client: AsyncOpenAI = Depends(get_openai_client),
+    db: AsyncDatabase = Depends(get_db),
+    writer: WriteBehindBuffer = Depends(get_db_writer),
+):
+    # Served from the local store, one indexed range scan per page. OpenAI is only
+    # asked for the messages newer than the last stored one, and only when the
+    # page reaches the end of what is stored, or the after message is not stored yet.
+    # An after message still unknown once synced (deleted, or of another thread) is
+    # rejected rather than listing the thread again from the start.
     tid = msg.tid
-    messages = client.beta.threads.messages.list(thread_id=tid, order="asc")
-    return messages
+    page = await list_messages(db, tid, msg.after, msg.limit)
+    if page is None or msg.limit is None or len(page) <= msg.limit:
+        try:
+            if await chatSyncMessages(client, db, writer, tid):
+                page = await list_messages(db, tid, msg.after, msg.limit)
+        except Exception:
+            logger.exception("Could not sync messages of thread %s", tid)
+    if page is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown cursor")
+    data = page[:msg.limit]
+    return {
+        "data": data,
+        "last_id": data[-1]["id"] if data else msg.after,
+        "has_more": len(data) < len(page),
+    }
 
 @ws.post("/delete-thread")
-def chatDeleteThread(current_user: User = Depends(get_current_user)):
-    try:        
-        uid = current_user['id']
-        result=delete_all_threads(uid)
-        print(result)
-        return True
-    except:
-        return False
-    # messages = client.beta.threads.messages.list(thread_id=threadId, order="asc")
-    # print (messages)
-    # return messages
+async def chatDeleteThread(
+    stream: bool = False,
+    current_user: User = Depends(get_current_user),
+    client: AsyncOpenAI = Depends(get_openai_client),
+    db: AsyncDatabase = Depends(get_db),
+    channels: ChannelLayer = Depends(get_channel_layer),
+):
+    # Deletes every thread of the user on OpenAI, then locally with its messages
+    # (see cleanup.py). With stream=true the progress is sent as NDJSON after every
+    # page. Threads that could not be deleted are kept, calling it again resumes.
+    uid = current_user['id']
+
+    async def progress() -> AsyncIterator[Dict[str, Any]]:
+        steps = delete_user_threads(
+            db,
+            uid,
+            partial(chatDeleteRemoteThread, client),
+            concurrency=settings.delete_concurrency,
+            batch_size=settings.delete_batch_size,
+            max_attempts=settings.delete_max_attempts,
+            retry_backoff=settings.delete_retry_backoff,
+        )
+        async for step in steps:
+            yield asdict(step)
+        await channels.publish(user_channel(uid), {"id": "threads-deleted"})
+        logger.info("Deleted threads of user %s: %s", uid, step)
 
+    if stream:
+        lines = (ujson.dumps(step) + "\n" async for step in progress())
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+    try:
+        steps = [step async for step in progress()]
+        return steps[-1]["failed"] == 0
+    except Exception:
+        logger.exception("Could not delete the threads of user %s", uid)
+        return False
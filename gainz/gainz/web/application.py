@@ -4,6 +4,8 @@ from fastapi import FastAPI, Request
 from fastapi.responses import UJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
+from gainz.log import CorrelationMiddleware, configure_logging
+from gainz.services.metrics.middleware import MetricsMiddleware
 from gainz.web.api.router import api_router
 from gainz.web.lifespan import lifespan_setup
 
@@ -18,6 +20,7 @@ def get_app() -> FastAPI:
 
     :return: application.
     """
+    configure_logging()
     app = FastAPI(
         title="gainz",
         version=metadata.version("gainz"),
@@ -33,7 +36,10 @@ def get_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"], 
         allow_headers=["*"],  
+        expose_headers=["X-Next-Cursor"],
     )
+    app.add_middleware(MetricsMiddleware)
+    app.add_middleware(CorrelationMiddleware)
     # Main router for the API.
     app.include_router(router=api_router, prefix="/api")
 
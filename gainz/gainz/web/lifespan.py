@@ -2,7 +2,33 @@ from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
 from fastapi import FastAPI
+from gainz.services.cache.lifespan import init_user_cache
+from gainz.services.connections.lifespan import (
+    init_connections,
+    shutdown_connections,
+)
+from gainz.services.channels.lifespan import init_channels, shutdown_channels
+from gainz.services.jobs.lifespan import init_job_queue, shutdown_job_queue
+from gainz.services.metrics.lifespan import init_metrics, shutdown_metrics
+from gainz.services.mongo.lifespan import (
+    init_db_writer,
+    init_mongo,
+    shutdown_db_writer,
+    shutdown_mongo,
+)
+from gainz.services.openai.lifespan import init_openai, shutdown_openai
+from gainz.services.passwords.lifespan import (
+    init_password_hasher,
+    shutdown_password_hasher,
+)
+from gainz.services.ratelimit.lifespan import init_rate_limiter
+from gainz.services.readiness.lifespan import (
+    init_readiness,
+    shutdown_readiness,
+    start_warmup,
+)
 from gainz.services.redis.lifespan import init_redis, shutdown_redis
+from gainz.services.runs.lifespan import init_run_tracker, shutdown_run_tracker
 
 
 @asynccontextmanager
@@ -11,8 +37,33 @@ async def lifespan_setup(
 ) -> AsyncGenerator[None, None]:  # pragma: no cover
 
     app.middleware_stack = None
+    init_readiness(app)
     init_redis(app)
+    init_user_cache(app)
+    init_rate_limiter(app)
+    init_job_queue(app)
+    init_channels(app)
+    init_mongo(app)
+    init_db_writer(app)
+    init_openai(app)
+    init_run_tracker(app)
+    init_password_hasher(app)
+    init_connections(app)
+    init_metrics(app)
     app.middleware_stack = app.build_middleware_stack()
+    # Indexes and connection pools are set up in the background,
+    # see /api/ready.
+    start_warmup(app)
 
     yield
+    await shutdown_readiness(app)
+    await shutdown_connections(app)
+    shutdown_password_hasher(app)
+    await shutdown_run_tracker(app)
+    await shutdown_openai(app)
+    await shutdown_db_writer(app)
+    await shutdown_mongo(app)
+    await shutdown_channels(app)
+    await shutdown_job_queue(app)
     await shutdown_redis(app)
+    await shutdown_metrics(app)
@@ -0,0 +1,71 @@
+import asyncio
+import os
+import signal
+import socket
+from functools import partial
+
+from fastapi import FastAPI
+from prometheus_client import start_http_server
+
+from gainz.log import configure_logging
+from gainz.services.channels.layer import ChannelLayer
+from gainz.services.jobs.lifespan import create_job_queue
+from gainz.services.jobs.runs import RUN_JOB, run_job
+from gainz.services.jobs.worker import JobWorker
+from gainz.services.openai.lifespan import init_openai, shutdown_openai
+from gainz.services.redis.lifespan import init_redis, shutdown_redis
+from gainz.services.runs.lifespan import init_run_tracker, shutdown_run_tracker
+from gainz.settings import settings
+
+
+async def run_worker() -> None:  # pragma: no cover
+    """
+    Runs the run jobs queued by the web workers until SIGINT or SIGTERM.
+
+    The clients are created by the same lifespan helpers as in the web
+    workers, the application only holds their state.
+    """
+    app = FastAPI()
+    init_redis(app)
+    init_openai(app)
+    init_run_tracker(app)
+    # Only publishes, the results reach the sockets through the web workers.
+    channels = ChannelLayer(app.state.redis_pool)
+    queue = create_job_queue(app)
+    worker = JobWorker(
+        queue,
+        {
+            RUN_JOB: partial(
+                run_job,
+                app.state.openai_client,
+                app.state.run_tracker,
+                channels,
+            ),
+        },
+        consumer=f"{socket.gethostname()}-{os.getpid()}",
+        concurrency=settings.jobs_concurrency,
+        claim_idle=settings.jobs_claim_idle,
+    )
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await queue.close()
+        await channels.stop()
+        await shutdown_run_tracker(app)
+        await shutdown_openai(app)
+        await shutdown_redis(app)
+
+
+def main() -> None:  # pragma: no cover
+    """Entrypoint of the run worker."""
+    configure_logging()
+    if settings.worker_metrics_port is not None:
+        start_http_server(settings.worker_metrics_port)
+    asyncio.run(run_worker())
+
+
+if __name__ == "__main__":
+    main()
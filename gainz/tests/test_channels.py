@@ -0,0 +1,48 @@
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+from redis.asyncio import ConnectionPool
+
+from gainz.services.channels.layer import ChannelLayer, ChannelSubscriber
+
+
+@pytest.mark.anyio
+async def test_events_reach_other_workers(fake_redis_pool: ConnectionPool) -> None:
+    """
+    Checks that an event published by one worker reaches another one.
+
+    :param fake_redis_pool: fake redis pool shared by both workers.
+    """
+    sender = ChannelLayer(fake_redis_pool)
+    receiver = ChannelLayer(fake_redis_pool)
+    receiver.start()
+    received: List[Dict[str, Any]] = []
+    delivered = asyncio.Event()
+
+    async def handler(event: Dict[str, Any]) -> None:
+        received.append(event)
+        delivered.set()
+
+    subscriber = ChannelSubscriber(receiver, "socket-1", handler)
+    try:
+        await subscriber.follow("gainz:thread:t1")
+        # The socket's own copy is skipped, the other one is delivered.
+        await subscriber.publish("gainz:thread:t1", {"id": "done"})
+        await sender.publish("gainz:thread:t1", {"id": "run", "status": "completed"})
+        await asyncio.wait_for(delivered.wait(), timeout=2)
+        await subscriber.close()
+    finally:
+        await receiver.stop()
+        await sender.stop()
+
+    assert received == [{"id": "run", "status": "completed"}]
+
+
+@pytest.mark.anyio
+async def test_start_without_redis() -> None:
+    """Starting the layer does not wait for redis, which may still be down."""
+    layer = ChannelLayer(ConnectionPool.from_url("redis://127.0.0.1:1/0"))
+    layer.start()
+    await asyncio.sleep(0.1)
+    await layer.stop()
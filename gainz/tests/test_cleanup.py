@@ -0,0 +1,78 @@
+import asyncio
+from dataclasses import asdict
+from typing import Any, Dict, List, Set
+
+import pytest
+
+from benchmarks.fake_mongo import FakeDatabase
+from gainz.web.api.monitoring.cleanup import delete_user_threads
+
+
+async def seed(db: FakeDatabase, uid: str, count: int) -> None:
+    """Stores count threads of a user."""
+    for index in range(count):
+        tid = f"thread_{index:04d}"
+        await db["Thread"].insert_one(
+            {"_id": tid, "id": tid, "uid": uid, "aid": "a", "name": "", "timestamp": 1},
+        )
+        await db["Message"].insert_one({"_id": f"msg_{index}", "tid": tid})
+    await db["Thread"].insert_one(
+        {"_id": "other", "id": "other", "uid": "someone", "timestamp": 1},
+    )
+
+
+async def run(db: FakeDatabase, remote: Any, **kwargs: Any) -> List[Dict[str, Any]]:
+    """Deletes the threads of u1, collecting the progress steps."""
+    db_any: Any = db
+    steps = delete_user_threads(db_any, "u1", remote, retry_backoff=0, **kwargs)
+    return [asdict(step) async for step in steps]
+
+
+@pytest.mark.anyio
+async def test_bulk_delete() -> None:
+    """Deletes every thread of the user, remote deletions capped and retried."""
+    db = FakeDatabase()
+    await seed(db, "u1", 25)
+    running = 0
+    peak = 0
+    attempts: Dict[str, int] = {}
+
+    async def remote(tid: str) -> None:
+        nonlocal running, peak
+        attempts[tid] = attempts.get(tid, 0) + 1
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+        if attempts[tid] == 1 and tid.endswith("3"):
+            raise ConnectionError("flaky")
+
+    steps = await run(db, remote, concurrency=4, batch_size=10)
+
+    assert [step["deleted"] for step in steps] == [10, 20, 25, 25]
+    assert steps[-1] == {"total": 25, "deleted": 25, "failed": 0, "done": True}
+    assert peak == 4
+    assert attempts["thread_0003"] == 2
+    assert await db["Thread"].count_documents({}) == 1
+    assert await db["Message"].count_documents({}) == 0
+
+
+@pytest.mark.anyio
+async def test_bulk_delete_resumes() -> None:
+    """Threads that could not be deleted are kept, and deleted by the next run."""
+    db = FakeDatabase()
+    await seed(db, "u1", 5)
+    down: Set[str] = {"thread_0002"}
+
+    async def remote(tid: str) -> None:
+        if tid in down:
+            raise ConnectionError("down")
+
+    steps = await run(db, remote, max_attempts=2)
+    assert steps[-1]["failed"] == 1
+    assert await db["Message"].count_documents({"tid": "thread_0002"}) == 1
+
+    down.clear()
+    steps = await run(db, remote)
+    assert steps[-1] == {"total": 1, "deleted": 1, "failed": 0, "done": True}
+    assert await db["Message"].count_documents({}) == 0
@@ -0,0 +1,55 @@
+from typing import List, Tuple
+
+import pytest
+
+from gainz.services.connections.registry import (
+    Connection,
+    ConnectionRegistry,
+    TooManyConnectionsError,
+)
+
+
+@pytest.mark.anyio
+async def test_registry() -> None:
+    """Checks the counts, the cap, heartbeats and idle eviction."""
+    registry = ConnectionRegistry(
+        max_connections=2,
+        heartbeat_interval=0,
+        idle_timeout=60,
+    )
+    beats: List[str] = []
+    closed: List[Tuple[str, int, str]] = []
+
+    def connect(name: str, user_id: str) -> Connection:
+        async def heartbeat() -> None:
+            if name == "dead":
+                raise ConnectionResetError
+            beats.append(name)
+
+        async def close(code: int, reason: str) -> None:
+            closed.append((name, code, reason))
+
+        connection = Connection(user_id, heartbeat, close)
+        connection.touch(versioned=name != "legacy")
+        return connection
+
+    registry.register(connect("alive", "u1"))
+    registry.register(connect("dead", "u1"))
+    assert registry.user_count("u1") == 2
+    with pytest.raises(TooManyConnectionsError):
+        registry.register(connect("late", "u2"))
+
+    await registry.sweep()
+    assert beats == ["alive"]
+    assert closed == [("dead", 1001, "dead")]
+    assert registry.stats()["per_user"] == {"u1": 1}
+
+    # Legacy clients cannot answer heartbeats, they are never idle.
+    registry.register(connect("legacy", "u2"))
+    registry.idle_timeout = 0
+    await registry.sweep()
+    assert beats == ["alive"]
+    assert closed[-1] == ("alive", 1001, "idle")
+    assert len(registry) == 1
+    assert registry.stats()["evicted"] == 2
+    assert registry.stats()["rejected"] == 1
@@ -0,0 +1,83 @@
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import pytest
+
+from gainz.services.context.window import MESSAGE_OVERHEAD, ContextWindow, TokenCounter
+
+
+class WordCounter(TokenCounter):
+    """One token per word, so the test does not depend on tiktoken."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.counted = 0
+        self.threads: Set[int] = set()
+
+    def count_text(self, text: str) -> int:
+        """Counts the words of the text."""
+        self.counted += 1
+        self.threads.add(threading.get_ident())
+        return len(text.split())
+
+
+def conversation(size: int) -> List[Dict[str, Any]]:
+    """Messages of 10 words, so 10 + MESSAGE_OVERHEAD tokens each."""
+    return [
+        {"role": "user", "content": f"message {index} " + "word " * 8}
+        for index in range(size)
+    ]
+
+
+def tokens(messages: List[Dict[str, Any]]) -> int:
+    """Counts the tokens of messages like WordCounter."""
+    return sum(len(str(msg["content"]).split()) + MESSAGE_OVERHEAD for msg in messages)
+
+
+@pytest.mark.anyio
+async def test_window_keeps_newest_messages() -> None:
+    """Only the newest messages within the budget are sent, counts are cached."""
+    counter = WordCounter()
+    window = ContextWindow(counter, max_tokens=100)
+    messages = conversation(30)
+
+    fitted = await window.fit(messages)
+    assert fitted == messages[-7:]
+    assert tokens(fitted) <= 100
+
+    assert counter.counted == 8
+    new = {"role": "user", "content": "new one"}
+    fitted = await window.fit([*messages, new])
+    assert fitted == [*messages[-6:], new]
+    # Only the new message is counted, never on the event loop.
+    assert counter.counted == 9
+    assert threading.get_ident() not in counter.threads
+    # The newest message is kept even alone over the budget.
+    huge = {"role": "user", "content": "word " * 500}
+    assert await window.fit([*messages, huge]) == [huge]
+
+
+@pytest.mark.anyio
+async def test_rolling_summary() -> None:
+    """Older messages are summarized once, every few turns, from the last summary."""
+    calls: List[Tuple[Optional[str], int]] = []
+
+    async def summarize(
+        previous: Optional[str],
+        messages: List[Dict[str, Any]],
+        max_tokens: int,
+    ) -> str:
+        calls.append((previous, len(messages)))
+        return f"summary {len(calls)}"
+
+    # 18 messages fit beside the summary.
+    window = ContextWindow(WordCounter(), max_tokens=300, summary_max_tokens=40)
+    messages = conversation(100)
+    sizes = []
+    for size in range(1, len(messages) + 1):
+        fitted = await window.fit(messages[:size], summarize)
+        sizes.append(tokens(fitted))
+    assert max(sizes) <= 300
+    # Every summary but the first extends the previous one with 8 messages.
+    assert calls == [(None, 8)] + [(f"summary {index}", 8) for index in range(1, 11)]
+    assert fitted[0]["content"].endswith("summary 11")
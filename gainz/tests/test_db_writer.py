@@ -0,0 +1,118 @@
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+
+from gainz.services.mongo.writer import WriteBehindBuffer
+
+
+class FakeCollection:
+    """Collection recording every insert_many call."""
+
+    def __init__(self, fail: bool = False) -> None:
+        self.batches: List[List[Dict[str, Any]]] = []
+        self.fail = fail
+
+    async def insert_many(self, docs: List[Dict[str, Any]], ordered: bool) -> None:
+        """Records the batch, or fails when told to."""
+        if self.fail:
+            raise RuntimeError("write failed")
+        self.batches.append(docs)
+
+
+@pytest.mark.anyio
+async def test_writes_are_batched() -> None:
+    """Checks that concurrent inserts share one insert_many per collection."""
+    db: Any = {"Thread": FakeCollection(), "Message": FakeCollection()}
+    writer = WriteBehindBuffer(db, batch_size=10, flush_interval=0.01)
+    writer.start()
+    futures = [
+        await writer.put("Message", {"_id": "m1"}),
+        await writer.put("Thread", {"_id": "t1"}),
+        await writer.put("Message", {"_id": "m2"}),
+    ]
+    await asyncio.gather(*futures)
+    await writer.stop()
+
+    assert db["Message"].batches == [[{"_id": "m1"}, {"_id": "m2"}]]
+    assert db["Thread"].batches == [[{"_id": "t1"}]]
+    assert writer.written == 3
+
+
+@pytest.mark.anyio
+async def test_failed_writes_are_reported() -> None:
+    """Checks that a failed batch fails the futures of its documents."""
+    db: Any = {"Message": FakeCollection(fail=True)}
+    writer = WriteBehindBuffer(db, flush_interval=0.01)
+    writer.start()
+    stored = await writer.put("Message", {"_id": "m1"})
+    await writer.stop()
+
+    with pytest.raises(RuntimeError):
+        await stored
+    assert writer.failed == 1
+
+
+@pytest.mark.anyio
+async def test_flush_by_size_and_interval() -> None:
+    """A full batch is written at once, the rest after the interval."""
+    db: Any = {"Message": FakeCollection()}
+    writer = WriteBehindBuffer(db, batch_size=2, flush_interval=0.05)
+    writer.start()
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    first = await writer.put("Message", {"_id": "m1"})
+    await writer.put("Message", {"_id": "m2"})
+    last = await writer.put("Message", {"_id": "m3"})
+
+    await first
+    assert loop.time() - start < 0.05
+    assert db["Message"].batches == [[{"_id": "m1"}, {"_id": "m2"}]]
+    await last
+    assert loop.time() - start >= 0.05
+    assert db["Message"].batches[1] == [{"_id": "m3"}]
+    await writer.stop()
+
+
+@pytest.mark.anyio
+async def test_waited_writes_skip_the_interval() -> None:
+    """Documents a caller waits for are written without waiting the interval."""
+    db: Any = {"Message": FakeCollection()}
+    writer = WriteBehindBuffer(db, flush_interval=10)
+    writer.start()
+    await writer.put("Message", {"_id": "m1"})
+    await asyncio.wait_for(writer.write("Message", [{"_id": "m2"}]), 1)
+
+    # The document queued before is written in the same batch.
+    assert db["Message"].batches == [[{"_id": "m1"}, {"_id": "m2"}]]
+    await writer.stop()
+
+
+@pytest.mark.anyio
+async def test_stop_drains_the_queue() -> None:
+    """Stopping writes every queued document, without waiting the interval."""
+    db: Any = {"Message": FakeCollection()}
+    writer = WriteBehindBuffer(db, batch_size=2, flush_interval=10)
+    writer.start()
+    for index in range(5):
+        await writer.put("Message", {"_id": f"m{index}"})
+    await asyncio.wait_for(writer.stop(), 1)
+
+    assert len(writer) == 0
+    assert writer.written == 5
+    assert [len(batch) for batch in db["Message"].batches] == [2, 2, 1]
+
+
+@pytest.mark.anyio
+async def test_failed_writes_do_not_block_stop() -> None:
+    """A failing insert still marks its documents done, so stop returns."""
+    db: Any = {"Message": FakeCollection(fail=True)}
+    writer = WriteBehindBuffer(db, batch_size=2, flush_interval=10)
+    writer.start()
+    for index in range(3):
+        await writer.put("Message", {"_id": f"m{index}"})
+    with pytest.raises(RuntimeError):
+        await writer.write("Message", [{"_id": "m3"}])
+    await asyncio.wait_for(writer.stop(), 1)
+
+    assert writer.failed == 4
@@ -0,0 +1,59 @@
+import asyncio
+from typing import Awaitable, Callable, List
+
+import pytest
+
+from gainz.web.api.monitoring.dispatch import FrameDispatcher
+
+
+@pytest.mark.anyio
+async def test_order_per_key() -> None:
+    """Checks that keys run concurrently and frames of a key in order."""
+    dispatcher = FrameDispatcher(max_inflight=8)
+    done: List[str] = []
+    slow = asyncio.Event()
+
+    def frame(name: str, wait: bool = False) -> Callable[[], Awaitable[None]]:
+        async def handle() -> None:
+            if wait:
+                await slow.wait()
+            done.append(name)
+
+        return handle
+
+    await dispatcher.submit("t1", frame("t1-a", wait=True))
+    await dispatcher.submit("t1", frame("t1-b"))
+    await dispatcher.submit("t2", frame("t2-a"))
+    await dispatcher.submit(None, frame("ping"))
+    await asyncio.sleep(0.01)
+    # The slow frame holds up its own thread only.
+    assert sorted(done) == ["ping", "t2-a"]
+
+    slow.set()
+    await dispatcher.join()
+    assert done[2:] == ["t1-a", "t1-b"]
+    assert len(dispatcher) == 0
+
+
+@pytest.mark.anyio
+async def test_cap_and_close() -> None:
+    """Checks the in-flight cap and that close cancels running frames."""
+    dispatcher = FrameDispatcher(max_inflight=2)
+    cancelled: List[int] = []
+
+    async def hang(index: int) -> None:
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.append(index)
+            raise
+
+    await dispatcher.submit("t1", lambda: hang(1))
+    await dispatcher.submit("t2", lambda: hang(2))
+    await asyncio.sleep(0)
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(dispatcher.submit("t3", lambda: hang(3)), 0.05)
+
+    await dispatcher.close()
+    assert sorted(cancelled) == [1, 2]
+    assert len(dispatcher) == 0
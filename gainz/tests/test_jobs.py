@@ -0,0 +1,155 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Tuple
+
+import pytest
+from redis.asyncio import ConnectionPool, Redis
+
+from gainz.services.jobs.queue import JobQueue
+from gainz.services.jobs.runs import run_job
+from gainz.services.jobs.worker import JobHandler, JobWorker
+
+
+async def run_until(worker: JobWorker, done: Callable[[], bool]) -> None:
+    """Runs the worker until done() is true."""
+    task = asyncio.create_task(worker.run(drain_timeout=1))
+    for _ in range(200):
+        if done():
+            break
+        await asyncio.sleep(0.01)
+    worker.stop()
+    await task
+
+
+def make_queue(pool: ConnectionPool) -> JobQueue:
+    """Returns a queue without retry backoff."""
+    return JobQueue(pool, "test:jobs", "workers", max_attempts=3, retry_backoff=0)
+
+
+@pytest.mark.anyio
+async def test_jobs_run_and_ack(fake_redis_pool: ConnectionPool) -> None:
+    """Every job runs once and is acked."""
+    queue = make_queue(fake_redis_pool)
+    seen: List[Dict[str, Any]] = []
+
+    async def handler(payload: Dict[str, Any]) -> None:
+        seen.append(payload)
+
+    for index in range(5):
+        await queue.enqueue("echo", {"n": index})
+    worker = JobWorker(queue, {"echo": handler}, "w1", concurrency=2, block=0.01)
+    await run_until(worker, lambda: len(seen) == 5)
+
+    assert sorted(payload["n"] for payload in seen) == list(range(5))
+    async with Redis(connection_pool=fake_redis_pool) as redis:
+        pending = await redis.xpending("test:jobs", "workers")
+    assert pending["pending"] == 0
+
+
+@pytest.mark.anyio
+async def test_failed_jobs_are_dead_lettered(fake_redis_pool: ConnectionPool) -> None:
+    """A job failing every attempt ends up in the dead letter stream."""
+    queue = make_queue(fake_redis_pool)
+    attempts: List[int] = []
+
+    async def handler(payload: Dict[str, Any]) -> None:
+        attempts.append(1)
+        raise RuntimeError("boom")
+
+    await queue.enqueue("flaky", {})
+    worker = JobWorker(queue, {"flaky": handler}, "w1", block=0.01)
+
+    async def dead() -> List[Any]:
+        async with Redis(connection_pool=fake_redis_pool) as redis:
+            return await redis.xrange(queue.dead_stream)
+
+    task = asyncio.create_task(worker.run(drain_timeout=1))
+    for _ in range(200):
+        if await dead():
+            break
+        await asyncio.sleep(0.01)
+    worker.stop()
+    await task
+
+    entries = await dead()
+    assert len(attempts) == 3
+    assert len(entries) == 1
+    assert entries[0][1][b"error"] == b"RuntimeError('boom')"
+
+
+@pytest.mark.anyio
+async def test_jobs_of_lost_consumers_are_retried(
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    """A job left pending by a consumer that stopped runs on another one."""
+    queue = make_queue(fake_redis_pool)
+    await queue.create_group()
+    await queue.enqueue("echo", {"n": 1})
+    # Read by a consumer that never finishes it.
+    assert len(await queue.read("gone", 10, 10)) == 1
+
+    seen: List[Dict[str, Any]] = []
+
+    async def handler(payload: Dict[str, Any]) -> None:
+        seen.append(payload)
+
+    handlers: Dict[str, JobHandler] = {"echo": handler}
+    worker = JobWorker(queue, handlers, "w2", claim_idle=0.03, block=0.01)
+    await run_until(worker, lambda: bool(seen))
+
+    assert seen == [{"n": 1}]
+
+
+@pytest.mark.anyio
+async def test_delayed_jobs_do_not_hold_slots(fake_redis_pool: ConnectionPool) -> None:
+    """A job waiting out its backoff lets the jobs after it run."""
+    queue = make_queue(fake_redis_pool)
+    seen: List[Tuple[int, float]] = []
+
+    async def handler(payload: Dict[str, Any]) -> None:
+        seen.append((payload["n"], time.time()))
+
+    start = time.time()
+    await queue.enqueue("echo", {"n": 1}, attempts=1, not_before=start + 0.3)
+    await queue.enqueue("echo", {"n": 2})
+    worker = JobWorker(queue, {"echo": handler}, "w1", concurrency=1, block=0.01)
+    await run_until(worker, lambda: len(seen) == 2)
+
+    assert [n for n, _ in seen] == [2, 1]
+    assert seen[0][1] - start < 0.3 <= seen[1][1] - start
+
+
+@pytest.mark.anyio
+async def test_run_job(fake_redis_pool: ConnectionPool) -> None:
+    """A run job starts a run, waits for it and tells the sockets on the thread."""
+    created: List[Tuple[str, str]] = []
+
+    class FakeRuns:
+        async def list(self, thread_id: str, limit: int, order: str) -> Any:
+            return SimpleNamespace(data=[])
+
+        async def create(self, thread_id: str, assistant_id: str) -> Any:
+            created.append((thread_id, assistant_id))
+            return SimpleNamespace(id="run_1", thread_id=thread_id, status="queued")
+
+    class FakeTracker:
+        async def track(self, thread_id: str, run_id: str) -> Any:
+            return SimpleNamespace(id=run_id, thread_id=thread_id, status="failed")
+
+    published: List[Dict[str, Any]] = []
+
+    class FakeChannels:
+        async def publish(self, channel: str, event: Dict[str, Any]) -> None:
+            published.append(event)
+
+    threads = SimpleNamespace(runs=FakeRuns())
+    client: Any = SimpleNamespace(beta=SimpleNamespace(threads=threads))
+    tracker: Any = FakeTracker()
+    channels: Any = FakeChannels()
+
+    # A failed run is reported, then retried as its job.
+    with pytest.raises(RuntimeError):
+        await run_job(client, tracker, channels, {"tid": "t1", "aid": "a1"})
+    assert created == [("t1", "a1")]
+    assert published == [{"id": "run", "tid": "t1", "run": "run_1", "status": "failed"}]
@@ -0,0 +1,51 @@
+import logging
+
+import pytest
+import ujson
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from gainz.log import ContextFilter, JSONFormatter, SamplingFilter, request_id
+
+
+def make_record(name: str, level: int) -> logging.LogRecord:
+    """Builds a log record of a logger."""
+    return logging.LogRecord(name, level, __file__, 1, "hello %s", ("world",), None)
+
+
+def test_sampling_keeps_warnings() -> None:
+    """Sampled loggers drop records below WARNING only."""
+    sampler = SamplingFilter({"noisy": 0.0})
+    assert not sampler.filter(make_record("noisy", logging.INFO))
+    assert sampler.filter(make_record("noisy", logging.WARNING))
+    assert sampler.filter(make_record("other", logging.DEBUG))
+
+
+def test_json_format_with_context() -> None:
+    """Records are formatted as JSON with the correlation ids."""
+    record = make_record("gainz", logging.INFO)
+    token = request_id.set("abc")
+    try:
+        ContextFilter().filter(record)
+    finally:
+        request_id.reset(token)
+    entry = ujson.loads(JSONFormatter().format(record))
+    assert entry["msg"] == "hello world"
+    assert entry["level"] == "INFO"
+    assert entry["request_id"] == "abc"
+    assert "socket_id" not in entry
+
+
+@pytest.mark.anyio
+async def test_request_id_header(client: AsyncClient, fastapi_app: FastAPI) -> None:
+    """
+    Checks that request ids are echoed back, or generated.
+
+    :param client: client for the app.
+    :param fastapi_app: current FastAPI application.
+    """
+    url = fastapi_app.url_path_for("health_check")
+    response = await client.get(url, headers={"X-Request-ID": "given"})
+    assert response.headers["x-request-id"] == "given"
+    response = await client.get(url)
+    assert len(response.headers["x-request-id"]) == 32
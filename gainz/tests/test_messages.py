@@ -0,0 +1,186 @@
+from types import SimpleNamespace
+from typing import Any, AsyncGenerator, AsyncIterator, List, Optional
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from starlette import status
+
+from benchmarks.fake_mongo import FakeDatabase
+from gainz.services.mongo.dependency import get_db, get_db_writer
+from gainz.services.mongo.writer import WriteBehindBuffer
+from gainz.services.openai.dependency import get_openai_client
+from gainz.web.api.monitoring.db import list_messages
+from gainz.web.api.monitoring.websocket import chatSyncMessages
+
+
+class FakeMessages:
+    """Fake `client.beta.threads.messages`, listing in ascending order."""
+
+    def __init__(self) -> None:
+        self.data: List[Any] = []
+        self.cursors: List[Optional[str]] = []
+
+    def add(self, mid: str, text: str, status: str = "completed") -> Any:
+        """Appends a message to the thread."""
+        part = SimpleNamespace(type="text", text=SimpleNamespace(value=text))
+        message = SimpleNamespace(
+            id=mid,
+            created_at=len(self.data) // 2,
+            role="assistant",
+            status=status,
+            content=[part],
+        )
+        self.data.append(message)
+        return message
+
+    async def list(
+        self,
+        thread_id: str,
+        order: str,
+        limit: int,
+        after: Optional[str] = None,
+    ) -> AsyncIterator[Any]:
+        """Lists the messages after the cursor."""
+        self.cursors.append(after)
+        ids = [message.id for message in self.data]
+        start = ids.index(after) + 1 if after else 0
+        for message in self.data[start:]:
+            yield message
+
+
+@pytest.fixture
+def db() -> Any:
+    """
+    In-memory database.
+
+    :return: the database.
+    """
+    return FakeDatabase()
+
+
+@pytest.fixture
+async def writer(db: Any) -> AsyncGenerator[WriteBehindBuffer, None]:
+    """
+    Write-behind buffer of the in-memory database.
+
+    :param db: the database.
+    :yield: the started buffer.
+    """
+    buffer = WriteBehindBuffer(db)
+    buffer.start()
+    yield buffer
+    await buffer.stop()
+
+
+def make_client(messages: FakeMessages) -> Any:
+    """Builds an OpenAI client listing the messages."""
+    threads = SimpleNamespace(messages=messages)
+    return SimpleNamespace(beta=SimpleNamespace(threads=threads))
+
+
+async def seed(db: Any, count: int) -> None:
+    """Stores count messages, two per timestamp, so pages end between them."""
+    for index in range(count):
+        mid = f"m{index}"
+        await db["Message"].insert_one(
+            {"_id": mid, "id": mid, "tid": "t1", "timestamp": index // 2},
+        )
+    await db["Message"].insert_one({"_id": "x", "id": "x", "tid": "t2", "timestamp": 0})
+
+
+@pytest.mark.anyio
+async def test_list_messages_pages(db: Any) -> None:
+    """Pages follow each other from the after cursor, with no gap or repeat."""
+    await seed(db, 7)
+
+    seen: List[str] = []
+    after = None
+    while True:
+        page = await list_messages(db, "t1", after, 3)
+        assert len(page) <= 4
+        seen.extend(message["id"] for message in page[:3])
+        if len(page) <= 3:
+            break
+        after = page[2]["id"]
+
+    assert seen == [f"m{index}" for index in range(7)]
+    # Stored ids are not returned, an unknown cursor is not a page.
+    assert "_id" not in page[0]
+    assert await list_messages(db, "t1", "unknown", 10) is None
+    assert await list_messages(db, "t2", "m1", 10) is None
+
+
+@pytest.mark.anyio
+async def test_sync_is_incremental(db: Any, writer: WriteBehindBuffer) -> None:
+    """Only the messages after the last stored one are fetched and stored."""
+    messages = FakeMessages()
+    messages.add("m0", "hi")
+    messages.add("m1", "hello")
+    client = make_client(messages)
+
+    assert await chatSyncMessages(client, db, writer, "t1") == 2
+    messages.add("m2", "again")
+    assert await chatSyncMessages(client, db, writer, "t1") == 1
+    assert await chatSyncMessages(client, db, writer, "t1") == 0
+
+    assert messages.cursors == [None, "m1", "m2"]
+    stored = await list_messages(db, "t1", None, 10)
+    assert [message["msg"] for message in stored] == ["hi", "hello", "again"]
+
+
+@pytest.mark.anyio
+async def test_sync_waits_for_final_messages(
+    db: Any,
+    writer: WriteBehindBuffer,
+) -> None:
+    """A message still being written is stored once it is complete."""
+    messages = FakeMessages()
+    messages.add("m0", "question")
+    answer = messages.add("m1", "Hel", status="in_progress")
+    client = make_client(messages)
+
+    assert await chatSyncMessages(client, db, writer, "t1") == 1
+    answer.content[0].text.value = "Hello"
+    answer.status = "completed"
+    assert await chatSyncMessages(client, db, writer, "t1") == 1
+
+    stored = await list_messages(db, "t1", None, 10)
+    assert [message["msg"] for message in stored] == ["question", "Hello"]
+
+
+@pytest.mark.anyio
+async def test_list_messages_unknown_cursor(
+    client: AsyncClient,
+    fastapi_app: FastAPI,
+    db: Any,
+    writer: WriteBehindBuffer,
+) -> None:
+    """
+    An after message not stored yet is synced first, an unknown one is rejected.
+
+    :param client: client for the app.
+    :param fastapi_app: current FastAPI application.
+    :param db: the database.
+    :param writer: buffer of the database.
+    """
+    messages = FakeMessages()
+    messages.add("m0", "hi")
+    messages.add("m1", "hello")
+    fastapi_app.dependency_overrides[get_db] = lambda: db
+    fastapi_app.dependency_overrides[get_db_writer] = lambda: writer
+    fastapi_app.dependency_overrides[get_openai_client] = lambda: make_client(
+        messages,
+    )
+    url = fastapi_app.url_path_for("chatListMessages")
+
+    response = await client.post(url, json={"tid": "t1", "after": "m0"})
+    assert response.status_code == status.HTTP_200_OK
+    assert [message["id"] for message in response.json()["data"]] == ["m1"]
+
+    response = await client.post(url, json={"tid": "t1"})
+    assert [message["id"] for message in response.json()["data"]] == ["m0", "m1"]
+    assert response.json()["has_more"] is False
+
+    response = await client.post(url, json={"tid": "t1", "after": "gone"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
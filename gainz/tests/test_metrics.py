@@ -0,0 +1,53 @@
+from typing import AsyncIterator
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from prometheus_client import REGISTRY, Histogram
+
+from gainz.services.metrics.metrics import timed
+
+
+@pytest.mark.anyio
+async def test_metrics(client: AsyncClient, fastapi_app: FastAPI) -> None:
+    """
+    Checks that HTTP requests are timed by route.
+
+    :param client: client for the app.
+    :param fastapi_app: current FastAPI application.
+    """
+    await client.get(fastapi_app.url_path_for("health_check"))
+    response = await client.get(fastapi_app.url_path_for("metrics"))
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert (
+        'gainz_http_request_duration_seconds_count{method="GET",'
+        'route="/api/health",status="200"}'
+    ) in response.text
+
+
+@pytest.mark.anyio
+async def test_timed() -> None:
+    """Checks that coroutines and async generators are timed."""
+    histogram = Histogram("test_timed_seconds", "Test.", ["name", "outcome"])
+
+    @timed(histogram, "gen")
+    async def gen() -> AsyncIterator[int]:
+        yield 1
+        yield 2
+
+    @timed(histogram, "fail")
+    async def fail() -> None:
+        raise ValueError
+
+    assert [item async for item in gen()] == [1, 2]
+    with pytest.raises(ValueError):
+        await fail()
+
+    def count(name: str, outcome: str) -> float:
+        labels = {"name": name, "outcome": outcome}
+        return REGISTRY.get_sample_value("test_timed_seconds_count", labels) or 0
+
+    assert count("gen", "ok") == 1
+    assert count("fail", "error") == 1
+    REGISTRY.unregister(histogram)
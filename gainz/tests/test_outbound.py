@@ -0,0 +1,85 @@
+import asyncio
+from typing import Any, List, Optional, Tuple
+
+import pytest
+
+from gainz.settings import OverflowPolicy
+from gainz.web.api.monitoring.outbound import (
+    OutboundFrame,
+    OutboundQueue,
+    OutboundStats,
+    SlowConsumerError,
+)
+
+
+class StalledSocket:
+    """Websocket whose client does not read until it is released."""
+
+    def __init__(self) -> None:
+        self.sent: List[Any] = []
+        self.closed: Optional[Tuple[int, str]] = None
+        self.reading = asyncio.Event()
+
+    async def send_text(self, text: str) -> None:
+        """Sends once the client reads again."""
+        await self.reading.wait()
+        self.sent.append(text)
+
+    async def close(self, code: int, reason: str) -> None:
+        """Records the close."""
+        self.closed = (code, reason)
+
+
+def delta(text: str) -> OutboundFrame:
+    """Builds a delta frame, coalescable with the others of thread t."""
+    payload = {"id": "delta", "tid": "t", "text": text}
+    return OutboundFrame(payload, delta=payload, delta_key=(None, "t"))
+
+
+async def fill(policy: OverflowPolicy) -> Tuple[StalledSocket, OutboundQueue]:
+    """Starts a queue of two frames on a stalled socket."""
+    socket = StalledSocket()
+    queue = OutboundQueue(socket, 2, policy, OutboundStats())  # type: ignore
+    queue.start()
+    queue.put(OutboundFrame("first"))
+    await asyncio.sleep(0)  # the writer takes it and stalls
+    queue.put(OutboundFrame("queued"))
+    queue.put(delta("a"))
+    return socket, queue
+
+
+@pytest.mark.anyio
+async def test_drop_oldest_and_coalesce() -> None:
+    """Checks the policies that keep the socket open."""
+    socket, queue = await fill(OverflowPolicy.DROP_OLDEST)
+    queue.put(delta("b"))
+    assert queue.stats.dropped == 1
+    socket.reading.set()
+    await asyncio.sleep(0.01)
+    assert socket.sent[0] == "first"
+    assert [frame.count('"text"') for frame in socket.sent[1:]] == [1, 1]
+    await queue.stop()
+
+    socket, queue = await fill(OverflowPolicy.COALESCE)
+    queue.put(delta("b"))
+    assert queue.stats.coalesced == 1
+    socket.reading.set()
+    await asyncio.sleep(0.01)
+    assert socket.sent[1:] == ["queued", '{"id":"delta","tid":"t","text":"ab"}']
+    assert queue.stats.depth == 0
+    await queue.stop()
+
+
+@pytest.mark.anyio
+async def test_disconnect() -> None:
+    """Checks that a slow consumer is evicted."""
+    socket, queue = await fill(OverflowPolicy.DISCONNECT)
+    with pytest.raises(SlowConsumerError):
+        queue.put(delta("b"))
+    with pytest.raises(SlowConsumerError):
+        queue.put(OutboundFrame("late"))
+    socket.reading.set()
+    await asyncio.sleep(0.01)
+    assert socket.closed == (1008, "slow consumer")
+    assert queue.stats.evicted == 1
+    await queue.stop()
@@ -0,0 +1,29 @@
+import pytest
+
+from gainz.services.passwords.hashing import PasswordHasher, PasswordPoolBusyError
+
+
+@pytest.mark.anyio
+async def test_password_hasher_roundtrip() -> None:
+    """Checks hashing and verification in the process pool."""
+    hasher = PasswordHasher(workers=1, max_pending=4)
+    try:
+        hashed = await hasher.hash("secret")
+        assert await hasher.check("secret", hashed)
+        assert not await hasher.check("wrong", hashed)
+    finally:
+        hasher.shutdown()
+    assert hasher.pending == 0
+
+
+@pytest.mark.anyio
+async def test_password_hasher_rejects_when_full() -> None:
+    """Checks that operations beyond the queue bound are rejected."""
+    hasher = PasswordHasher(workers=1, max_pending=0, retry_after=3)
+    try:
+        with pytest.raises(PasswordPoolBusyError) as exc_info:
+            await hasher.hash("secret")
+    finally:
+        hasher.shutdown()
+    assert exc_info.value.retry_after == 3
+    assert hasher.rejected == 1
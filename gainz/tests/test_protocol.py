@@ -0,0 +1,23 @@
+import msgpack
+import pytest
+
+from gainz.web.api.monitoring.protocol import LEGACY_VERSION, ProtocolError, decode
+
+
+def test_decode() -> None:
+    """Checks that both encodings and the legacy frames are decoded."""
+    request = decode(msgpack.packb({"v": 1, "rid": "a", "op": "list", "tid": "t"}))
+    assert (request.v, request.rid, request.op, request.tid) == (1, "a", "list", "t")
+    assert request.binary
+
+    legacy = decode('{"id": "answer", "tid": "t", "stream": true, "binary": true}')
+    assert not legacy.binary
+    assert legacy.v == LEGACY_VERSION
+    assert legacy.op == "answer" and legacy.stream
+    # Legacy clients may send numbers, taken as text like the original handlers.
+    legacy = decode('{"id": "question", "tid": 12, "message": 3.5}')
+    assert (legacy.tid, legacy.message) == ("12", "3.5")
+
+    for frame in ("not json", "[1, 2]", '{"v": 1}', '{"v": 2, "op": "ping"}'):
+        with pytest.raises(ProtocolError):
+            decode(frame)
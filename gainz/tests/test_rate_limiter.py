@@ -0,0 +1,38 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from redis.asyncio import ConnectionPool
+
+from gainz.services.ratelimit import limiter as limiter_module
+from gainz.services.ratelimit.limiter import RateLimiter, Rule
+
+
+@pytest.mark.anyio
+async def test_token_bucket(
+    fake_redis_pool: ConnectionPool,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    Checks that buckets are per user and action, and shared by workers.
+
+    :param fake_redis_pool: fake redis pool.
+    :param monkeypatch: pytest monkeypatch fixture.
+    """
+    rules = {"ws:answer": Rule(rate=0.5, burst=2)}
+    limiter = RateLimiter(fake_redis_pool, rules)
+    assert (await limiter.hit("u1", "ws:answer")).allowed
+    assert (await limiter.hit("u1", "ws:answer")).allowed
+    denied = await limiter.hit("u1", "ws:answer")
+    assert not denied.allowed
+    assert 0 < denied.retry_after <= 2
+
+    # Other users, and actions without a rule, are not limited.
+    assert (await limiter.hit("u2", "ws:answer")).allowed
+    assert (await limiter.hit("u1", "ws:list")).allowed
+
+    # Another worker shares the bucket in redis, whatever its clock says.
+    clock = SimpleNamespace(time=lambda: 1e10, monotonic=time.monotonic)
+    monkeypatch.setattr(limiter_module, "time", clock)
+    other = RateLimiter(fake_redis_pool, rules)
+    assert not (await other.hit("u1", "ws:answer")).allowed
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from starlette import status
+
+from gainz.services.readiness.dependency import get_readiness
+from gainz.services.readiness.warmup import Readiness
+
+
+@pytest.mark.anyio
+async def test_required_steps_are_retried() -> None:
+    """The worker is ready once required steps passed, whatever optional ones do."""
+    calls = []
+
+    async def flaky() -> None:
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError("not yet")
+
+    async def broken() -> None:
+        raise ConnectionError("down")
+
+    readiness = Readiness(retry_interval=0.01)
+    readiness.add("flaky", flaky)
+    readiness.add("broken", broken, required=False)
+    readiness.start()
+    assert not readiness.ready
+    for _ in range(100):
+        if readiness.ready:
+            break
+        await asyncio.sleep(0.01)
+    await readiness.stop()
+
+    report = readiness.report()
+    assert report["ready"]
+    assert len(calls) == 3
+    assert set(report["steps"]) == {"flaky"}
+    assert set(report["errors"]) == {"broken"}
+    assert report["startup_seconds"] <= report["ready_seconds"]
+
+
+@pytest.mark.anyio
+async def test_ready_endpoint(client: AsyncClient, fastapi_app: FastAPI) -> None:
+    """
+    Checks that /ready answers 503 until the warmup is done.
+
+    :param client: client for the app.
+    :param fastapi_app: current FastAPI application.
+    """
+    readiness = Readiness()
+    fastapi_app.dependency_overrides[get_readiness] = lambda: readiness
+    url = fastapi_app.url_path_for("readiness_check")
+
+    response = await client.get(url)
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert not response.json()["ready"]
+
+    readiness.ready = True
+    response = await client.get(url)
+    assert response.status_code == status.HTTP_200_OK
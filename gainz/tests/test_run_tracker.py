@@ -0,0 +1,100 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any, List
+
+import pytest
+
+from gainz.services.runs.tracker import RunTracker
+
+
+class FakeRuns:
+    """Fake `client.beta.threads.runs` returning statuses in order."""
+
+    def __init__(self, statuses: List[str]) -> None:
+        self.statuses = statuses
+        self.calls = 0
+
+    async def retrieve(self, thread_id: str, run_id: str) -> Any:
+        """Returns the run with the next status."""
+        status = self.statuses[min(self.calls, len(self.statuses) - 1)]
+        self.calls += 1
+        return SimpleNamespace(id=run_id, thread_id=thread_id, status=status)
+
+
+@pytest.mark.anyio
+async def test_run_tracker_resolves_finished_run() -> None:
+    """Checks that a tracked run resolves once and notifies its callback."""
+    runs = FakeRuns(["queued", "in_progress", "completed"])
+    threads = SimpleNamespace(runs=runs)
+    client: Any = SimpleNamespace(beta=SimpleNamespace(threads=threads))
+    tracker = RunTracker(client, min_interval=0.001, max_interval=0.01)
+    notified = []
+
+    async def callback(run: Any) -> None:
+        notified.append(run.status)
+
+    tracker.start()
+    try:
+        run = await tracker.track("thread_1", "run_1", callback)
+    finally:
+        await tracker.stop()
+
+    assert run.status == "completed"
+    assert runs.calls == 3
+    assert notified == ["completed"]
+    assert len(tracker) == 0
+
+
+@pytest.mark.anyio
+async def test_slow_poll_does_not_hold_other_runs() -> None:
+    """A run whose poll hangs does not delay the polls of the other runs."""
+    hang = asyncio.Event()
+
+    class SlowRuns(FakeRuns):
+        async def retrieve(self, thread_id: str, run_id: str) -> Any:
+            if run_id == "slow":
+                await hang.wait()
+            return await super().retrieve(thread_id, run_id)
+
+    runs = SlowRuns(["in_progress", "completed"])
+    threads = SimpleNamespace(runs=runs)
+    client: Any = SimpleNamespace(beta=SimpleNamespace(threads=threads))
+    tracker = RunTracker(client, min_interval=0.001, max_interval=0.01)
+    tracker.start()
+    try:
+        tracker.track("thread_1", "slow")
+        run = await asyncio.wait_for(tracker.track("thread_2", "fast"), 1)
+    finally:
+        await tracker.stop()
+
+    assert run.status == "completed"
+
+
+@pytest.mark.anyio
+async def test_lost_run_notifies_callbacks() -> None:
+    """A run that cannot be polled is reported to its callbacks as failed."""
+
+    class FailingRuns:
+        async def retrieve(self, thread_id: str, run_id: str) -> Any:
+            raise ConnectionError("down")
+
+    threads = SimpleNamespace(runs=FailingRuns())
+    client: Any = SimpleNamespace(beta=SimpleNamespace(threads=threads))
+    tracker = RunTracker(client, min_interval=0.001, max_failures=2)
+    notified = asyncio.Event()
+    statuses: List[str] = []
+
+    async def callback(run: Any) -> None:
+        statuses.append(run.status)
+        notified.set()
+
+    tracker.start()
+    try:
+        future = tracker.track("thread_1", "run_1", callback)
+        await asyncio.wait_for(notified.wait(), 1)
+    finally:
+        await tracker.stop()
+
+    assert statuses == ["failed"]
+    assert isinstance(future.exception(), ConnectionError)
+    assert len(tracker) == 0
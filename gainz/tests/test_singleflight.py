@@ -0,0 +1,71 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from gainz.services.cache.singleflight import WriteGeneration, coalesce
+from gainz.settings import settings
+
+
+@pytest.mark.anyio
+async def test_coalesce(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Checks that concurrent identical calls share one call.
+
+    :param monkeypatch: pytest monkeypatch fixture.
+    """
+    calls: List[str] = []
+
+    @coalesce("test_read")
+    async def read(tid: str) -> List[str]:
+        calls.append(tid)
+        await asyncio.sleep(0.01)
+        if tid == "bad":
+            raise LookupError(tid)
+        return [tid]
+
+    results = await asyncio.gather(*(read("t1") for _ in range(10)), read("t2"))
+    assert results == [["t1"]] * 10 + [["t2"]]
+    assert calls == ["t1", "t2"]
+
+    errors = await asyncio.gather(read("bad"), read("bad"), return_exceptions=True)
+    assert all(isinstance(error, LookupError) for error in errors)
+    assert calls.count("bad") == 1
+
+    # Calls made after the flight landed are not coalesced.
+    await read("t1")
+    assert calls.count("t1") == 2
+
+    monkeypatch.setattr(settings, "singleflight_disabled", ["test_read"])
+    await asyncio.gather(read("t3"), read("t3"))
+    assert calls.count("t3") == 2
+
+
+@pytest.mark.anyio
+async def test_coalesce_after_write() -> None:
+    """Checks that a read issued after a write does not join an older one."""
+    writes = WriteGeneration()
+    stored = ["old"]
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    @coalesce("test_write_read", generation=writes)
+    async def read(tid: str) -> List[str]:
+        result = list(stored)
+        started.set()
+        await release.wait()
+        return result
+
+    before = asyncio.ensure_future(read("t1"))
+    await started.wait()
+    joined = asyncio.ensure_future(read("t1"))
+    await asyncio.sleep(0)
+    stored.append("new")
+    writes.bump()
+    after = asyncio.ensure_future(read("t1"))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await before == ["old"]
+    assert await joined == ["old"]
+    assert await after == ["old", "new"]
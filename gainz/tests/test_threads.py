@@ -0,0 +1,135 @@
+from typing import Any, Dict, List
+
+import pytest
+import ujson
+from fastapi import FastAPI
+from httpx import AsyncClient
+from starlette import status
+
+from benchmarks.fake_mongo import FakeDatabase
+from gainz.services.mongo.dependency import get_db
+from gainz.web.api.monitoring.auth import get_current_user
+
+
+def thread(tid: str, uid: str, ts: int) -> Dict[str, Any]:
+    """Builds a thread document."""
+    return {"_id": tid, "id": tid, "uid": uid, "aid": "a", "name": "", "timestamp": ts}
+
+
+@pytest.fixture
+async def threads_db(fastapi_app: FastAPI) -> FakeDatabase:
+    """
+    Database with 7 threads of u1, two per timestamp, and one of someone else.
+
+    :param fastapi_app: current FastAPI application.
+    :return: the database.
+    """
+    db = FakeDatabase()
+    for index in range(7):
+        await db["Thread"].insert_one(thread(f"thread_{index}", "u1", index // 2))
+    await db["Thread"].insert_one(thread("other", "u2", 0))
+    fastapi_app.dependency_overrides[get_db] = lambda: db
+    fastapi_app.dependency_overrides[get_current_user] = lambda: {"id": "u1"}
+    return db
+
+
+@pytest.mark.anyio
+async def test_list_thread_pages(
+    client: AsyncClient,
+    fastapi_app: FastAPI,
+    threads_db: FakeDatabase,
+) -> None:
+    """
+    Pages follow the X-Next-Cursor header, across equal timestamps.
+
+    :param client: client for the app.
+    :param fastapi_app: current FastAPI application.
+    :param threads_db: seeded database.
+    """
+    url = fastapi_app.url_path_for("chatListThread")
+    seen: List[str] = []
+    cursors: List[str] = []
+    params: Dict[str, Any] = {"limit": 3}
+    while True:
+        response = await client.post(url, params=params)
+        assert response.status_code == status.HTTP_200_OK
+        seen.extend(thread["id"] for thread in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        cursors.append(cursor)
+        params["cursor"] = cursor
+
+    assert seen == [f"thread_{index}" for index in range(7)]
+    # The first page ends between thread_2 and thread_3, both at timestamp 1.
+    assert cursors == ["1:thread_2", "2:thread_5"]
+    assert set(response.json()[0]) == {"id", "aid", "name", "timestamp"}
+
+
+@pytest.mark.anyio
+async def test_list_thread_unbounded(
+    client: AsyncClient,
+    fastapi_app: FastAPI,
+    threads_db: FakeDatabase,
+) -> None:
+    """
+    Without a limit every thread is returned, for the frontend that does not page.
+
+    :param client: client for the app.
+    :param fastapi_app: current FastAPI application.
+    :param threads_db: seeded database.
+    """
+    response = await client.post(fastapi_app.url_path_for("chatListThread"))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 7
+    assert "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.anyio
+async def test_list_thread_stream(
+    client: AsyncClient,
+    fastapi_app: FastAPI,
+    threads_db: FakeDatabase,
+) -> None:
+    """
+    With stream=true every thread after the cursor comes as NDJSON.
+
+    :param client: client for the app.
+    :param fastapi_app: current FastAPI application.
+    :param threads_db: seeded database.
+    """
+    url = fastapi_app.url_path_for("chatListThread")
+    params = {"stream": "true", "cursor": "1:thread_2"}
+    response = await client.post(url, params=params)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = response.text.splitlines()
+    assert [ujson.loads(line)["id"] for line in lines] == [
+        "thread_3",
+        "thread_4",
+        "thread_5",
+        "thread_6",
+    ]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("cursor", ["abc", "x:thread_1", "1.5:thread_1"])
+async def test_list_thread_bad_cursor(
+    client: AsyncClient,
+    fastapi_app: FastAPI,
+    threads_db: FakeDatabase,
+    cursor: str,
+) -> None:
+    """
+    A malformed cursor is a bad request.
+
+    :param client: client for the app.
+    :param fastapi_app: current FastAPI application.
+    :param threads_db: seeded database.
+    :param cursor: the malformed cursor.
+    """
+    url = fastapi_app.url_path_for("chatListThread")
+    response = await client.post(url, params={"cursor": cursor})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
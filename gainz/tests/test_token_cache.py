@@ -0,0 +1,56 @@
+import importlib
+import time
+
+import jwt
+import pytest
+
+from gainz.services.cache.tokens import TokenCache
+
+# The package re-exports the router as `auth`, so get the module itself.
+auth = importlib.import_module("gainz.web.api.monitoring.auth")
+
+SECRET = "test-secret-" + "x" * 32
+
+
+@pytest.fixture
+def token_cache(monkeypatch: pytest.MonkeyPatch) -> TokenCache:
+    """
+    Fresh token cache and secret for the auth module.
+
+    :param monkeypatch: pytest monkeypatch fixture.
+    :returns: the token cache used by verify_token.
+    """
+    cache = TokenCache(16)
+    monkeypatch.setattr(auth, "token_cache", cache)
+    monkeypatch.setattr(auth, "JWT_SECRET", SECRET)
+    return cache
+
+
+def test_verified_token_is_cached(token_cache: TokenCache) -> None:
+    """
+    Checks that a token is decoded once and then served from the cache.
+
+    :param token_cache: token cache.
+    """
+    token = auth.create_access_token({"user_id": "u1"})
+    assert auth.verify_token(token)["user_id"] == "u1"
+    assert auth.verify_token(token)["user_id"] == "u1"
+    assert len(token_cache.verified) == 1
+    assert token_cache.verified.hits == 1
+
+
+def test_rejected_tokens_are_not_cached(token_cache: TokenCache) -> None:
+    """
+    Checks that expired and forged tokens are rejected.
+
+    :param token_cache: token cache.
+    """
+    expired = jwt.encode(
+        {"user_id": "u1", "exp": int(time.time()) - 1},
+        SECRET,
+        algorithm=auth.ALGORITHM,
+    )
+    assert auth.verify_token(expired) == "Token expired"
+    forged = jwt.encode({"user_id": "u1"}, "other-" + SECRET, algorithm=auth.ALGORITHM)
+    assert auth.verify_token(forged) == "Invalid token"
+    assert len(token_cache.verified) == 0
@@ -0,0 +1,36 @@
+from typing import Any, Dict, Optional
+
+import pytest
+from redis.asyncio import ConnectionPool
+
+from gainz.services.cache.users import UserCache
+
+
+@pytest.mark.anyio
+async def test_user_cache_read_through(fake_redis_pool: ConnectionPool) -> None:
+    """
+    Checks that users are loaded once and served from the caches.
+
+    :param fake_redis_pool: fake redis pool.
+    """
+    loads = []
+
+    async def loader() -> Optional[Dict[str, Any]]:
+        loads.append(1)
+        return {"id": "u1", "name": "Ann", "email": "a@b.c", "password": b"hash"}
+
+    cache = UserCache(fake_redis_pool)
+    principal = await cache.get("u1", loader)
+    assert principal == {"id": "u1", "name": "Ann", "email": "a@b.c"}
+    assert await cache.get("u1", loader) == principal
+    assert cache.local.hits == 1
+
+    # Another worker has an empty local cache but shares redis.
+    other = UserCache(fake_redis_pool)
+    assert await other.get("u1", loader) == principal
+    assert len(loads) == 1
+
+    await other.invalidate("u1")
+    cache.local.clear()
+    assert await cache.get("u1", loader) == principal
+    assert len(loads) == 2
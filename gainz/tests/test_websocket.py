@@ -0,0 +1,279 @@
+import asyncio
+import importlib
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import msgpack
+import pytest
+from fastapi import FastAPI
+from openai import AsyncOpenAI
+from starlette.testclient import TestClient
+
+from benchmarks.fake_mongo import FakeDatabase
+from gainz.services.channels.dependency import get_channel_layer
+from gainz.services.channels.layer import EventHandler
+from gainz.services.connections.dependency import get_connection_registry
+from gainz.services.connections.registry import ConnectionRegistry
+from gainz.services.jobs.dependency import get_job_queue
+from gainz.services.mongo.dependency import get_db
+from gainz.services.openai.dependency import get_openai_client
+from gainz.services.ratelimit.dependency import get_rate_limiter
+from gainz.services.ratelimit.limiter import Decision
+from gainz.services.runs.dependency import get_run_tracker
+from gainz.web.api.monitoring import websocket
+from gainz.web.api.monitoring.protocol import PROTOCOL_VERSION, Peer
+
+# The package re-exports the router as `auth`, so get the module itself.
+auth = importlib.import_module("gainz.web.api.monitoring.auth")
+
+
+class FakeChannelLayer:
+    """Channel layer that records subscriptions and published events."""
+
+    def __init__(self) -> None:
+        self.channels: Dict[str, EventHandler] = {}
+        self.published: List[Tuple[str, Dict[str, Any]]] = []
+
+    async def subscribe(self, channel: str, handler: EventHandler) -> None:
+        """Records the subscription."""
+        self.channels[channel] = handler
+
+    async def unsubscribe(self, channel: str, handler: EventHandler) -> None:
+        """Drops the subscription."""
+        self.channels.pop(channel, None)
+
+    async def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        """Records the event."""
+        self.published.append((channel, event))
+
+
+@pytest.mark.anyio
+async def test_answer_stream(
+    fastapi_app: FastAPI,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    Checks that a streamed answer is sent delta by delta.
+
+    :param fastapi_app: current FastAPI application.
+    :param monkeypatch: pytest monkeypatch fixture.
+    """
+
+    async def fake_stream(
+        client: Optional[AsyncOpenAI],
+        thread_id: str,
+        assistant_id: str,
+    ) -> AsyncIterator[str]:
+        yield "Hel"
+        yield "lo"
+
+    monkeypatch.setattr(websocket, "chatThreadRunStream", fake_stream)
+    fastapi_app.dependency_overrides[get_openai_client] = lambda: None
+    fastapi_app.dependency_overrides[get_run_tracker] = lambda: None
+    fastapi_app.dependency_overrides[get_rate_limiter] = lambda: None
+    fastapi_app.dependency_overrides[get_job_queue] = lambda: None
+    fastapi_app.dependency_overrides[get_db] = FakeDatabase
+    connections = ConnectionRegistry()
+    fastapi_app.dependency_overrides[get_connection_registry] = lambda: connections
+    channels = FakeChannelLayer()
+    fastapi_app.dependency_overrides[get_channel_layer] = lambda: channels
+
+    with TestClient(fastapi_app).websocket_connect("/api/ws") as conn:
+        conn.send_json({"id": "answer", "tid": "thread_1", "stream": True})
+        assert conn.receive_json() == {"id": "delta", "tid": "thread_1", "text": "Hel"}
+        assert conn.receive_json() == {"id": "delta", "tid": "thread_1", "text": "lo"}
+        assert conn.receive_json() == {
+            "id": "done",
+            "tid": "thread_1",
+            "message": "Hello",
+        }
+
+    # The answer is fanned out to the thread, the subscription is dropped.
+    assert channels.published[0][0] == "gainz:thread:thread_1"
+    assert channels.published[0][1]["message"] == "Hello"
+    assert channels.channels == {}
+    assert len(connections) == 0
+
+
+@pytest.mark.anyio
+async def test_pipelined_msgpack(
+    fastapi_app: FastAPI,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    Checks that version 1 requests are answered by request id.
+
+    :param fastapi_app: current FastAPI application.
+    :param monkeypatch: pytest monkeypatch fixture.
+    """
+
+    async def fake_stream(
+        client: Optional[AsyncOpenAI],
+        thread_id: str,
+        assistant_id: str,
+    ) -> AsyncIterator[str]:
+        yield "Hi"
+
+    monkeypatch.setattr(websocket, "chatThreadRunStream", fake_stream)
+    fastapi_app.dependency_overrides[get_openai_client] = lambda: None
+    fastapi_app.dependency_overrides[get_run_tracker] = lambda: None
+    fastapi_app.dependency_overrides[get_rate_limiter] = lambda: None
+    fastapi_app.dependency_overrides[get_job_queue] = lambda: None
+    fastapi_app.dependency_overrides[get_db] = FakeDatabase
+    fastapi_app.dependency_overrides[get_channel_layer] = FakeChannelLayer
+    fastapi_app.dependency_overrides[get_connection_registry] = ConnectionRegistry
+
+    with TestClient(fastapi_app).websocket_connect("/api/ws") as conn:
+        conn.send_bytes(msgpack.packb({"v": 1, "rid": "1", "op": "ping"}))
+        conn.send_bytes(
+            msgpack.packb(
+                {"v": 1, "rid": "2", "op": "answer", "tid": "t", "stream": True},
+            ),
+        )
+        conn.send_bytes(msgpack.packb({"v": 1, "rid": "3", "op": "nope"}))
+        frames = [msgpack.unpackb(conn.receive_bytes()) for _ in range(4)]
+
+    ping, delta, answer, unknown = frames
+    assert ping["rid"] == "1" and ping["ok"]
+    assert delta == {
+        "v": 1,
+        "rid": "2",
+        "event": "delta",
+        "data": {"tid": "t", "text": "Hi"},
+    }
+    assert answer["rid"] == "2" and answer["data"]["message"] == "Hi"
+    assert unknown["rid"] == "3" and unknown["error"]["code"] == "unknown_op"
+
+
+@pytest.mark.anyio
+async def test_replies_keep_the_request_encoding(
+    fastapi_app: FastAPI,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    Checks that a JSON answer stays JSON when a MessagePack frame comes in.
+
+    :param fastapi_app: current FastAPI application.
+    :param monkeypatch: pytest monkeypatch fixture.
+    """
+
+    async def fake_stream(
+        client: Optional[AsyncOpenAI],
+        thread_id: str,
+        assistant_id: str,
+    ) -> AsyncIterator[str]:
+        # The ping below is received and answered meanwhile.
+        await asyncio.sleep(0.1)
+        yield "Hi"
+
+    monkeypatch.setattr(websocket, "chatThreadRunStream", fake_stream)
+    fastapi_app.dependency_overrides[get_openai_client] = lambda: None
+    fastapi_app.dependency_overrides[get_run_tracker] = lambda: None
+    fastapi_app.dependency_overrides[get_rate_limiter] = lambda: None
+    fastapi_app.dependency_overrides[get_job_queue] = lambda: None
+    fastapi_app.dependency_overrides[get_db] = FakeDatabase
+    fastapi_app.dependency_overrides[get_channel_layer] = FakeChannelLayer
+    fastapi_app.dependency_overrides[get_connection_registry] = ConnectionRegistry
+
+    with TestClient(fastapi_app).websocket_connect("/api/ws") as conn:
+        conn.send_json({"v": 1, "rid": "1", "op": "answer", "tid": "t", "stream": True})
+        conn.send_bytes(msgpack.packb({"v": 1, "rid": "2", "op": "ping"}))
+        ping = msgpack.unpackb(conn.receive_bytes())
+        delta = conn.receive_json()
+        answer = conn.receive_json()
+
+    assert ping["rid"] == "2"
+    assert delta["rid"] == "1" and delta["event"] == "delta"
+    assert answer["rid"] == "1" and answer["data"]["message"] == "Hi"
+
+
+class EmptyBucket:
+    """Rate limiter whose buckets are always empty."""
+
+    async def hit(self, key: str, action: str) -> Decision:
+        """Denies every call."""
+        return Decision(False, 1.5)
+
+
+@pytest.mark.anyio
+async def test_rate_limited(fastapi_app: FastAPI) -> None:
+    """
+    Checks that rate limited frames get a structured error.
+
+    :param fastapi_app: current FastAPI application.
+    """
+    fastapi_app.dependency_overrides[get_openai_client] = lambda: None
+    fastapi_app.dependency_overrides[get_run_tracker] = lambda: None
+    fastapi_app.dependency_overrides[get_rate_limiter] = EmptyBucket
+    fastapi_app.dependency_overrides[get_job_queue] = lambda: None
+    fastapi_app.dependency_overrides[get_db] = FakeDatabase
+    fastapi_app.dependency_overrides[get_channel_layer] = FakeChannelLayer
+    fastapi_app.dependency_overrides[get_connection_registry] = ConnectionRegistry
+
+    with TestClient(fastapi_app).websocket_connect("/api/ws") as conn:
+        conn.send_json({"v": 1, "rid": "1", "op": "answer", "tid": "t"})
+        reply = conn.receive_json()
+
+    assert reply["ok"] is False
+    assert reply["error"]["code"] == "rate_limited"
+    assert reply["error"]["retry_after"] == 1.5
+
+
+@pytest.mark.anyio
+async def test_only_own_threads_are_followed(
+    fastapi_app: FastAPI,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    Checks that a socket gets the events of its user's threads only.
+
+    :param fastapi_app: current FastAPI application.
+    :param monkeypatch: pytest monkeypatch fixture.
+    """
+    monkeypatch.setattr(auth, "JWT_SECRET", "test-secret-" + "x" * 32)
+    db = FakeDatabase()
+    await db["Thread"].insert_one({"_id": "mine", "uid": "u1"})
+    await db["Thread"].insert_one({"_id": "theirs", "uid": "u2"})
+    fastapi_app.dependency_overrides[get_openai_client] = lambda: None
+    fastapi_app.dependency_overrides[get_run_tracker] = lambda: None
+    fastapi_app.dependency_overrides[get_rate_limiter] = lambda: None
+    fastapi_app.dependency_overrides[get_job_queue] = lambda: None
+    fastapi_app.dependency_overrides[get_db] = lambda: db
+    fastapi_app.dependency_overrides[get_connection_registry] = ConnectionRegistry
+    channels = FakeChannelLayer()
+    fastapi_app.dependency_overrides[get_channel_layer] = lambda: channels
+
+    token = auth.create_access_token({"user_id": "u1"})
+    with TestClient(fastapi_app).websocket_connect(f"/api/ws?token={token}") as conn:
+        for tid in ("mine", "theirs"):
+            conn.send_json({"v": 1, "rid": tid, "op": "ping", "tid": tid})
+            assert conn.receive_json()["ok"]
+        followed = set(channels.channels)
+
+    assert followed == {"gainz:user:u1", "gainz:thread:mine"}
+
+    with TestClient(fastapi_app).websocket_connect("/api/ws") as conn:
+        conn.send_json({"v": 1, "rid": "1", "op": "ping", "tid": "mine"})
+        assert conn.receive_json()["ok"]
+        assert channels.channels == {}
+
+
+class RecordingQueue:
+    """Outbound queue that keeps the frames."""
+
+    def __init__(self) -> None:
+        self.frames: List[Any] = []
+
+    def put(self, frame: Any) -> None:
+        """Keeps the frame."""
+        self.frames.append(frame)
+
+
+@pytest.mark.anyio
+async def test_heartbeat_event() -> None:
+    """Checks that the heartbeat is an event of the versioned protocol."""
+    outbound = RecordingQueue()
+    peer = Peer(None, outbound)  # type: ignore
+    peer.version = PROTOCOL_VERSION
+    await websocket.heartbeat(peer)()
+    assert outbound.frames[0].payload["v"] == PROTOCOL_VERSION
+    assert outbound.frames[0].payload["event"] == "heartbeat"